@@ -0,0 +1,117 @@
+"""Helpers shared by the benchmark scripts: environment, statistics and JSON results."""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+
+def configure_environment(path_to_db: str, **overrides: str) -> None:
+    """
+    Point the settings at a benchmark database.
+
+    Settings are read at import time, so this has to run before the app is imported.
+    """
+    os.environ.setdefault("ENVIRONMENT", "developing")
+    os.environ.setdefault("GENAI_API_KEY", "benchmark")
+    os.environ["PATH_TO_DB"] = path_to_db
+    os.environ.update(overrides)
+
+
+def summarize(timings: List[float]) -> dict:
+    """Latency statistics in milliseconds for timings given in seconds."""
+    timings_ms = sorted(timing * 1000 for timing in timings)
+    percentiles = (
+        statistics.quantiles(timings_ms, n=100, method="inclusive")
+        if len(timings_ms) > 1
+        else timings_ms * 99
+    )
+
+    return {
+        "requests": len(timings_ms),
+        "mean_ms": round(statistics.mean(timings_ms), 3),
+        "min_ms": round(timings_ms[0], 3),
+        "p50_ms": round(percentiles[49], 3),
+        "p95_ms": round(percentiles[94], 3),
+        "p99_ms": round(percentiles[98], 3),
+        "max_ms": round(timings_ms[-1], 3),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(benchmark: str, parameters: dict, results: Dict[str, dict]) -> dict:
+    return {
+        "benchmark": benchmark,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "results": results,
+    }
+
+
+def print_results(results: Dict[str, dict]) -> None:
+    width = max((len(name) for name in results), default=4)
+    print(
+        f"{'case':<{width}} {'requests':>8} {'mean ms':>9} {'p50 ms':>9} "
+        f"{'p95 ms':>9} {'p99 ms':>9}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<{width}} {result['requests']:>8} {result['mean_ms']:>9.2f} "
+            f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f}"
+        )
+
+
+def write_report(report: dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+        file.write("\n")
+
+
+def compare_with_baseline(
+    results: Dict[str, dict], baseline_path: str, tolerance: float, metric: str = "p50_ms"
+) -> List[str]:
+    """
+    Print the change of `metric` for every case against a stored report.
+
+    :param tolerance: Allowed slowdown as a fraction, e.g. 0.2 for 20%.
+    :return: The names of the cases that got slower than the tolerance allows.
+    """
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = json.load(file)["results"]
+
+    regressions = []
+    width = max((len(name) for name in results), default=4)
+    print(f"\n{'case':<{width}} {'baseline':>10} {'current':>10} {'change':>8}  ({metric})")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<{width}} {'-':>10} {result[metric]:>10.2f} {'new':>8}")
+            continue
+
+        before, after = baseline[name][metric], result[metric]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  slower"
+
+        print(f"{name:<{width}} {before:>10.2f} {after:>10.2f} {change:>+8.1%}{flag}")
+
+    return regressions
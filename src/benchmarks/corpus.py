@@ -0,0 +1,244 @@
+"""
+Generate a reproducible synthetic corpus of notes and versions directly into SQLite.
+
+Run from `src`:
+
+    python -m benchmarks.corpus --path /tmp/notes.db --notes 1000000 --mean-words 80
+
+Words are drawn from a Zipf-like distribution over a synthetic vocabulary, so word
+frequencies and phrase counts look like natural text. Note lengths, version depth and
+timestamps are drawn from the configured distributions with a fixed seed, so the same
+arguments always produce the same database. The full-text index and daily rollup
+triggers are dropped while loading and rebuilt once at the end; the near-duplicate
+index is only built with `--with-similarity`.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+SYLLABLES = [
+    consonant + vowel
+    for consonant in "bcdfghklmnprstvz"
+    for vowel in ("a", "e", "i", "o", "u", "ai", "ou")
+]
+
+
+def add_corpus_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("corpus")
+    group.add_argument("--notes", type=int, default=10000)
+    group.add_argument("--seed", type=int, default=42)
+    group.add_argument("--vocabulary", type=int, default=20000, help="Distinct words.")
+    group.add_argument(
+        "--length-distribution",
+        choices=("lognormal", "uniform", "fixed"),
+        default="lognormal",
+    )
+    group.add_argument("--mean-words", type=int, default=80, help="Mean words per note.")
+    group.add_argument(
+        "--sigma", type=float, default=0.8, help="Spread of the lognormal lengths."
+    )
+    group.add_argument("--max-words", type=int, default=2000)
+    group.add_argument(
+        "--version-distribution",
+        choices=("geometric", "uniform", "fixed"),
+        default="geometric",
+    )
+    group.add_argument("--max-versions", type=int, default=5, help="Versions per note.")
+    group.add_argument(
+        "--days", type=int, default=365, help="Spread creation times over this many days."
+    )
+    group.add_argument("--batch-size", type=int, default=10000)
+    group.add_argument(
+        "--with-similarity",
+        action="store_true",
+        help="Also build the near-duplicate index, which is slow for large corpora.",
+    )
+
+
+def make_vocabulary(size: int, rng: np.random.Generator) -> np.ndarray:
+    """Unique pronounceable words, shortest first so the most frequent words are short."""
+    words = set()
+    syllables = 1
+    while len(words) < size:
+        picks = rng.integers(0, len(SYLLABLES), size=(size, syllables))
+        words.update("".join(SYLLABLES[index] for index in row) for row in picks)
+        syllables += 1
+
+    return np.array(sorted(words, key=lambda word: (len(word), word))[:size])
+
+
+def word_lengths(args: argparse.Namespace, rng: np.random.Generator, count: int) -> np.ndarray:
+    if args.length_distribution == "fixed":
+        lengths = np.full(count, args.mean_words)
+    elif args.length_distribution == "uniform":
+        lengths = rng.integers(1, 2 * args.mean_words, size=count, endpoint=True)
+    else:
+        # Pick the location so the mean of the lognormal is `mean_words`
+        mu = np.log(args.mean_words) - args.sigma**2 / 2
+        lengths = rng.lognormal(mu, args.sigma, size=count)
+
+    return np.clip(np.rint(lengths), 1, args.max_words).astype(np.int64)
+
+
+def version_counts(
+    args: argparse.Namespace, rng: np.random.Generator, count: int
+) -> np.ndarray:
+    if args.max_versions <= 0:
+        return np.zeros(count, dtype=np.int64)
+    if args.version_distribution == "fixed":
+        counts = np.full(count, args.max_versions)
+    elif args.version_distribution == "uniform":
+        counts = rng.integers(0, args.max_versions, size=count, endpoint=True)
+    else:
+        counts = rng.geometric(0.5, size=count) - 1
+
+    return np.clip(counts, 0, args.max_versions)
+
+
+def generate_batches(args: argparse.Namespace) -> Iterator[Tuple[List[dict], List[dict]]]:
+    """Yield `(note_rows, version_rows)` for each batch of `--batch-size` notes."""
+
+    rng = np.random.default_rng(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    word_weights = 1 / np.arange(1, len(vocabulary) + 1) ** 1.07
+    word_weights /= word_weights.sum()
+
+    now = datetime(2025, 1, 1)
+    for first_id in range(1, args.notes + 1, args.batch_size):
+        count = min(args.batch_size, args.notes - first_id + 1)
+        lengths = word_lengths(args, rng, count)
+        versions = version_counts(args, rng, count)
+        if first_id == 1:
+            # Note 1 always has the full history, so benchmarks have versions to read
+            versions[0] = max(args.max_versions, 0)
+
+        words = vocabulary[rng.choice(len(vocabulary), size=lengths.sum(), p=word_weights)]
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        age_seconds = rng.uniform(0, args.days * 86400, size=count)
+
+        notes = []
+        history = []
+        for index in range(count):
+            note_id = first_id + index
+            note_words = words[offsets[index] : offsets[index + 1]]
+            created_at = now - timedelta(seconds=float(age_seconds[index]))
+
+            # Each version differs from the current content by a few replaced words
+            for version in range(1, versions[index] + 1):
+                changed = rng.integers(0, len(note_words), size=max(len(note_words) // 10, 1))
+                version_words = note_words.copy()
+                version_words[changed] = vocabulary[
+                    rng.integers(0, len(vocabulary), size=len(changed))
+                ]
+                history.append(
+                    {
+                        "note_id": note_id,
+                        "version": version,
+                        "content": " ".join(version_words),
+                        "created_at": created_at + timedelta(hours=version),
+                    }
+                )
+
+            notes.append(
+                {
+                    "id": note_id,
+                    "content": " ".join(note_words),
+                    "created_at": created_at,
+                    "updated_at": created_at + timedelta(hours=int(versions[index])),
+                }
+            )
+
+        yield notes, history
+
+
+async def generate_corpus(args: argparse.Namespace) -> dict:
+    """
+    Fill the configured database with the corpus, replacing any existing notes.
+
+    :return: Counts of generated notes and versions, and the elapsed time.
+    """
+    from sqlalchemy import delete, insert
+
+    from database import (
+        engine,
+        get_db_contextmanager,
+        init_db,
+        NoteChangeModel,
+        NoteModel,
+        VersionModel,
+    )
+    from database.rollups import create_rollup_triggers, drop_rollup_triggers
+    from database.search import create_search_index, drop_search_index
+
+    started = time.perf_counter()
+    await init_db()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(drop_search_index)
+        await conn.run_sync(drop_rollup_triggers)
+        # Versions, signatures and the other per-note rows cascade
+        await conn.execute(delete(NoteModel))
+        await conn.execute(delete(NoteChangeModel))
+
+    notes_written = 0
+    versions_written = 0
+    for notes, versions in generate_batches(args):
+        async with engine.begin() as conn:
+            await conn.execute(insert(NoteModel.__table__), notes)
+            if versions:
+                await conn.execute(insert(VersionModel.__table__), versions)
+
+        notes_written += len(notes)
+        versions_written += len(versions)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(create_search_index, True)
+        await conn.run_sync(create_rollup_triggers, True)
+
+    if args.with_similarity:
+        from services import rebuild_similarity_index
+
+        async with get_db_contextmanager() as db:
+            await rebuild_similarity_index(db)
+
+    return {
+        "notes": notes_written,
+        "versions": versions_written,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    from database import close_db
+
+    try:
+        report = await generate_corpus(args)
+    finally:
+        await close_db()
+
+    print(
+        f"Generated {report['notes']} notes and {report['versions']} versions "
+        f"in {report['seconds']} s."
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--path", required=True, help="SQLite file to (re)create.")
+    add_corpus_arguments(parser)
+
+    return parser
+
+
+if __name__ == "__main__":
+    from benchmarks.common import configure_environment
+
+    arguments = build_parser().parse_args()
+    configure_environment(os.path.abspath(arguments.path))
+    asyncio.run(main(arguments))
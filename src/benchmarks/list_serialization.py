@@ -0,0 +1,113 @@
+"""
+Compare the ORM/Pydantic and the row-based serialization of list responses.
+
+Run from `src`:
+
+    python -m benchmarks.list_serialization --notes 2000 --versions 20
+
+A throwaway SQLite file is created in a temporary directory, filled with notes that
+each have `--versions` versions, and both list endpoints are timed in-process with
+`FAST_LIST_SERIALIZATION` off and on.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+def _configure_environment(directory: str) -> None:
+    # Settings are read at import time, so this has to run before the app is imported
+    os.environ.setdefault("ENVIRONMENT", "developing")
+    os.environ.setdefault("GENAI_API_KEY", "benchmark")
+    os.environ["PATH_TO_DB"] = os.path.join(directory, "benchmark.db")
+
+
+async def _populate(notes: int, versions: int, content_size: int) -> None:
+    from sqlalchemy import insert
+
+    from database import engine, init_db, NoteModel, VersionModel
+
+    await init_db()
+
+    content = ("lorem ipsum dolor sit amet " * (content_size // 27 + 1))[:content_size]
+    async with engine.begin() as conn:
+        await conn.execute(
+            insert(NoteModel.__table__),
+            [{"id": note_id, "content": content} for note_id in range(1, notes + 1)],
+        )
+        await conn.execute(
+            insert(VersionModel.__table__),
+            [
+                {"note_id": note_id, "version": version, "content": content}
+                for note_id in range(1, notes + 1)
+                for version in range(1, versions + 1)
+            ],
+        )
+
+
+async def _time_requests(client, url: str, requests: int) -> list:
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get(url)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.text
+
+    return timings
+
+
+async def run(args: argparse.Namespace) -> None:
+    from httpx import ASGITransport, AsyncClient
+
+    from database import close_db
+    from main import app
+    import routes.notes
+    import routes.versions
+
+    await _populate(args.notes, args.versions, args.content_size)
+
+    urls = {
+        "note list": f"/api/v1/notes/?per_page={args.per_page}",
+        "version list": f"/api/v1/versions/1?per_page={args.per_page}",
+    }
+
+    print(f"{'endpoint':<14} {'mode':<6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://benchmark") as client:
+        for name, url in urls.items():
+            for fast in (False, True):
+                routes.notes.settings.FAST_LIST_SERIALIZATION = fast
+                routes.versions.settings.FAST_LIST_SERIALIZATION = fast
+
+                # Warm up caches and the connection pool before measuring
+                await _time_requests(client, url, 5)
+                timings = await _time_requests(client, url, args.requests)
+
+                print(
+                    f"{name:<14} {'rows' if fast else 'orm':<6} "
+                    f"{statistics.mean(timings):>9.2f} "
+                    f"{statistics.median(timings):>9.2f} "
+                    f"{statistics.quantiles(timings, n=20)[-1]:>9.2f}"
+                )
+
+    await close_db()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--notes", type=int, default=2000)
+    parser.add_argument("--versions", type=int, default=20, help="Versions per note.")
+    parser.add_argument("--content-size", type=int, default=500, help="Characters per note.")
+    parser.add_argument("--per-page", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+
+    return parser
+
+
+if __name__ == "__main__":
+    arguments = build_parser().parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        _configure_environment(directory)
+        asyncio.run(run(arguments))
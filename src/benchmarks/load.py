@@ -0,0 +1,398 @@
+"""
+Run a mixed workload against a local uvicorn server and report tail latency per route.
+
+Run from `src`:
+
+    python -m benchmarks.load --notes 50000 --concurrency 64 --duration 30
+    python -m benchmarks.load --rate 300 --mix read=60,write=30,analytics=5,summary=5
+
+A corpus is generated with `benchmarks.corpus` (see its options) and served by uvicorn
+in a separate process, with summaries answered by the GenAI stub after
+`--genai-latency-ms` on the same thread pool as the real client. With `--url`, an
+already running server is used instead and `--notes` must match its note IDs.
+
+With `--concurrency`, that many clients each send their next request as soon as the
+previous one is answered. With `--rate`, requests start on a fixed schedule whether or
+not earlier ones are done, and latency is measured from the scheduled start, so a
+stalled server shows up in the tail instead of slowing the load down. Failed requests
+are counted per kind: `busy` (503, "database is locked"), other HTTP statuses,
+`timeout` and `connection`.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextlib import closing
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.common import (
+    build_report,
+    configure_environment,
+    summarize,
+    write_report,
+)
+from benchmarks.corpus import add_corpus_arguments, make_vocabulary
+
+NOTES = "/api/v1/notes"
+VERSIONS = "/api/v1/versions"
+ANALYTICS = "/api/v1/analytics"
+
+DEFAULT_MIX = "read=70,write=20,analytics=5,summary=5"
+
+
+class Workload:
+    """Random requests of each category, over the notes and words of the corpus."""
+
+    def __init__(self, args: argparse.Namespace, versioned_ids: List[int]):
+        self.random = random.Random(args.seed)
+        self.notes = args.notes
+        self.versioned_ids = versioned_ids
+        self.words = list(make_vocabulary(args.vocabulary, np.random.default_rng(args.seed)))
+        self.mean_words = args.mean_words
+        # A month-long window, so analytics do not all scan every note
+        window = {"from": "2024-05-01T12:00:00", "to": "2024-06-01T12:00:00"}
+
+        self.routes: Dict[str, List[Tuple[str, Callable[[], tuple]]]] = {
+            "read": [
+                ("notes.list", lambda: self.get(f"{NOTES}/", page=self.random.randint(1, 100))),
+                ("notes.detail", lambda: self.get(f"{NOTES}/{self.note_id()}/")),
+                ("notes.batch.get", lambda: self.get(f"{NOTES}/batch/", ids=self.note_ids(20))),
+                ("notes.search", lambda: self.get(f"{NOTES}/search/", q=self.random.choice(self.words[:2000]))),
+                ("notes.related", lambda: self.get(f"{NOTES}/{self.note_id()}/related/")),
+                ("versions.list", lambda: self.get(f"{VERSIONS}/{self.random.choice(versioned_ids)}")),
+            ],
+            "write": [
+                ("notes.create", lambda: ("POST", f"{NOTES}/", {"json": {"content": self.text()}})),
+                ("notes.update", lambda: ("PUT", f"{NOTES}/{self.note_id()}/", {"json": {"content": self.text()}})),
+            ],
+            "analytics": [
+                ("analytics.total-words", lambda: self.get(f"{ANALYTICS}/total-words/", **window)),
+                ("analytics.avg-note-length", lambda: self.get(f"{ANALYTICS}/avg-note-length/")),
+                ("analytics.top-3-longest-notes", lambda: self.get(f"{ANALYTICS}/top-3-longest-notes/", **window)),
+                ("analytics.daily", lambda: self.get(f"{ANALYTICS}/daily/")),
+                ("analytics.most-common", lambda: self.get(f"{ANALYTICS}/most-common-words-or-phrases/", **window)),
+            ],
+            "summary": [
+                ("analytics.summary", lambda: self.get(f"{ANALYTICS}/summary/", note_id=self.note_id())),
+            ],
+        }
+
+    @staticmethod
+    def get(path: str, **params) -> tuple:
+        return "GET", path, {"params": params}
+
+    def note_id(self) -> int:
+        return self.random.randint(1, self.notes)
+
+    def note_ids(self, count: int) -> str:
+        return ",".join(str(self.note_id()) for _ in range(count))
+
+    def text(self) -> str:
+        return " ".join(self.random.choices(self.words[:5000], k=self.mean_words))
+
+    def pick(self, weights: Dict[str, float]) -> Tuple[str, tuple]:
+        category = self.random.choices(list(weights), weights=list(weights.values()))[0]
+        name, request = self.random.choice(self.routes[category])
+
+        return name, request()
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        category, _, weight = part.partition("=")
+        if category not in ("read", "write", "analytics", "summary"):
+            raise argparse.ArgumentTypeError(f"Unknown workload category: {category!r}")
+        mix[category] = float(weight)
+
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("The mix needs at least one positive weight.")
+
+    return {category: weight for category, weight in mix.items() if weight > 0}
+
+
+class Recorder:
+    """Latencies and failures per route, ignoring requests started during the warm-up."""
+
+    def __init__(self, measure_from: float):
+        self.measure_from = measure_from
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, name: str, started: float, error: Optional[str]) -> None:
+        if started < self.measure_from:
+            return
+
+        self.timings[name].append(time.perf_counter() - started)
+        if error:
+            self.errors[name][error] += 1
+
+    def results(self, seconds: float) -> Dict[str, dict]:
+        results = {}
+        for name in sorted(self.timings):
+            timings = self.timings[name]
+            failed = sum(self.errors[name].values())
+            results[name] = {
+                **summarize(timings),
+                "throughput_rps": round(len(timings) / seconds, 2),
+                "error_rate": round(failed / len(timings), 4),
+                "errors": dict(self.errors[name]),
+            }
+
+        return results
+
+
+async def _send(client, recorder: Recorder, name: str, request: tuple, started: float) -> None:
+    import httpx
+
+    method, url, options = request
+    error = None
+    try:
+        response = await client.request(method, url, **options)
+        if response.status_code == 503:
+            error = "busy"
+        elif response.status_code >= 400:
+            error = f"http {response.status_code}"
+    except httpx.TimeoutException:
+        error = "timeout"
+    except httpx.TransportError:
+        error = "connection"
+
+    recorder.record(name, started, error)
+
+
+async def _run_closed_loop(client, args, workload, recorder, deadline: float) -> None:
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            name, request = workload.pick(args.mix)
+            await _send(client, recorder, name, request, time.perf_counter())
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+
+async def _run_open_loop(client, args, workload, recorder, deadline: float) -> None:
+    interval = 1 / args.rate
+    scheduled = time.perf_counter()
+    in_flight = set()
+
+    while scheduled < deadline:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        name, request = workload.pick(args.mix)
+        task = asyncio.create_task(_send(client, recorder, name, request, scheduled))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        scheduled += interval
+
+    await asyncio.gather(*in_flight)
+
+
+async def run_load(
+    args: argparse.Namespace, base_url: str, versioned_ids: List[int]
+) -> Dict[str, dict]:
+    import httpx
+
+    workload = Workload(args, versioned_ids)
+    connections = args.concurrency if args.rate is None else args.max_connections
+    started = time.perf_counter()
+    recorder = Recorder(measure_from=started + args.warmup_seconds)
+    deadline = started + args.warmup_seconds + args.duration
+
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        timeout=args.timeout,
+        limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+    ) as client:
+        if args.rate is None:
+            await _run_closed_loop(client, args, workload, recorder, deadline)
+        else:
+            await _run_open_loop(client, args, workload, recorder, deadline)
+
+    # Requests still running at the deadline finish afterwards, and count towards it
+    measured = time.perf_counter() - recorder.measure_from
+    results = recorder.results(measured)
+
+    everything = [timing for timings in recorder.timings.values() for timing in timings]
+    if everything:
+        failed = sum(sum(errors.values()) for errors in recorder.errors.values())
+        results["all"] = {
+            **summarize(everything),
+            "throughput_rps": round(len(everything) / measured, 2),
+            "error_rate": round(failed / len(everything), 4),
+            "errors": dict(sum(recorder.errors.values(), Counter())),
+        }
+
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _versioned_note_ids(path: str, limit: int = 10000) -> List[int]:
+    """IDs of notes that have versions, so version lists are not mostly 404s."""
+    with closing(sqlite3.connect(path)) as connection:
+        rows = connection.execute(
+            "SELECT DISTINCT note_id FROM versions LIMIT ?", (limit,)
+        ).fetchall()
+
+    return [note_id for note_id, in rows]
+
+
+def _start_server(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    import httpx
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1",
+            "--port", str(port),
+            "--workers", str(args.workers),
+            "--log-level", "warning",
+            "--no-access-log",
+        ],
+        env=dict(os.environ),
+        # `main:app` is imported from `src`
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"uvicorn exited with status {server.returncode}.")
+        try:
+            httpx.get(f"{base_url}/docs", timeout=1)
+            return server, base_url
+        except httpx.TransportError:
+            time.sleep(0.2)
+
+    server.terminate()
+    raise SystemExit("uvicorn did not start within 60 s.")
+
+
+def print_load_results(results: Dict[str, dict]) -> None:
+    width = max((len(name) for name in results), default=4)
+    print(
+        f"{'route':<{width}} {'requests':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+        f"{'p99 ms':>9} {'errors':>7}  kinds"
+    )
+    for name, result in results.items():
+        kinds = ", ".join(f"{kind}: {count}" for kind, count in result["errors"].items())
+        print(
+            f"{name:<{width}} {result['requests']:>8} {result['throughput_rps']:>8.1f} "
+            f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+            f"{result['error_rate']:>7.1%}  {kinds}"
+        )
+
+
+async def _generate(args: argparse.Namespace) -> None:
+    from benchmarks.corpus import generate_corpus
+    from database import close_db
+
+    try:
+        await generate_corpus(args)
+    finally:
+        await close_db()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--url", help="Load an already running server instead.")
+    parser.add_argument("--path", help="SQLite file for the corpus (default: a temporary file).")
+    parser.add_argument(
+        "--reuse-corpus", action="store_true", help="Use the corpus already at --path."
+    )
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=32, help="Concurrent clients.")
+    load.add_argument("--rate", type=float, help="Requests started per second.")
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=256,
+        help="Connection limit of the client with --rate.",
+    )
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=parse_mix(DEFAULT_MIX),
+        help=f"Weights of the request categories (default: {DEFAULT_MIX}).",
+    )
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds.")
+    parser.add_argument(
+        "--warmup-seconds", type=float, default=5, help="Unmeasured seconds before that."
+    )
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds per request.")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes.")
+    parser.add_argument(
+        "--genai-latency-ms", type=float, default=500.0, help="Latency of the GenAI stub."
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    add_corpus_arguments(parser)
+
+    return parser
+
+
+def main(args: argparse.Namespace, directory: str) -> int:
+    server = None
+    # Every generated corpus gives note 1 the full version history
+    versioned_ids = [1]
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        args.path = os.path.abspath(args.path or os.path.join(directory, "benchmark.db"))
+        configure_environment(
+            args.path,
+            GENAI_STUB="true",
+            GENAI_STUB_LATENCY_MS=str(args.genai_latency_ms),
+            RELATED_INDEX_PATH=os.path.join(directory, "related_index"),
+        )
+        if not (args.reuse_corpus and os.path.exists(args.path)):
+            print("Generating the corpus ...")
+            asyncio.run(_generate(args))
+
+        versioned_ids = _versioned_note_ids(args.path) or versioned_ids
+        server, base_url = _start_server(args)
+
+    try:
+        mode = f"{args.rate} req/s" if args.rate else f"{args.concurrency} clients"
+        print(f"Loading {base_url} with {mode} for {args.duration} s ...")
+        results = asyncio.run(run_load(args, base_url, versioned_ids))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print()
+    print_load_results(results)
+
+    if args.output:
+        parameters = {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("path", "output")
+        }
+        write_report(build_report("load", parameters, results), args.output)
+
+    return 0
+
+
+if __name__ == "__main__":
+    arguments = build_parser().parse_args()
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        sys.exit(main(arguments, temporary_directory))
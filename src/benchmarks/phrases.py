@@ -0,0 +1,118 @@
+"""
+Time `get_common_words_phrases` on its own, without the database or the HTTP stack.
+
+Run from `src`:
+
+    python -m benchmarks.phrases --sizes 1000 10000 100000 --phrase-lengths 1 3 5
+
+The note contents come from the same generator as `benchmarks.corpus`, built in memory,
+so the cost of the tokenizer and of the phrase counting can be followed separately from
+the route that calls them. Tokenizing alone is reported as its own case.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+from benchmarks.common import (
+    build_report,
+    compare_with_baseline,
+    configure_environment,
+    print_results,
+    summarize,
+    write_report,
+)
+from benchmarks.corpus import add_corpus_arguments, generate_batches
+
+
+def _time_calls(call: Callable[[], object], runs: int) -> List[float]:
+    # The first call loads the tokenizer and NLTK, which is not what is measured
+    call()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+
+    return timings
+
+
+def run(args: argparse.Namespace) -> dict:
+    from services.analytics_nltk import get_common_words_phrases, tokenize
+
+    args.notes = max(args.sizes)
+    contents = [
+        note["content"] for notes, _ in generate_batches(args) for note in notes
+    ]
+
+    results = {}
+    for size in args.sizes:
+        notes = contents[:size]
+        name = f"tokenize.{size}"
+        results[name] = summarize(
+            _time_calls(lambda: tokenize(" ".join(notes)), args.runs)
+        )
+        print(f"{name}: p50 {results[name]['p50_ms']:.2f} ms")
+
+        for length in args.phrase_lengths:
+            name = f"phrases.{size}.{length}"
+            results[name] = summarize(
+                _time_calls(
+                    lambda: asyncio.run(get_common_words_phrases(notes, length)),
+                    args.runs,
+                )
+            )
+            print(f"{name}: p50 {results[name]['p50_ms']:.2f} ms")
+
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10000], help="Notes per call."
+    )
+    parser.add_argument("--phrase-lengths", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--runs", type=int, default=5, help="Timed calls per case.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Compare with the results stored in this file.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    add_corpus_arguments(parser)
+
+    return parser
+
+
+def main(args: argparse.Namespace, directory: str) -> int:
+    # Nothing is written to this database, but the settings need a path
+    configure_environment(os.path.join(directory, "benchmark.db"))
+
+    results = run(args)
+    print()
+    print_results(results)
+
+    parameters = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("output", "baseline", "fail_on_regression")
+    }
+    if args.output:
+        write_report(build_report("phrases", parameters, results), args.output)
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.tolerance)
+        if regressions and args.fail_on_regression:
+            print(f"\n{len(regressions)} cases are slower than the baseline allows.")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    arguments = build_parser().parse_args()
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        sys.exit(main(arguments, temporary_directory))
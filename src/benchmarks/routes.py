@@ -0,0 +1,337 @@
+"""
+Time every route of the notes, versions and analytics routers against a synthetic corpus.
+
+Run from `src`:
+
+    python -m benchmarks.routes --notes 100000 --output results.json
+    python -m benchmarks.routes --notes 100000 --baseline results.json --fail-on-regression
+
+The corpus is generated with `benchmarks.corpus` (see its options) into a temporary
+directory, or into `--path`, where `--reuse-corpus` skips generating it again. Requests
+go through the in-process ASGI app, and summaries are answered by the local GenAI stub
+after `--genai-latency-ms`, so no network is involved. Read routes are timed first,
+then writes, then deletes, which use notes reserved at the end of the corpus.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, List
+
+import numpy as np
+
+from benchmarks.common import (
+    build_report,
+    compare_with_baseline,
+    configure_environment,
+    print_results,
+    summarize,
+    write_report,
+)
+from benchmarks.corpus import add_corpus_arguments
+
+NOTES = "/api/v1/notes"
+VERSIONS = "/api/v1/versions"
+ANALYTICS = "/api/v1/analytics"
+COMMON = "most-common-words-or-phrases"
+
+# Notes removed by every request of the bulk delete case
+BULK_DELETE_SIZE = 10
+
+
+@dataclass
+class Case:
+    """
+    One timed route. `request(i)` returns the `(method, url, options)` of the i-th
+    request, where options are passed on to `httpx.AsyncClient.request`.
+    """
+
+    name: str
+    request: Callable[[int], tuple]
+    heavy: bool = False
+
+
+@dataclass
+class Corpus:
+    note_ids: np.ndarray
+    reserved_ids: List[int]
+    words: List[str]
+    versioned: List[tuple]
+    has_signatures: bool
+
+
+async def _inspect_corpus(args: argparse.Namespace) -> Corpus:
+    """Pick the notes, words and versions the cases use, reserving notes for deletes."""
+    from sqlalchemy import func, select
+
+    from database import engine, NoteModel, NoteSignatureModel, VersionModel
+
+    per_case = args.warmup + args.requests
+    reserved = per_case * (BULK_DELETE_SIZE + 1)
+
+    async with engine.connect() as conn:
+        note_ids = (
+            await conn.scalars(select(NoteModel.id).order_by(NoteModel.id))
+        ).all()
+        if len(note_ids) < 2 * reserved:
+            raise SystemExit(
+                f"The corpus needs at least {2 * reserved} notes for "
+                f"{per_case} requests per case, it has {len(note_ids)}."
+            )
+
+        sample = (
+            await conn.scalars(select(NoteModel.content).limit(200))
+        ).all()
+        versioned = (
+            await conn.execute(
+                select(VersionModel.note_id, VersionModel.version)
+                .where(VersionModel.note_id.between(2, note_ids[-reserved - 1]))
+                .order_by(VersionModel.id)
+                .limit(per_case)
+            )
+        ).all()
+        has_signatures = bool(
+            await conn.scalar(select(func.count()).select_from(NoteSignatureModel))
+        )
+
+    return Corpus(
+        note_ids=np.array(note_ids[:-reserved]),
+        reserved_ids=note_ids[-reserved:],
+        words=sorted({word for content in sample for word in content.split()}),
+        versioned=[tuple(row) for row in versioned],
+        has_signatures=has_signatures,
+    )
+
+
+def _build_cases(args: argparse.Namespace, corpus: Corpus) -> List[List[Case]]:
+    """The read, write and delete cases, in the order they run."""
+
+    rng = np.random.default_rng(args.seed)
+    count = args.warmup + args.requests
+
+    def random_ids(size: int = count) -> List[int]:
+        return [int(note_id) for note_id in rng.choice(corpus.note_ids, size=size)]
+
+    def random_text(words: int) -> str:
+        return " ".join(rng.choice(corpus.words, size=words))
+
+    ids = random_ids()
+    batches = [random_ids(20) for _ in range(count)]
+    terms = [str(rng.choice(corpus.words)) for _ in range(count)]
+    texts = [random_text(args.mean_words) for _ in range(count)]
+    max_version = max((version for note_id, version in corpus.versioned), default=1)
+    pages = max(len(corpus.note_ids) // 20, 1)
+
+    # A month-long window, to cover the rollup plus edge scans of the time range filters
+    window = {"from": "2024-05-01T12:00:00", "to": "2024-06-01T12:00:00"}
+
+    def get(path: str, **params) -> tuple:
+        return "GET", path, {"params": params}
+
+    def send(method: str, path: str, body: object = None) -> tuple:
+        return method, path, {} if body is None else {"json": body}
+
+    reads = [
+        Case("notes.list", lambda i: get(f"{NOTES}/", page=ids[i] % pages + 1, per_page=20)),
+        Case("notes.detail", lambda i: get(f"{NOTES}/{ids[i]}/")),
+        Case("notes.batch.get", lambda i: get(f"{NOTES}/batch/", ids=",".join(map(str, batches[i])))),
+        Case("notes.batch.post", lambda i: send("POST", f"{NOTES}/batch/", {"ids": batches[i], "versions": "full"})),
+        Case("notes.changes", lambda i: get(f"{NOTES}/changes/", since=0)),
+        Case("notes.search", lambda i: get(f"{NOTES}/search/", q=terms[i])),
+        Case("notes.search.versions", lambda i: get(f"{NOTES}/search/", q=terms[i], scope="versions")),
+        Case("notes.related.text", lambda i: get(f"{NOTES}/related/", q=texts[i])),
+        Case("notes.related", lambda i: get(f"{NOTES}/{ids[i]}/related/")),
+        Case("notes.export", lambda i: get(f"{NOTES}/export/"), heavy=True),
+        Case("versions.list", lambda i: get(f"{VERSIONS}/1")),
+        Case("versions.detail", lambda i: get(f"{VERSIONS}/1/{i % max_version + 1}")),
+        Case("versions.retention.get", lambda i: get(f"{VERSIONS}/{ids[i]}/retention/")),
+        Case("analytics.summary", lambda i: get(f"{ANALYTICS}/summary/", note_id=ids[i])),
+        Case("analytics.total-words", lambda i: get(f"{ANALYTICS}/total-words/")),
+        Case("analytics.total-words.range", lambda i: get(f"{ANALYTICS}/total-words/", **window)),
+        Case("analytics.avg-note-length", lambda i: get(f"{ANALYTICS}/avg-note-length/")),
+        Case("analytics.top-3-longest-notes", lambda i: get(f"{ANALYTICS}/top-3-longest-notes/")),
+        Case("analytics.top-3-shortest-notes", lambda i: get(f"{ANALYTICS}/top-3-shortest-notes/")),
+        Case("analytics.daily", lambda i: get(f"{ANALYTICS}/daily/")),
+        Case("analytics.most-common", lambda i: get(f"{ANALYTICS}/{COMMON}/"), heavy=True),
+        Case("analytics.most-common.range", lambda i: get(f"{ANALYTICS}/{COMMON}/", **window)),
+    ]
+    if corpus.has_signatures:
+        reads += [
+            Case("notes.similar", lambda i: get(f"{NOTES}/{ids[i]}/similar/")),
+            Case("analytics.duplicates", lambda i: get(f"{ANALYTICS}/duplicates/"), heavy=True),
+        ]
+
+    import_body = "\n".join(
+        json.dumps({"content": random_text(args.mean_words)}) for _ in range(100)
+    )
+    import_options = {
+        "content": import_body,
+        "headers": {"Content-Type": "application/x-ndjson"},
+    }
+    writes = [
+        Case("notes.create", lambda i: send("POST", f"{NOTES}/", {"content": texts[i]})),
+        Case("notes.update", lambda i: send("PUT", f"{NOTES}/{ids[i]}/", {"content": texts[-i - 1]})),
+        Case("notes.import", lambda i: ("POST", f"{NOTES}/import/", import_options), heavy=True),
+        Case("versions.retention.put", lambda i: send("PUT", f"{VERSIONS}/{ids[i]}/retention/", {"keep_last": 10})),
+        Case("versions.retention.delete", lambda i: send("DELETE", f"{VERSIONS}/{ids[i]}/retention/")),
+        Case("versions.compact", lambda i: ("POST", f"{VERSIONS}/compact/", {"params": {"note_id": ids[i]}})),
+    ]
+
+    single, bulk = corpus.reserved_ids[:count], corpus.reserved_ids[count:]
+    deletes = [
+        Case("notes.delete", lambda i: send("DELETE", f"{NOTES}/{single[i]}/")),
+        Case(
+            "notes.bulk-delete",
+            lambda i: send(
+                "POST",
+                f"{NOTES}/bulk-delete/",
+                {"ids": bulk[i * BULK_DELETE_SIZE : (i + 1) * BULK_DELETE_SIZE]},
+            ),
+        ),
+    ]
+    if len(corpus.versioned) == count:
+        # Versions of ordinary notes, so the reads of note 1 stay comparable
+        deletes.append(
+            Case(
+                "versions.delete",
+                lambda i: send("DELETE", f"{VERSIONS}/{corpus.versioned[i][0]}/{corpus.versioned[i][1]}"),
+            )
+        )
+
+    return [reads, writes, deletes]
+
+
+async def _time_case(client, case: Case, warmup: int, requests: int) -> List[float]:
+    timings = []
+    for i in range(warmup + requests):
+        method, url, options = case.request(i)
+        started = time.perf_counter()
+        response = await client.request(method, url, **options)
+        elapsed = time.perf_counter() - started
+
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"{case.name}: {method} {url} returned {response.status_code}: {response.text[:200]}"
+            )
+        if i >= warmup:
+            timings.append(elapsed)
+
+    return timings
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from httpx import ASGITransport, AsyncClient
+
+    from benchmarks.corpus import generate_corpus
+    from database import close_db, init_db, write_queue
+    from main import app
+
+    try:
+        if args.reuse_corpus and os.path.exists(args.path):
+            await init_db()
+        else:
+            print("Generating the corpus ...")
+            await generate_corpus(args)
+
+        corpus = await _inspect_corpus(args)
+        selected = args.case or []
+        results = {}
+
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://benchmark", timeout=None
+        ) as client:
+            for stage in _build_cases(args, corpus):
+                for case in stage:
+                    if selected and not any(name in case.name for name in selected):
+                        continue
+
+                    requests = args.heavy_requests if case.heavy else args.requests
+                    warmup = min(args.warmup, 1) if case.heavy else args.warmup
+                    results[case.name] = summarize(
+                        await _time_case(client, case, warmup, requests)
+                    )
+                    print(f"{case.name}: p50 {results[case.name]['p50_ms']:.2f} ms")
+    finally:
+        await write_queue.close()
+        await close_db()
+
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--path", help="SQLite file for the corpus (default: a temporary file).")
+    parser.add_argument(
+        "--reuse-corpus", action="store_true", help="Use the corpus already at --path."
+    )
+    parser.add_argument("--requests", type=int, default=100, help="Timed requests per case.")
+    parser.add_argument(
+        "--heavy-requests",
+        type=int,
+        default=5,
+        help="Timed requests of the cases that read every note, e.g. the export.",
+    )
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed requests per case.")
+    parser.add_argument(
+        "--case", action="append", help="Only run cases containing this text, repeatable."
+    )
+    parser.add_argument(
+        "--genai-latency-ms", type=float, default=0.0, help="Latency of the GenAI stub."
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Compare with the results stored in this file.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed p50 slowdown against the baseline, as a fraction (default: 0.2).",
+    )
+    parser.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="Exit with status 1 when a case is slower than the baseline allows.",
+    )
+    add_corpus_arguments(parser)
+
+    return parser
+
+
+def main(args: argparse.Namespace, directory: str) -> int:
+    args.path = os.path.abspath(args.path or os.path.join(directory, "benchmark.db"))
+    configure_environment(
+        args.path,
+        GENAI_STUB="true",
+        GENAI_STUB_LATENCY_MS=str(args.genai_latency_ms),
+        RELATED_INDEX_PATH=os.path.join(directory, "related_index"),
+    )
+
+    results = asyncio.run(run(args))
+    print()
+    print_results(results)
+
+    parameters = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("path", "output", "baseline", "fail_on_regression")
+    }
+    if args.output:
+        write_report(build_report("routes", parameters, results), args.output)
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.tolerance)
+        if regressions and args.fail_on_regression:
+            print(f"\n{len(regressions)} cases are slower than the baseline allows.")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    arguments = build_parser().parse_args()
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        sys.exit(main(arguments, temporary_directory))
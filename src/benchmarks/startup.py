@@ -0,0 +1,105 @@
+"""
+Measure how long `import main` takes in a fresh interpreter.
+
+Run from `src`:
+
+    python -m benchmarks.startup --runs 10 --max-seconds 2
+
+Each run starts a new Python process, so nothing is cached in memory between runs.
+The slowest imports of the last run are listed from `python -X importtime`. With
+`--max-seconds`, the command exits with status 1 when the median is slower, which
+lets CI track startup regressions.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+IMPORT_MAIN = "import main"
+
+
+def _environment(directory: str) -> dict:
+    environment = dict(os.environ)
+    environment.setdefault("ENVIRONMENT", "developing")
+    environment.setdefault("GENAI_API_KEY", "benchmark")
+    environment["PATH_TO_DB"] = os.path.join(directory, "benchmark.db")
+
+    return environment
+
+
+def _time_import(environment: dict) -> float:
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", IMPORT_MAIN], env=environment, check=True
+    )
+
+    return time.perf_counter() - started
+
+
+def _slowest_imports(environment: dict, count: int) -> list:
+    """Parse `-X importtime` output into `(cumulative seconds, module)`, slowest first."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_MAIN],
+        env=environment,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, module = line.split("|")
+        # Nested imports are indented by two more spaces than their parent
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        # Only `main` and what it imports directly, deeper imports are part of their time
+        if depth <= 1:
+            imports.append((int(cumulative) / 1_000_000, module.strip()))
+
+    return sorted(imports, reverse=True)[:count]
+
+
+def run(args: argparse.Namespace, directory: str) -> int:
+    environment = _environment(directory)
+
+    # The first run also warms the filesystem cache and writes bytecode
+    _time_import(environment)
+    timings = [_time_import(environment) for _ in range(args.runs)]
+    median = statistics.median(timings)
+
+    print(
+        f"import main: median {median:.3f} s, min {min(timings):.3f} s, "
+        f"max {max(timings):.3f} s over {args.runs} runs"
+    )
+    print(f"\n{'cumulative s':>12}  module")
+    for seconds, module in _slowest_imports(environment, args.top):
+        print(f"{seconds:>12.3f}  {module}")
+
+    if args.max_seconds is not None and median > args.max_seconds:
+        print(f"\nStartup is slower than {args.max_seconds} s.")
+        return 1
+
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list.")
+    parser.add_argument(
+        "--max-seconds", type=float, help="Fail when the median import time is higher."
+    )
+
+    return parser
+
+
+if __name__ == "__main__":
+    arguments = build_parser().parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        sys.exit(run(arguments, directory))
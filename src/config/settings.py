@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from typing import List, Optional
 
 from dotenv import load_dotenv
 from pydantic import ConfigDict
@@ -16,6 +17,128 @@ class Settings(BaseSettings):
     DEBUG: bool = False
     GENAI_API_KEY: str = ""
     GENAI_MODEL: str = "gemini-2.0-flash"
+    # Answer summaries locally, after a simulated call latency, for benchmarks and load tests
+    GENAI_STUB: bool = False
+    GENAI_STUB_LATENCY_MS: float = 0.0
+
+    # Import NLTK, the GenAI SDK and SciPy in the background once the app has started,
+    # instead of on the first request that needs them
+    WARM_UP_ON_STARTUP: bool = True
+    NLTK_RESOURCES: List[str] = ["punkt_tab"]  # Downloaded by `manage.py nltk-download`
+
+    # Prometheus metrics at `/metrics`; the event loop lag is sampled every interval
+    METRICS_ENABLED: bool = True
+    METRICS_LOOP_LAG_INTERVAL: float = 0.5  # Seconds, 0 disables the sampling
+
+    # Debugging aid: record the queries of every request, summarize them in a response
+    # header, log repeated statements (N+1) and the query plan of slow statements
+    SQL_PROFILER_ENABLED: bool = False
+    SQL_PROFILER_HEADER: str = "X-Query-Summary"
+    SQL_PROFILER_SLOW_QUERY_MS: float = 50.0
+    SQL_PROFILER_REPEAT_THRESHOLD: int = 5  # Runs of one statement shape per request
+
+    # Sampling profiles of single requests, saved as folded stacks for flame graphs: with
+    # `DEBUG`, requests sending the secret in the header; otherwise a share of all requests
+    REQUEST_PROFILER_HEADER: str = "X-Profile-Request"
+    REQUEST_PROFILER_SECRET: str = ""  # Empty disables the header
+    REQUEST_PROFILER_SAMPLE_RATE: float = 0.0  # 0.01 profiles 1% of requests
+    REQUEST_PROFILER_INTERVAL_MS: float = 1.0
+    REQUEST_PROFILER_DIR: str = str(BASE_DIR / "profiles")
+
+    # SQLite connection tuning
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_CACHE_SIZE: int = -64000  # Negative values are in KiB
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_BUSY_TIMEOUT: int = 5000  # Milliseconds
+    SQLITE_TEMP_STORE: str = "MEMORY"
+    SQLITE_READ_POOL_SIZE: int = 4
+    SQLITE_WRITE_TIMEOUT: float = 30.0  # Seconds to wait for the writer connection
+    # Seconds clients are told to wait in `Retry-After` when the database stayed locked
+    DATABASE_BUSY_RETRY_AFTER: int = 1
+
+    # Optional horizontal sharding: notes and their versions live in the file of shard
+    # `note_id % SHARD_COUNT`, each with a writer of its own. Shard 0 is `PATH_TO_DB`, the
+    # others sit next to it; run `manage.py rebalance` after changing the count
+    SHARD_COUNT: int = 1
+    SHARD_REBALANCE_BATCH_SIZE: int = 500
+
+    # Online backups with SQLite's backup API, copying a few pages per step and pausing
+    # in between so writers get the database
+    BACKUP_DIR: str = str(BASE_DIR / "database" / "backups")
+    BACKUP_STEP_PAGES: int = 1024
+    BACKUP_STEP_SLEEP_MS: float = 1.0
+    # Token for the admin endpoints (backup and restore), empty disables them
+    ADMIN_TOKEN: str = ""
+
+    # Group commit batches concurrent note writes into one transaction
+    GROUP_COMMIT_ENABLED: bool = False
+    GROUP_COMMIT_MAX_DELAY_MS: float = 2.0
+    GROUP_COMMIT_MAX_BATCH: int = 64
+
+    # HTTP caching: versions are immutable, so clients may keep them this long
+    VERSION_CACHE_MAX_AGE: int = 365 * 24 * 60 * 60
+
+    # In-process cache of encoded note responses, 0 disables it. Set the revalidation
+    # flag when several processes write to the same database
+    NOTE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    NOTE_CACHE_REVALIDATE: bool = False
+    # In-process cache of encoded version diffs; versions are immutable, so entries
+    # only leave it when it is full. 0 disables it
+    VERSION_DIFF_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+
+    # Encode list responses straight from SQL rows instead of ORM objects and Pydantic
+    FAST_LIST_SERIALIZATION: bool = True
+
+    # Raw note uploads are spooled in memory up to the spool size, then to a temporary
+    # file, and written to SQLite with incremental blob I/O. Content is read back the same
+    # way, one chunk at a time
+    NOTE_UPLOAD_MAX_BYTES: int = 256 * 1024 * 1024
+    NOTE_UPLOAD_SPOOL_BYTES: int = 1024 * 1024
+    NOTE_BLOB_CHUNK_SIZE: int = 64 * 1024
+
+    # Maximum number of notes loaded by one batch retrieve request
+    NOTE_BATCH_MAX_IDS: int = 1000
+
+    # Change feed: SSE streams wake up on local writes and poll for other processes' writes
+    CHANGE_FEED_POLL_SECONDS: float = 2.0
+    CHANGE_FEED_HEARTBEAT_SECONDS: float = 15.0
+    CHANGE_FEED_BATCH_SIZE: int = 500
+    CHANGE_LOG_RETENTION_DAYS: Optional[int] = 30
+
+    # Near-duplicate detection: MinHash over word shingles, indexed with LSH bands.
+    # Signatures are computed on write unless disabled; run `manage.py similarity-rebuild`
+    # after changing the MinHash parameters
+    NEAR_DUPLICATE_INDEX_ON_WRITE: bool = True
+    NEAR_DUPLICATE_SHINGLE_SIZE: int = 3
+    NEAR_DUPLICATE_NUM_PERM: int = 128
+    NEAR_DUPLICATE_BANDS: int = 16
+    NEAR_DUPLICATE_THRESHOLD: float = 0.8
+
+    # TF-IDF related notes index, persisted here and memory-mapped on load (`None`
+    # keeps it in memory). Changed notes are merged into the stored matrix in batches
+    RELATED_INDEX_PATH: Optional[str] = str(BASE_DIR / "database" / "source" / "related_index")
+    RELATED_INDEX_MAX_DELTA: int = 5000
+
+    # Full-text search
+    SEARCH_INDEX_VERSIONS: bool = True
+    SEARCH_SNIPPET_TOKENS: int = 16
+
+    # Version retention (global policy, `None` disables a rule)
+    VERSION_RETENTION_KEEP_LAST: Optional[int] = None
+    VERSION_RETENTION_HOURLY_AFTER_DAYS: Optional[int] = None
+    VERSION_RETENTION_DAILY_AFTER_DAYS: Optional[int] = None
+    VERSION_RETENTION_MAX_BYTES: Optional[int] = None
+    VERSION_COMPACTION_INTERVAL_SECONDS: int = 0
+    VERSION_COMPACTION_BATCH_SIZE: int = 500
+    SQLITE_INCREMENTAL_VACUUM: bool = True
+
+    BULK_DELETE_BATCH_SIZE: int = 1000
+    IMPORT_BATCH_SIZE: int = 1000
+    IMPORT_TRANSACTION_SIZE: int = 20000
+    IMPORT_MAX_REPORTED_ERRORS: int = 100
+    EXPORT_FETCH_SIZE: int = 1000
+    EXPORT_CHUNK_SIZE: int = 64 * 1024
 
     class Config:
         env_file = str(Path(__file__).parent.parent.parent / ".env")
@@ -23,6 +146,7 @@ class Settings(BaseSettings):
 
 class TestingSettings(Settings):
     PATH_TO_DB: str = ":memory:"
+    RELATED_INDEX_PATH: Optional[str] = None
 
 
 def get_settings() -> BaseSettings:
@@ -2,11 +2,56 @@ from database.models import (
     Base,
     NoteModel,
     VersionModel,
+    VersionRetentionPolicyModel,
+    NoteChangeModel,
+    DailyNoteStatsModel,
+    NoteSignatureModel,
+    NoteLshBucketModel,
+    NoteUploadModel,
 )
 from database.session import (
     init_db,
     close_db,
     get_db_contextmanager,
     get_db,
+    get_read_db,
+    get_write_db,
     reset_sqlite_database,
+    incremental_vacuum,
+    is_database_busy,
+    engine,
+    read_engine,
+    Shard,
+    shards,
+    shard_path,
+    create_shard,
+    get_shard,
+)
+from database.sharding import (
+    is_sharded,
+    last_note_id,
+    next_note_id,
+    allocate_note_id,
+    gather_shards,
+    rebalance_shards,
+)
+from database.backup import (
+    backup_database,
+    restore_database,
+    list_snapshots,
+    SNAPSHOT_SUFFIXES,
+)
+from database.blobs import (
+    run_on_driver_connection,
+    write_blob,
+    read_blob,
+)
+from database.rollups import rebuild_daily_stats
+from database.search import (
+    rebuild_search_index,
+    optimize_search_index,
+)
+from database.group_commit import (
+    write_queue,
+    run_write,
 )
@@ -0,0 +1,275 @@
+import asyncio
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, UTC
+from pathlib import Path
+from typing import Dict, List
+
+import aiosqlite
+
+from config import get_settings
+from database.session import IS_MEMORY_DB, engine, read_engine, init_db, close_db
+
+settings = get_settings()
+
+SNAPSHOT_SUFFIXES = (".db", ".db.gz")
+_COPY_BUFFER = 1024 * 1024
+
+
+class _BackupProgress:
+    """
+    Progress callback of `sqlite3.Connection.backup`, called after every step.
+
+    It sleeps between steps so writers get the database in between, and records how long
+    each step held the source, which is the longest a writer could have waited on it.
+    """
+
+    def __init__(self, step_sleep: float):
+        self.step_sleep = step_sleep
+        self.steps = 0
+        self.restarts = 0
+        self.pages = 0
+        self.max_step_seconds = 0.0
+        self._remaining = None
+        self._step_started = time.perf_counter()
+
+    def __call__(self, status: int, remaining: int, total: int) -> None:
+        self.max_step_seconds = max(
+            self.max_step_seconds, time.perf_counter() - self._step_started
+        )
+        self.steps += 1
+        self.pages = total
+
+        # SQLite starts over when another connection wrote to the source in between steps
+        if self._remaining is not None and remaining > self._remaining:
+            self.restarts += 1
+        self._remaining = remaining
+
+        if remaining and self.step_sleep > 0:
+            time.sleep(self.step_sleep)
+        self._step_started = time.perf_counter()
+
+
+def _snapshot_name() -> str:
+    now = datetime.now(UTC)
+
+    return f"notes-{now:%Y%m%dT%H%M%S}{now.microsecond // 1000:03d}Z.db"
+
+
+def _compress(path: Path) -> Path:
+    compressed = path.with_name(path.name + ".gz")
+    with open(path, "rb") as source, gzip.open(compressed, "wb", compresslevel=6) as target:
+        shutil.copyfileobj(source, target, _COPY_BUFFER)
+    path.unlink()
+
+    return compressed
+
+
+def _decompress(path: Path) -> Path:
+    decompressed = path.with_name(path.name[: -len(".gz")] + ".restoring")
+    with gzip.open(path, "rb") as source, open(decompressed, "wb") as target:
+        shutil.copyfileobj(source, target, _COPY_BUFFER)
+
+    return decompressed
+
+
+def _check_snapshot(path: Path) -> None:
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        [(result,)] = connection.execute("PRAGMA quick_check(1)").fetchall()
+        has_notes = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes'"
+        ).fetchone()
+    except sqlite3.DatabaseError as error:
+        raise ValueError(f"Not a SQLite database: {error}") from error
+    finally:
+        connection.close()
+
+    if result != "ok":
+        raise ValueError(f"The snapshot is corrupt: {result}")
+    if not has_notes:
+        raise ValueError("The snapshot has no notes table.")
+
+
+def list_snapshots(directory: str) -> List[dict]:
+    """
+    List the snapshots in a backup directory, newest first.
+
+    :param directory: The backup directory, usually `BACKUP_DIR`.
+    :return: The name, size and modification time of every snapshot.
+    """
+    if not os.path.isdir(directory):
+        return []
+
+    snapshots = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(SNAPSHOT_SUFFIXES):
+            stat = entry.stat()
+            snapshots.append(
+                {
+                    "name": entry.name,
+                    "bytes": stat.st_size,
+                    "modified_at": datetime.fromtimestamp(stat.st_mtime, UTC),
+                }
+            )
+
+    return sorted(snapshots, key=lambda snapshot: snapshot["name"], reverse=True)
+
+
+async def backup_database(directory: str, compress: bool = False) -> dict:
+    """
+    Copy the live database to a new snapshot file with SQLite's online backup API.
+
+    Pages are copied `BACKUP_STEP_PAGES` at a time from a read-only connection, with a
+    pause of `BACKUP_STEP_SLEEP_MS` between steps. In WAL mode, the source connection
+    holds one read transaction for the whole copy, so the snapshot is consistent, the
+    copy never restarts and writers are never blocked. In the other journal modes, each
+    step holds a shared lock that writers wait for, and a write in between steps makes
+    SQLite start the copy over.
+    The snapshot is written under a temporary name and renamed once complete.
+
+    :param directory: The directory to write the snapshot to, usually `BACKUP_DIR`.
+    :param compress: Gzip the snapshot once copied.
+    :return: The snapshot path and size, and the throughput and stall time of the copy.
+    """
+    directory = Path(directory)
+    await asyncio.to_thread(directory.mkdir, parents=True, exist_ok=True)
+
+    path = directory / _snapshot_name()
+    partial = path.with_name(path.name + ".partial")
+    progress = _BackupProgress(settings.BACKUP_STEP_SLEEP_MS / 1000)
+
+    started = time.perf_counter()
+    async with read_engine.connect() as conn:
+        [journal_mode] = (await conn.exec_driver_sql("PRAGMA journal_mode")).scalars()
+        if journal_mode.lower() == "wal":
+            # Reading inside the transaction is what pins its snapshot
+            await conn.exec_driver_sql("SELECT count(*) FROM sqlite_master")
+        else:
+            # Every step takes its own shared lock, released for writers in between
+            await conn.rollback()
+
+        raw_connection = await conn.get_raw_connection()
+        # The copy runs in the thread of the source connection
+        target = sqlite3.connect(partial, check_same_thread=False)
+        try:
+            await raw_connection.driver_connection.backup(
+                target, pages=settings.BACKUP_STEP_PAGES, progress=progress
+            )
+        finally:
+            target.close()
+
+        await conn.rollback()
+    copy_seconds = time.perf_counter() - started
+
+    await asyncio.to_thread(partial.rename, path)
+    size = path.stat().st_size
+
+    compressed_size = None
+    if compress:
+        path = await asyncio.to_thread(_compress, path)
+        compressed_size = path.stat().st_size
+
+    return {
+        "path": str(path),
+        "bytes": size,
+        "compressed_bytes": compressed_size,
+        "pages": progress.pages,
+        "steps": progress.steps,
+        "restarts": progress.restarts,
+        "copy_seconds": round(copy_seconds, 4),
+        "total_seconds": round(time.perf_counter() - started, 4),
+        "mb_per_second": round(size / 1e6 / copy_seconds, 2) if copy_seconds else 0.0,
+        "max_stall_ms": round(progress.max_step_seconds * 1000, 3),
+    }
+
+
+async def _read_sequences() -> Dict[str, int]:
+    async with engine.connect() as conn:
+        has_sequences = (
+            await conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_sequence'"
+            )
+        ).scalar()
+        if not has_sequences:
+            return {}
+
+        result = await conn.exec_driver_sql("SELECT name, seq FROM sqlite_sequence")
+
+        return {name: seq for name, seq in result}
+
+
+async def _raise_sequences(sequences: Dict[str, int]) -> None:
+    async with engine.begin() as conn:
+        for name, seq in sequences.items():
+            exists = (
+                await conn.exec_driver_sql(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+                )
+            ).scalar()
+            if not exists:
+                continue
+
+            await conn.exec_driver_sql(
+                "UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?", (seq, name)
+            )
+            await conn.exec_driver_sql(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? WHERE NOT EXISTS "
+                "(SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+                (name, seq, name),
+            )
+
+
+async def restore_database(snapshot: str) -> dict:
+    """
+    Replace the content of the live database with a snapshot.
+
+    The snapshot is checked first, then copied in one backup step through the writer
+    connection, so no other write can interleave. The engines are disposed afterwards,
+    dropping every connection opened on the old content, and `init_db` upgrades the
+    restored schema to the current models.
+    The `AUTOINCREMENT` sequences are then raised back to where the live database had
+    them, so IDs handed out before the restore are never handed out again: change feed
+    cursors stay valid, new changes get IDs above every cursor already sent, and new
+    notes and versions cannot take over the cached URLs of the ones the restore dropped.
+    Caches built from the old content are not cleared here.
+
+    :param snapshot: Path of a snapshot made by `backup_database`, compressed or not.
+    :raise ValueError: When the file is not an intact snapshot of the notes database.
+    :return: The size of the restored database and the duration of the restore.
+    """
+    path = Path(snapshot)
+    started = time.perf_counter()
+
+    decompressed = None
+    if path.name.endswith(".gz"):
+        decompressed = path = await asyncio.to_thread(_decompress, path)
+
+    try:
+        await asyncio.to_thread(_check_snapshot, path)
+        sequences = await _read_sequences()
+
+        async with engine.connect() as conn:
+            raw_connection = await conn.get_raw_connection()
+            async with aiosqlite.connect(path) as source:
+                await source.backup(raw_connection.driver_connection)
+
+        size = path.stat().st_size
+    finally:
+        if decompressed is not None:
+            decompressed.unlink(missing_ok=True)
+
+    # An in-memory database lives in its connection, which must be kept
+    if not IS_MEMORY_DB:
+        await close_db()
+    await init_db()
+    # After `init_db`, whose table rebuilds number the sequences from the restored rows
+    await _raise_sequences(sequences)
+
+    return {
+        "bytes": size,
+        "seconds": round(time.perf_counter() - started, 4),
+    }
@@ -0,0 +1,96 @@
+import sqlite3
+from typing import BinaryIO, Callable, Optional, Tuple, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+T = TypeVar("T")
+
+
+async def run_on_driver_connection(
+    db: AsyncSession, function: Callable[..., T], *args
+) -> T:
+    """
+    Call `function(sqlite3_connection, *args)` on the session's connection, inside its
+    transaction.
+
+    aiosqlite has no blob API, and its `sqlite3` connection may only be used from the
+    thread aiosqlite runs it in, so the call is queued to that thread.
+
+    :param db: The session whose connection to use; a transaction is begun if needed.
+    :param function: A blocking function taking the `sqlite3.Connection` first.
+    :return: The value returned by `function`.
+    """
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+
+    return await driver_connection._execute(function, driver_connection._conn, *args)
+
+
+def _write_blob(
+    connection: sqlite3.Connection,
+    table: str,
+    column: str,
+    row_id: int,
+    source: BinaryIO,
+    chunk_size: int,
+) -> None:
+    with connection.blobopen(table, column, row_id) as blob:
+        while chunk := source.read(chunk_size):
+            blob.write(chunk)
+
+
+async def write_blob(
+    db: AsyncSession,
+    table: str,
+    column: str,
+    row_id: int,
+    source: BinaryIO,
+    chunk_size: int,
+) -> None:
+    """
+    Copy a file into an existing blob, one chunk at a time.
+
+    A blob cannot grow, so the row must already hold a `zeroblob` of the file's size.
+
+    :param source: A file positioned where the copy starts.
+    """
+    await run_on_driver_connection(
+        db, _write_blob, table, column, row_id, source, chunk_size
+    )
+
+
+def _read_blob(
+    connection: sqlite3.Connection,
+    table: str,
+    column: str,
+    row_id: int,
+    start: int,
+    size: int,
+) -> Optional[Tuple[bytes, int]]:
+    try:
+        blob = connection.blobopen(table, column, row_id, readonly=True)
+    except sqlite3.OperationalError as error:
+        if "no such rowid" in str(error):
+            return None
+        raise
+
+    with blob:
+        blob.seek(min(start, len(blob)))
+        return blob.read(size), len(blob)
+
+
+async def read_blob(
+    db: AsyncSession, table: str, column: str, row_id: int, start: int = 0, size: int = 0
+) -> Optional[Tuple[bytes, int]]:
+    """
+    Read part of a blob or text value, opening and closing the blob handle in one call.
+
+    :param start: The offset of the first byte to read.
+    :param size: The number of bytes to read at most (default: none, for the size only).
+    :return: The bytes read and the size of the whole value in bytes, or `None` when the
+        row does not exist.
+    """
+    return await run_on_driver_connection(
+        db, _read_blob, table, column, row_id, start, size
+    )
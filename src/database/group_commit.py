@@ -0,0 +1,163 @@
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import get_settings
+from database.session import AsyncSQLiteSessionLocal, shards
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+WriteOperation = Callable[[AsyncSession], Awaitable[T]]
+
+
+class GroupCommitQueue:
+    """
+    Batch write operations from concurrent requests into a single transaction.
+
+    A single worker task waits for the first queued operation, then collects more for up
+    to `max_delay` seconds or until `max_batch` operations are queued. Each operation runs
+    in its own savepoint, so a failing operation does not affect the others, and the
+    batch is committed once. Futures are resolved only after the commit succeeds, so
+    callers get the same durability as with a commit per request.
+
+    The worker runs in an empty context and each operation in a copy of its caller's,
+    so per-request state kept in context variables (query counts, query profiles) sees
+    the statements of that request's operation and nothing else.
+    """
+
+    def __init__(self, session_factory, max_delay: float, max_batch: int):
+        self._session_factory = session_factory
+        self._max_delay = max_delay
+        self._max_batch = max_batch
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._worker is not None and not self._worker.done() and self._loop is loop:
+            return
+
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._batch_full = asyncio.Event()
+        # Started from whichever request writes first, which must not own its context
+        self._worker = loop.create_task(self._run(), context=contextvars.Context())
+
+    async def submit(self, operation: WriteOperation[T]) -> T:
+        """
+        Queue a write operation and wait until the batch it ends up in is committed.
+
+        :param operation: A coroutine function that performs the write on the given session.
+        :return: The value returned by `operation`.
+        """
+        self._ensure_worker()
+
+        future = self._loop.create_future()
+        self._queue.put_nowait((operation, future, contextvars.copy_context()))
+        if self._queue.qsize() >= self._max_batch:
+            self._batch_full.set()
+
+        return await future
+
+    async def close(self) -> None:
+        """Commit the operations already queued, then stop the worker."""
+        if self._worker is None or self._worker.done():
+            return
+
+        self._queue.put_nowait(None)
+        self._batch_full.set()
+        await self._worker
+        self._worker = None
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+
+            if self._queue.qsize() < self._max_batch - 1:
+                self._batch_full.clear()
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self._max_delay)
+                except asyncio.TimeoutError:
+                    pass
+
+            while len(batch) < self._max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            stop = None in batch
+            await self._commit_batch([item for item in batch if item is not None])
+
+            if stop:
+                return
+
+    async def _commit_batch(
+        self, batch: List[Tuple[WriteOperation, asyncio.Future, contextvars.Context]]
+    ) -> None:
+        outcomes: List[Tuple[asyncio.Future, Any, Optional[BaseException]]] = []
+
+        async def run_nested(session: AsyncSession, operation: WriteOperation) -> Any:
+            async with session.begin_nested():
+                return await operation(session)
+
+        try:
+            async with self._session_factory() as session:
+                for operation, future, context in batch:
+                    # The caller went away before its write started
+                    if future.cancelled():
+                        continue
+
+                    try:
+                        result = await self._loop.create_task(
+                            run_nested(session, operation), context=context
+                        )
+                    except Exception as error:
+                        outcomes.append((future, None, error))
+                    else:
+                        outcomes.append((future, result, None))
+
+                await session.commit()
+        except Exception as error:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+write_queue = GroupCommitQueue(
+    AsyncSQLiteSessionLocal,
+    max_delay=settings.GROUP_COMMIT_MAX_DELAY_MS / 1000,
+    max_batch=settings.GROUP_COMMIT_MAX_BATCH,
+)
+
+
+async def run_write(db: AsyncSession, operation: WriteOperation[T]) -> T:
+    """
+    Run a write operation and commit it, through the group-commit queue when enabled.
+
+    The queue writes to the first shard only, so it is bypassed when notes are sharded;
+    every shard has a writer of its own then.
+
+    :param db: The request's session, used when group commit is disabled.
+    :param operation: A coroutine function that performs the write on the given session.
+    :return: The value returned by `operation`.
+    """
+    if settings.GROUP_COMMIT_ENABLED and len(shards) == 1:
+        return await write_queue.submit(operation)
+
+    result = await operation(db)
+    await db.commit()
+
+    return result
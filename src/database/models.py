@@ -1,7 +1,16 @@
-from datetime import datetime, UTC
-from typing import List
+from datetime import date, datetime, UTC
+from typing import List, Optional
 
-from sqlalchemy import Integer, Text, DateTime, ForeignKey, func
+from sqlalchemy import (
+    Integer,
+    String,
+    Text,
+    Date,
+    DateTime,
+    LargeBinary,
+    ForeignKey,
+    func,
+)
 from sqlalchemy.orm import DeclarativeBase, relationship, Mapped, mapped_column
 
 
@@ -11,24 +20,103 @@ class Base(DeclarativeBase):
 
 class NoteModel(Base):
     __tablename__ = "notes"
+    # Never reuse the id of a deleted note, so a new note cannot take over the cached
+    # `/versions/{note_id}/...` responses of an old one
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     content: Mapped[str] = mapped_column(Text, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
-    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), index=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now(), index=True)
 
     versions: Mapped[List["VersionModel"]] = relationship(
-        back_populates="note", cascade="all, delete-orphan"
+        back_populates="note", cascade="all, delete-orphan", passive_deletes=True
     )
 
 
 class VersionModel(Base):
     __tablename__ = "versions"
+    # Never reuse the id of a deleted version, so ids can identify immutable content
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     version: Mapped[int] = mapped_column(Integer, nullable=False)
     content: Mapped[str] = mapped_column(Text, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
 
-    note_id: Mapped[int] = mapped_column(ForeignKey("notes.id"))
+    note_id: Mapped[int] = mapped_column(
+        ForeignKey("notes.id", ondelete="CASCADE"), index=True
+    )
     note: Mapped["NoteModel"] = relationship(back_populates="versions")
+
+
+class VersionRetentionPolicyModel(Base):
+    __tablename__ = "version_retention_policies"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    keep_last: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    hourly_after_days: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    daily_after_days: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    max_total_bytes: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    note_id: Mapped[int] = mapped_column(
+        ForeignKey("notes.id", ondelete="CASCADE"), unique=True
+    )
+
+
+class NoteChangeModel(Base):
+    __tablename__ = "note_changes"
+    # Ids are the feed's cursor, so they must only ever grow
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # No foreign key: the change log outlives deleted notes
+    note_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    action: Mapped[str] = mapped_column(String(16), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+
+class DailyNoteStatsModel(Base):
+    """Per-day totals of the notes created that day, maintained by triggers on `notes`."""
+
+    __tablename__ = "daily_note_stats"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    note_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    word_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    char_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class NoteSignatureModel(Base):
+    """MinHash signature of a note, packed as an array of unsigned 32-bit integers."""
+
+    __tablename__ = "note_signatures"
+
+    note_id: Mapped[int] = mapped_column(
+        ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True
+    )
+    signature: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+class NoteLshBucketModel(Base):
+    """LSH band buckets of the signatures; notes sharing a bucket are duplicate candidates."""
+
+    __tablename__ = "note_lsh_buckets"
+
+    band: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bucket: Mapped[int] = mapped_column(Integer, primary_key=True)
+    note_id: Mapped[int] = mapped_column(
+        ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+
+
+class NoteUploadModel(Base):
+    """
+    Content of a raw note upload, written in place with incremental blob I/O. Rows only
+    live inside the transaction that copies them into a note.
+    """
+
+    __tablename__ = "note_uploads"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
@@ -0,0 +1,79 @@
+from sqlalchemy import Connection, event
+
+from database.models import Base
+
+# Same word count as the analytics routes: spaces plus one
+WORD_COUNT_SQL = "(length({row}.content) - length(replace({row}.content, ' ', '')) + 1)"
+
+ROLLUP_TRIGGERS = ("daily_note_stats_ai", "daily_note_stats_ad", "daily_note_stats_au")
+
+
+def _upsert(row: str, sign: str) -> str:
+    return (
+        "INSERT INTO daily_note_stats (day, note_count, word_count, char_count) "
+        f"VALUES (date({row}.created_at), {sign}1, "
+        f"{sign}{WORD_COUNT_SQL.format(row=row)}, {sign}length({row}.content)) "
+        "ON CONFLICT (day) DO UPDATE SET "
+        "note_count = note_count + excluded.note_count, "
+        "word_count = word_count + excluded.word_count, "
+        "char_count = char_count + excluded.char_count;"
+    )
+
+
+def _triggers_exist(connection: Connection) -> bool:
+    count = connection.exec_driver_sql(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (?, ?, ?)",
+        ROLLUP_TRIGGERS,
+    ).scalar()
+
+    return count == len(ROLLUP_TRIGGERS)
+
+
+def rebuild_daily_stats(connection: Connection) -> None:
+    """Recompute `daily_note_stats` from scratch with a single grouped scan of `notes`."""
+    connection.exec_driver_sql("DELETE FROM daily_note_stats")
+    connection.exec_driver_sql(
+        "INSERT INTO daily_note_stats (day, note_count, word_count, char_count) "
+        f"SELECT date(created_at), count(*), sum({WORD_COUNT_SQL.format(row='notes')}), "
+        "sum(length(content)) FROM notes GROUP BY date(created_at)"
+    )
+
+
+def create_rollup_triggers(connection: Connection, rebuild: bool = False) -> None:
+    """
+    Create the triggers that keep `daily_note_stats` in step with every write to `notes`.
+
+    Notes are counted on the day they were created. The rollup is filled from the
+    existing notes the first time the triggers are created.
+
+    :param rebuild: Recompute the rollup, e.g. after `notes` was recreated.
+    """
+    created = not _triggers_exist(connection)
+
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS daily_note_stats_ai AFTER INSERT ON notes BEGIN "
+        f"{_upsert('new', '')} END"
+    )
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS daily_note_stats_ad AFTER DELETE ON notes BEGIN "
+        f"{_upsert('old', '-')} END"
+    )
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS daily_note_stats_au "
+        "AFTER UPDATE OF content, created_at ON notes BEGIN "
+        f"{_upsert('old', '-')} {_upsert('new', '')} END"
+    )
+
+    if created or rebuild:
+        rebuild_daily_stats(connection)
+
+
+def drop_rollup_triggers(connection: Connection) -> None:
+    """Drop the rollup triggers, e.g. to bulk load notes and rebuild the rollup once after."""
+    for trigger in ROLLUP_TRIGGERS:
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _on_metadata_create(target, connection: Connection, **kwargs) -> None:
+    create_rollup_triggers(connection)
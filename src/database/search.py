@@ -0,0 +1,114 @@
+from typing import List
+
+from sqlalchemy import Connection, event
+
+from config import get_settings
+from database.models import Base
+
+settings = get_settings()
+
+SEARCH_TOKENIZER = "unicode61 remove_diacritics 2"
+
+
+def _search_tables() -> List[tuple]:
+    """
+    `(fts_table, source_table)` pairs of the full-text indexes to maintain.
+
+    Indexing versions is optional because it doubles the write cost of a note update.
+    """
+    tables = [("notes_fts", "notes")]
+    if settings.SEARCH_INDEX_VERSIONS:
+        tables.append(("versions_fts", "versions"))
+
+    return tables
+
+
+def _table_exists(connection: Connection, name: str) -> bool:
+    return (
+        connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).first()
+        is not None
+    )
+
+
+def _create_fts_table(connection: Connection, fts_table: str, source_table: str) -> None:
+    # An external-content table stores only the index, the text stays in the source table
+    connection.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"content, content='{source_table}', content_rowid='id', "
+        f"tokenize='{SEARCH_TOKENIZER}')"
+    )
+    connection.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {source_table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, content) VALUES (new.id, new.content); "
+        f"END"
+    )
+    connection.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {source_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, content) VALUES ('delete', old.id, old.content); "
+        f"END"
+    )
+    connection.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF content ON {source_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, content) VALUES ('delete', old.id, old.content); "
+        f"INSERT INTO {fts_table}(rowid, content) VALUES (new.id, new.content); "
+        f"END"
+    )
+
+
+def _drop_fts_table(connection: Connection, fts_table: str) -> None:
+    for suffix in ("ai", "ad", "au"):
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}")
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {fts_table}")
+
+
+def create_search_index(connection: Connection, rebuild: bool = False) -> None:
+    """
+    Create the FTS5 tables and the triggers that keep them in sync with their source tables.
+
+    Indexes that did not exist yet are built from the existing rows, so enabling search
+    on a populated database needs no extra step.
+
+    :param rebuild: Rebuild every index, e.g. after its source table was recreated.
+    """
+    for fts_table, source_table in _search_tables():
+        created = not _table_exists(connection, fts_table)
+        _create_fts_table(connection, fts_table, source_table)
+
+        if created or rebuild:
+            connection.exec_driver_sql(
+                f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"
+            )
+
+    if not settings.SEARCH_INDEX_VERSIONS:
+        _drop_fts_table(connection, "versions_fts")
+
+
+def drop_search_index(connection: Connection) -> None:
+    """Drop the FTS5 tables and their triggers."""
+    for fts_table in ("notes_fts", "versions_fts"):
+        _drop_fts_table(connection, fts_table)
+
+
+def rebuild_search_index(connection: Connection) -> None:
+    """Rebuild every full-text index from its source table."""
+    create_search_index(connection, rebuild=True)
+
+
+def optimize_search_index(connection: Connection) -> None:
+    """Merge the b-trees of every full-text index into one, for faster queries."""
+    for fts_table, _ in _search_tables():
+        connection.exec_driver_sql(
+            f"INSERT INTO {fts_table}({fts_table}) VALUES ('optimize')"
+        )
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _on_metadata_create(target, connection: Connection, **kwargs) -> None:
+    create_search_index(connection)
+
+
+@event.listens_for(Base.metadata, "before_drop")
+def _on_metadata_drop(target, connection: Connection, **kwargs) -> None:
+    drop_search_index(connection)
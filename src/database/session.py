@@ -1,49 +1,389 @@
+import itertools
+import os
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, List, NamedTuple, Optional, Tuple
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from fastapi import Request
+from sqlalchemy import Connection, Table, event
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import (
+    create_async_engine,
+    AsyncConnection,
+    AsyncEngine,
+    AsyncSession,
+)
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
 
 from config import get_settings
 from database import Base
+from database.rollups import create_rollup_triggers
+from database.search import create_search_index
 
 settings = get_settings()
 
-DATABASE_URL = f"sqlite+aiosqlite:///{settings.PATH_TO_DB}"
+IS_MEMORY_DB = settings.PATH_TO_DB == ":memory:"
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+SQLITE_AUTO_VACUUM_INCREMENTAL = 2
 
-AsyncSQLiteSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)  # type: ignore
 
+def _configure_connection(dbapi_connection, read_only: bool, is_memory: bool) -> None:
+    cursor = dbapi_connection.cursor()
 
-async def init_db() -> None:
+    # SQLite leaves foreign key enforcement (and `ON DELETE CASCADE`) off by default
+    cursor.execute("PRAGMA foreign_keys = ON")
+    cursor.execute(f"PRAGMA busy_timeout = {settings.SQLITE_BUSY_TIMEOUT}")
+    cursor.execute(f"PRAGMA cache_size = {settings.SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size = {settings.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA temp_store = {settings.SQLITE_TEMP_STORE}")
+    if not read_only:
+        # The journal mode is stored in the database file, so only the writer sets it
+        cursor.execute(f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}")
+
+    cursor.close()
+
+    if not is_memory:
+        # Let SQLAlchemy emit BEGIN itself (see the `begin` listeners of `create_engines`) instead of
+        # the driver's implicit, deferred transactions, so savepoints work and the
+        # writer takes the write lock up front
+        dbapi_connection.isolation_level = None
+
+
+def create_engines(path: str) -> Tuple[AsyncEngine, AsyncEngine]:
+    """
+    Create the writer and the read-only engine of a database file.
+
+    :param path: Path of the SQLite file, or `:memory:`.
+    :return: The writer engine and the read engine, which are the same for `:memory:`.
+    """
+    is_memory = path == ":memory:"
+
+    def on_write_connect(dbapi_connection, connection_record) -> None:
+        _configure_connection(dbapi_connection, read_only=False, is_memory=is_memory)
+
+    def on_read_connect(dbapi_connection, connection_record) -> None:
+        _configure_connection(dbapi_connection, read_only=True, is_memory=False)
+
+    def on_write_begin(conn: Connection) -> None:
+        # Taking the write lock at BEGIN avoids failing on a read-to-write upgrade later
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    def on_read_begin(conn: Connection) -> None:
+        conn.exec_driver_sql("BEGIN")
+
+    if is_memory:
+        # An in-memory database lives inside its single connection, which readers and
+        # the writer have to share
+        write_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", echo=False)
+        event.listen(write_engine.sync_engine, "connect", on_write_connect)
+
+        return write_engine, write_engine
+
+    # A single pooled connection serializes writers in the application, instead of
+    # letting them race for the SQLite write lock and fail with "database is locked"
+    write_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}",
+        echo=False,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=settings.SQLITE_WRITE_TIMEOUT,
+    )
+    read_only_engine = create_async_engine(
+        f"sqlite+aiosqlite:///file:{path}?mode=ro&uri=true",
+        echo=False,
+        pool_size=settings.SQLITE_READ_POOL_SIZE,
+        max_overflow=0,
+    )
+
+    event.listen(write_engine.sync_engine, "connect", on_write_connect)
+    event.listen(read_only_engine.sync_engine, "connect", on_read_connect)
+    event.listen(write_engine.sync_engine, "begin", on_write_begin)
+    event.listen(read_only_engine.sync_engine, "begin", on_read_begin)
+
+    return write_engine, read_only_engine
+
+
+class Shard(NamedTuple):
+    index: int
+    path: str
+    engine: AsyncEngine
+    read_engine: AsyncEngine
+    session_factory: sessionmaker
+    read_session_factory: sessionmaker
+
+
+def shard_path(index: int) -> str:
+    """Shard 0 is `PATH_TO_DB` itself, the other shards are files next to it."""
+    if index == 0 or IS_MEMORY_DB:
+        return settings.PATH_TO_DB
+
+    root, extension = os.path.splitext(settings.PATH_TO_DB)
+
+    return f"{root}.shard{index}{extension}"
+
+
+def create_shard(index: int, path: str, count: int) -> Shard:
+    """
+    Open the engines of one shard.
+
+    The sessions carry the shard's position, which `database.sharding` uses to give
+    new notes IDs that route back to it.
+    """
+    write_engine, read_only_engine = create_engines(path)
+    info = {"shard": index, "shard_count": count}
+
+    return Shard(
+        index,
+        path,
+        write_engine,
+        read_only_engine,
+        sessionmaker(bind=write_engine, class_=AsyncSession, expire_on_commit=False, info=info),  # type: ignore
+        sessionmaker(bind=read_only_engine, class_=AsyncSession, expire_on_commit=False, info=info),  # type: ignore
+    )
+
+
+shards: List[Shard] = [
+    create_shard(index, shard_path(index), settings.SHARD_COUNT)
+    for index in range(settings.SHARD_COUNT)
+]
+
+engine, read_engine = shards[0].engine, shards[0].read_engine
+
+AsyncSQLiteSessionLocal = shards[0].session_factory
+AsyncSQLiteReadSessionLocal = shards[0].read_session_factory
+
+
+def get_shard(note_id: int) -> Shard:
+    return shards[note_id % len(shards)]
+
+
+_next_shard = itertools.count()
+
+
+def next_shard() -> Shard:
+    """Pick the shard of the next new note, in turn, so writes spread over every file."""
+    return shards[next(_next_shard) % len(shards)]
+
+
+READ_ONLY_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+async def _execute_on_driver(conn: AsyncConnection, statement: str) -> list:
+    """
+    Run a statement directly on the driver connection, outside of any transaction.
+
+    Pragmas such as `foreign_keys` are ignored inside a transaction and `VACUUM`
+    cannot run in one, while SQLAlchemy opens a transaction before its first statement.
+    """
+    raw_connection = await conn.get_raw_connection()
+    cursor = await raw_connection.driver_connection.execute(statement)
+    rows = await cursor.fetchall()
+    await cursor.close()
+
+    return rows
+
+
+async def init_db(shard_list: Optional[List[Shard]] = None) -> None:
     """
     Initialize the database.
 
-    This function creates all tables defined in the SQLAlchemy ORM models.
+    This function creates all tables defined in the SQLAlchemy ORM models, in every shard.
     It should be called at the application startup to ensure that the database schema exists.
+
+    :param shard_list: The shards to initialize (default: the configured shards).
+    """
+    for shard in shard_list or shards:
+        async with shard.engine.connect() as conn:
+            await _enable_incremental_vacuum(conn)
+
+        async with shard.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async with shard.engine.connect() as conn:
+            await _upgrade_schema(conn)
+
+
+async def _upgrade_schema(conn: AsyncConnection) -> None:
     """
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    Bring tables created by earlier releases in line with the ORM models.
+
+    `create_all` only creates missing tables, so indexes added to existing tables are
+    created here, and tables whose foreign keys lack the model's `ON DELETE` action
+    or whose `AUTOINCREMENT` flag differs are rebuilt, since SQLite cannot alter
+    a constraint in place.
+    The full-text search and daily rollup triggers are (re)created afterwards.
+    """
+    await _execute_on_driver(conn, "PRAGMA foreign_keys = OFF")
+    await _execute_on_driver(conn, "PRAGMA legacy_alter_table = ON")
+    try:
+        await conn.run_sync(_upgrade_tables)
+        await conn.commit()
+    finally:
+        await _execute_on_driver(conn, "PRAGMA legacy_alter_table = OFF")
+        await _execute_on_driver(conn, "PRAGMA foreign_keys = ON")
+
+
+def _upgrade_tables(connection: Connection) -> None:
+    rebuilt = False
+    for table in Base.metadata.sorted_tables:
+        if any(
+            is_outdated(connection, table)
+            for is_outdated in (_has_outdated_foreign_keys, _has_outdated_autoincrement)
+        ):
+            _rebuild_table(connection, table)
+            rebuilt = True
+
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+    # A rebuilt table loses its triggers, so the search index and the daily rollup
+    # are recreated and refilled
+    create_search_index(connection, rebuild=rebuilt)
+    create_rollup_triggers(connection, rebuild=rebuilt)
+
+
+def _has_outdated_foreign_keys(connection: Connection, table: Table) -> bool:
+    existing = {
+        (row["from"], row["on_delete"].upper())
+        for row in connection.exec_driver_sql(
+            f'PRAGMA foreign_key_list("{table.name}")'
+        ).mappings()
+    }
+    expected = {
+        (foreign_key.parent.name, (foreign_key.ondelete or "NO ACTION").upper())
+        for foreign_key in table.foreign_keys
+    }
+
+    return existing != expected
+
+
+def _has_outdated_autoincrement(connection: Connection, table: Table) -> bool:
+    sql = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+    ).scalar()
+
+    return bool(table.dialect_options["sqlite"]["autoincrement"]) != (
+        "AUTOINCREMENT" in (sql or "").upper()
+    )
+
+
+def _rebuild_table(connection: Connection, table: Table) -> None:
+    old_name = f"_{table.name}_old"
+    existing_columns = {
+        row["name"]
+        for row in connection.exec_driver_sql(f'PRAGMA table_info("{table.name}")').mappings()
+    }
+    columns = ", ".join(
+        f'"{column.name}"' for column in table.columns if column.name in existing_columns
+    )
+
+    connection.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "{old_name}"')
+    connection.execute(CreateTable(table))
+    connection.exec_driver_sql(
+        f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM "{old_name}"'
+    )
+    connection.exec_driver_sql(f'DROP TABLE "{old_name}"')
+
+
+async def _enable_incremental_vacuum(conn: AsyncConnection) -> None:
+    """
+    Switch a file-backed database to `auto_vacuum = INCREMENTAL`.
+
+    The mode can only change on an empty database or through a full `VACUUM`,
+    so an existing database is rebuilt once, the first time the setting is enabled.
+    """
+    if not settings.SQLITE_INCREMENTAL_VACUUM or conn.engine.url.database == ":memory:":
+        return
+
+    [(auto_vacuum,)] = await _execute_on_driver(conn, "PRAGMA auto_vacuum")
+    if auto_vacuum == SQLITE_AUTO_VACUUM_INCREMENTAL:
+        return
+
+    await _execute_on_driver(conn, "PRAGMA auto_vacuum = INCREMENTAL")
+    await _execute_on_driver(conn, "VACUUM")
+
+
+async def incremental_vacuum(bind: Optional[AsyncEngine] = None) -> int:
+    """
+    Return free pages to the filesystem so the SQLite file actually shrinks.
+
+    This function runs `PRAGMA incremental_vacuum` and is a no-op unless the database
+    was switched to `auto_vacuum = INCREMENTAL` by `init_db`.
+
+    :param bind: The writer engine of the shard to vacuum (default: the first shard).
+    :return: The number of bytes the database file shrank by.
+    """
+    async with (bind or engine).connect() as conn:
+        [(page_size,)] = await _execute_on_driver(conn, "PRAGMA page_size")
+        [(pages_before,)] = await _execute_on_driver(conn, "PRAGMA page_count")
+
+        # A prepared `PRAGMA incremental_vacuum` frees a single page per step, while
+        # `executescript` steps it to completion
+        raw_connection = await conn.get_raw_connection()
+        await raw_connection.driver_connection.executescript("PRAGMA incremental_vacuum;")
+        [(pages_after,)] = await _execute_on_driver(conn, "PRAGMA page_count")
+
+    return (pages_before - pages_after) * page_size
 
 
 async def close_db() -> None:
     """
     Close the database connection.
 
-    This function disposes of the database engine, releasing all associated resources.
-    It should be called when the application shuts down to properly close the connection pool.
+    This function disposes of the database engines, releasing all associated resources.
+    It should be called when the application shuts down to properly close the connection pools.
     """
-    await engine.dispose()
+    for shard in shards:
+        await shard.engine.dispose()
+        if shard.read_engine is not shard.engine:
+            await shard.read_engine.dispose()
 
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+async def get_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
     """
-    Provide an asynchronous database session.
+    Provide an asynchronous database session suited to the route.
 
-    This function returns an async generator yielding a new database session.
+    Safe methods (GET, HEAD, OPTIONS) get a session from the pool of read-only
+    connections, every other method gets the single, serialized writer connection.
     It ensures that the session is properly closed after use.
 
+    With sharding, the session is on the shard of the `note_id` path or query parameter;
+    other requests write to the shards in turn and read from the first one.
+
+    :return: An asynchronous generator yielding an AsyncSession instance.
+    """
+    shard = shards[0]
+    if len(shards) > 1:
+        note_id = request.path_params.get("note_id") or request.query_params.get("note_id")
+        if note_id is not None and str(note_id).isdigit():
+            shard = get_shard(int(note_id))
+        elif request.method not in READ_ONLY_METHODS:
+            shard = next_shard()
+
+    session_factory = (
+        shard.read_session_factory
+        if request.method in READ_ONLY_METHODS
+        else shard.session_factory
+    )
+    async with session_factory() as session:
+        yield session
+
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Provide an asynchronous database session on a read-only connection.
+
+    :return: An asynchronous generator yielding an AsyncSession instance.
+    """
+    async with AsyncSQLiteReadSessionLocal() as session:
+        yield session
+
+
+async def get_write_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Provide an asynchronous database session on the writer connection.
+
     :return: An asynchronous generator yielding an AsyncSession instance.
     """
     async with AsyncSQLiteSessionLocal() as session:
@@ -51,16 +391,25 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 
 
 @asynccontextmanager
-async def get_db_contextmanager() -> AsyncGenerator[AsyncSession, None]:
+async def get_db_contextmanager(
+    read_only: bool = False, note_id: Optional[int] = None, shard: Optional[Shard] = None
+) -> AsyncGenerator[AsyncSession, None]:
     """
     Provide an asynchronous database session using a context manager.
 
     This function allows for managing the database session within a `with` statement.
     It ensures that the session is properly initialized and closed after execution.
 
+    :param read_only: Use a read-only connection instead of the writer connection.
+    :param note_id: Open the session on the shard of this note.
+    :param shard: Open the session on this shard (default: the first shard).
     :return: An asynchronous generator yielding an AsyncSession instance.
     """
-    async with AsyncSQLiteSessionLocal() as session:
+    if shard is None:
+        shard = get_shard(note_id) if note_id is not None else shards[0]
+
+    session_factory = shard.read_session_factory if read_only else shard.session_factory
+    async with session_factory() as session:
         yield session
 
 
@@ -75,6 +424,22 @@ async def reset_sqlite_database() -> None:
 
     :return: None
     """
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
+    for shard in shards:
+        async with shard.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+
+def is_database_busy(error: Exception) -> bool:
+    """
+    Tell whether an error only means that the database was held by another writer for
+    too long, so the same request may succeed when retried.
+
+    :param error: An exception raised while using a session.
+    :return: True for SQLite's "database is locked" once `SQLITE_BUSY_TIMEOUT` has passed,
+        or when no writer connection was free within `SQLITE_WRITE_TIMEOUT`.
+    """
+    if isinstance(error, PoolTimeoutError):
+        return True
+
+    return isinstance(error, OperationalError) and "database is locked" in str(error.orig)
@@ -0,0 +1,262 @@
+import asyncio
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+
+from sqlalchemy import Connection, delete, event, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import get_settings
+from database.models import NoteModel, VersionModel, VersionRetentionPolicyModel
+from database.session import Shard, shards, get_db_contextmanager
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+
+def is_sharded() -> bool:
+    """Whether notes are spread over more than one database file."""
+    return len(shards) > 1
+
+
+def next_note_id(last_id: int, shard: int, count: int) -> int:
+    """The smallest note ID above `last_id` that routes to the given shard."""
+    candidate = last_id + 1
+
+    return candidate + (shard - candidate) % count
+
+
+def last_note_id(connection: Connection) -> int:
+    """
+    The highest note ID ever given out, deleted notes included, for code that assigns
+    note IDs itself; the IDs above it are free.
+    """
+    return connection.exec_driver_sql(
+        "SELECT max(coalesce((SELECT seq FROM sqlite_sequence WHERE name = ?), 0), "
+        "coalesce((SELECT max(id) FROM notes), 0))",
+        (NoteModel.__tablename__,),
+    ).scalar()
+
+
+@event.listens_for(Session, "before_flush")
+def _assign_note_ids(session: Session, flush_context, instances) -> None:
+    """
+    Give the notes created through a shard's session IDs that route back to that shard.
+
+    SQLite would number them on its own, with IDs that belong to other shards. The
+    writer holds the shard's write lock from `BEGIN IMMEDIATE`, so reading the highest
+    ID first cannot race with another writer of the same shard.
+    """
+    count = session.info.get("shard_count", 1)
+    if count <= 1:
+        return
+
+    new_notes = [
+        instance
+        for instance in session.new
+        if isinstance(instance, NoteModel) and instance.id is None
+    ]
+    if not new_notes:
+        return
+
+    last_id = last_note_id(session.connection())
+    for note in new_notes:
+        note.id = last_id = next_note_id(last_id, session.info["shard"], count)
+
+
+async def allocate_note_id(db: AsyncSession) -> Optional[int]:
+    """
+    The ID of a note inserted with a Core statement, which `_assign_note_ids` does not
+    see, through a shard's writer session.
+
+    :return: An ID that routes back to the session's shard, or `None` without sharding,
+        leaving the choice to SQLite.
+    """
+    count = db.info.get("shard_count", 1)
+    if count <= 1:
+        return None
+
+    connection = await db.connection()
+
+    return next_note_id(await connection.run_sync(last_note_id), db.info["shard"], count)
+
+
+async def gather_shards(
+    db: Optional[AsyncSession],
+    operation: Callable[[AsyncSession], Awaitable[T]],
+    read_only: bool = True,
+    shard_list: Optional[Sequence[Shard]] = None,
+) -> List[T]:
+    """
+    Run a query on every shard concurrently, for the caller to merge the results.
+
+    :param db: The request's session, used as is when there is a single shard.
+    :param operation: A coroutine function that runs the query on the given session.
+    :param read_only: Open read-only sessions instead of the shards' writers.
+    :param shard_list: The shards to query (default: the configured shards).
+    :return: The result of `operation` on each shard, in shard order.
+    """
+    shard_list = shard_list or shards
+    if len(shard_list) == 1 and db is not None:
+        return [await operation(db)]
+
+    async def run(shard: Shard) -> T:
+        async with get_db_contextmanager(read_only=read_only, shard=shard) as session:
+            return await operation(session)
+
+    return await asyncio.gather(*(run(shard) for shard in shard_list))
+
+
+async def _align_version_sequences(shard_list: Sequence[Shard]) -> None:
+    """
+    Raise every shard's version ID sequence to the highest one, so versions moved by a
+    rebalance get IDs no shard has used before.
+    """
+
+    async def read_sequence(db: AsyncSession) -> int:
+        connection = await db.connection()
+        result = await connection.exec_driver_sql(
+            "SELECT max(coalesce((SELECT seq FROM sqlite_sequence WHERE name = ?), 0), "
+            "coalesce((SELECT max(id) FROM versions), 0))",
+            (VersionModel.__tablename__,),
+        )
+        return result.scalar()
+
+    highest = max(
+        await gather_shards(None, read_sequence, read_only=False, shard_list=shard_list)
+    )
+
+    for shard in shard_list:
+        async with get_db_contextmanager(shard=shard) as db:
+            connection = await db.connection()
+            await connection.exec_driver_sql(
+                "UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?",
+                (highest, VersionModel.__tablename__),
+            )
+            await connection.exec_driver_sql(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? WHERE NOT EXISTS "
+                "(SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+                (VersionModel.__tablename__, highest, VersionModel.__tablename__),
+            )
+            await db.commit()
+
+
+async def _read_notes(db: AsyncSession, note_ids: List[int]) -> Dict[str, list]:
+    """Load notes with their versions and retention policies as plain column dicts."""
+
+    def rows(result) -> List[dict]:
+        return [dict(row._mapping) for row in result]
+
+    notes = rows(
+        await db.execute(select(NoteModel.__table__).where(NoteModel.id.in_(note_ids)))
+    )
+    # Version IDs are only unique within a shard, the target numbers them again
+    versions = rows(
+        await db.execute(
+            select(*(column for column in VersionModel.__table__.columns if column.key != "id"))
+            .where(VersionModel.note_id.in_(note_ids))
+            .order_by(VersionModel.id)
+        )
+    )
+    policies = rows(
+        await db.execute(
+            select(
+                *(
+                    column
+                    for column in VersionRetentionPolicyModel.__table__.columns
+                    if column.key != "id"
+                )
+            ).where(VersionRetentionPolicyModel.note_id.in_(note_ids))
+        )
+    )
+
+    return {"notes": notes, "versions": versions, "policies": policies}
+
+
+async def _write_notes(db: AsyncSession, note_ids: List[int], rows: Dict[str, list]) -> None:
+    # A copy left by an interrupted run is replaced, its versions go by `ON DELETE CASCADE`
+    await db.execute(delete(NoteModel).where(NoteModel.id.in_(note_ids)))
+    for model, key in (
+        (NoteModel, "notes"),
+        (VersionModel, "versions"),
+        (VersionRetentionPolicyModel, "policies"),
+    ):
+        if rows[key]:
+            await db.execute(insert(model.__table__), rows[key])
+
+
+async def rebalance_shards(
+    shard_list: Optional[Sequence[Shard]] = None,
+    retired: Sequence[Shard] = (),
+    batch_size: Optional[int] = None,
+) -> dict:
+    """
+    Move every note, with its versions and retention policy, to the shard of its ID.
+
+    Run it after changing `SHARD_COUNT`, while the app is stopped. Each batch is
+    committed in its target shards before it is deleted from its source, so an
+    interrupted run leaves every note in at least one shard and can be run again.
+    Change log entries and the near-duplicate index stay behind; rebuild the latter with
+    `manage.py similarity-rebuild` afterwards.
+
+    :param shard_list: The shards notes are spread over (default: the configured shards).
+    :param retired: Shards beyond the new count, after lowering it; they are emptied.
+    :param batch_size: Notes moved per batch (default: `SHARD_REBALANCE_BATCH_SIZE`).
+    :return: The number of notes and versions moved, and the notes moved out of each shard.
+    """
+    shard_list = list(shard_list or shards)
+    batch_size = batch_size or settings.SHARD_REBALANCE_BATCH_SIZE
+    count = len(shard_list)
+
+    await _align_version_sequences([*shard_list, *retired])
+
+    moved_notes = moved_versions = 0
+    moved_out = {}
+    for source in [*shard_list, *retired]:
+        statement = select(NoteModel.id).order_by(NoteModel.id).limit(batch_size)
+        if source in shard_list:
+            statement = statement.where(NoteModel.id % count != source.index)
+
+        moved_out[source.path] = 0
+        while True:
+            async with get_db_contextmanager(shard=source) as source_db:
+                note_ids = (await source_db.scalars(statement)).all()
+                if not note_ids:
+                    break
+
+                rows = await _read_notes(source_db, note_ids)
+
+                by_target = defaultdict(set)
+                for note_id in note_ids:
+                    by_target[note_id % count].add(note_id)
+
+                for target_index, target_ids in by_target.items():
+                    target_rows = {
+                        key: [
+                            row for row in values
+                            if row.get("note_id", row.get("id")) in target_ids
+                        ]
+                        for key, values in rows.items()
+                    }
+                    async with get_db_contextmanager(
+                        shard=shard_list[target_index]
+                    ) as target_db:
+                        await _write_notes(target_db, list(target_ids), target_rows)
+                        await target_db.commit()
+
+                await source_db.execute(delete(NoteModel).where(NoteModel.id.in_(note_ids)))
+                await source_db.commit()
+
+            moved_notes += len(note_ids)
+            moved_versions += len(rows["versions"])
+            moved_out[source.path] += len(note_ids)
+
+            # Let other tasks run between batches
+            await asyncio.sleep(0)
+
+    return {
+        "moved_notes": moved_notes,
+        "moved_versions": moved_versions,
+        "moved_out": moved_out,
+    }
@@ -1,15 +1,72 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
 
-from database import init_db, close_db
-from routes import note_router, version_router, analytics_router
+from config import get_settings
+from database import (
+    init_db,
+    close_db,
+    is_database_busy,
+    write_queue,
+    shards,
+)
+from routes import (
+    note_router,
+    version_router,
+    analytics_router,
+    metrics_router,
+    admin_router,
+)
+from services import (
+    run_compaction_loop,
+    warm_up_services,
+    instrument_engine,
+    run_loop_lag_monitor,
+    QueryProfilerMiddleware,
+    enable_query_profiler,
+    RequestProfilerMiddleware,
+)
+
+settings = get_settings()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+
+    warm_up_task = None
+    if settings.WARM_UP_ON_STARTUP:
+        warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up_services))
+
+    compaction_task = None
+    if settings.VERSION_COMPACTION_INTERVAL_SECONDS > 0:
+        compaction_task = asyncio.create_task(
+            run_compaction_loop(settings.VERSION_COMPACTION_INTERVAL_SECONDS)
+        )
+
+    loop_lag_task = None
+    if settings.METRICS_ENABLED and settings.METRICS_LOOP_LAG_INTERVAL > 0:
+        loop_lag_task = asyncio.create_task(
+            run_loop_lag_monitor(settings.METRICS_LOOP_LAG_INTERVAL)
+        )
+
     yield
+
+    if warm_up_task:
+        # The import thread cannot be interrupted, only waited for
+        with suppress(Exception):
+            await warm_up_task
+
+    for task in (compaction_task, loop_lag_task):
+        if task:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    await write_queue.close()
     await close_db()
 
 
@@ -19,8 +76,45 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+
+@app.exception_handler(OperationalError)
+@app.exception_handler(PoolTimeoutError)
+async def database_busy_handler(request: Request, error: Exception) -> JSONResponse:
+    """Answer `503` with `Retry-After` when the database stayed locked, instead of a `500`."""
+    if not is_database_busy(error):
+        raise error
+
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The database is busy, retry later."},
+        headers={"Retry-After": str(settings.DATABASE_BUSY_RETRY_AFTER)},
+    )
+
+
 api_version_prefix = "/api/v1"
 
 app.include_router(note_router, prefix=f"{api_version_prefix}/notes")
 app.include_router(version_router, prefix=f"{api_version_prefix}/versions")
 app.include_router(analytics_router, prefix=f"{api_version_prefix}/analytics")
+app.include_router(admin_router, prefix=f"{api_version_prefix}/admin")
+
+if settings.METRICS_ENABLED:
+    for shard in shards:
+        instrument_engine(shard.engine.sync_engine, "write")
+        if shard.read_engine is not shard.engine:
+            instrument_engine(shard.read_engine.sync_engine, "read")
+
+    app.include_router(metrics_router)
+
+if settings.SQL_PROFILER_ENABLED:
+    for shard in shards:
+        enable_query_profiler(shard.engine.sync_engine)
+        if shard.read_engine is not shard.engine:
+            enable_query_profiler(shard.read_engine.sync_engine)
+
+    app.add_middleware(QueryProfilerMiddleware)
+
+if (
+    settings.DEBUG and settings.REQUEST_PROFILER_SECRET
+) or settings.REQUEST_PROFILER_SAMPLE_RATE > 0:
+    app.add_middleware(RequestProfilerMiddleware)
@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import json
+import os
+
+from config import get_settings
+from database import (
+    init_db,
+    close_db,
+    get_db_contextmanager,
+    rebuild_search_index,
+    optimize_search_index,
+    backup_database,
+    is_sharded,
+    shards,
+    get_shard,
+    shard_path,
+    create_shard,
+    rebalance_shards,
+)
+from services import (
+    compact_versions,
+    merge_compaction_reports,
+    prune_change_log,
+    rebuild_similarity_index,
+    related_index,
+    download_nltk_data,
+    restore_snapshot,
+)
+
+settings = get_settings()
+
+
+async def compact_versions_command(args: argparse.Namespace) -> None:
+    reports = []
+    for shard in [get_shard(args.note_id)] if args.note_id is not None else shards:
+        async with get_db_contextmanager(shard=shard) as db:
+            reports.append(await compact_versions(db, args.note_id))
+
+    print(json.dumps(merge_compaction_reports(reports), indent=2))
+
+
+async def search_rebuild_command(args: argparse.Namespace) -> None:
+    for shard in shards:
+        async with shard.engine.begin() as conn:
+            await conn.run_sync(rebuild_search_index)
+
+    print("Search index rebuilt.")
+
+
+async def search_optimize_command(args: argparse.Namespace) -> None:
+    for shard in shards:
+        async with shard.engine.begin() as conn:
+            await conn.run_sync(optimize_search_index)
+
+    print("Search index optimized.")
+
+
+async def prune_changes_command(args: argparse.Namespace) -> None:
+    deleted = 0
+    for shard in shards:
+        async with get_db_contextmanager(shard=shard) as db:
+            deleted += await prune_change_log(db, args.days)
+
+    print(f"Deleted {deleted} change log entries.")
+
+
+async def similarity_rebuild_command(args: argparse.Namespace) -> None:
+    processed = 0
+    for shard in shards:
+        async with get_db_contextmanager(shard=shard) as db:
+            processed += await rebuild_similarity_index(db)
+
+    print(f"Near-duplicate index rebuilt for {processed} notes.")
+
+
+async def rebalance_command(args: argparse.Namespace) -> None:
+    # Shards past the new count, left over from a higher `SHARD_COUNT`, are emptied
+    retired = [
+        create_shard(index, shard_path(index), settings.SHARD_COUNT)
+        for index in range(settings.SHARD_COUNT, args.previous_count)
+        if os.path.exists(shard_path(index))
+    ]
+    await init_db(retired)
+    try:
+        report = await rebalance_shards(retired=retired, batch_size=args.batch_size)
+    finally:
+        for shard in retired:
+            await shard.engine.dispose()
+            await shard.read_engine.dispose()
+
+    print(json.dumps(report, indent=2))
+    if retired:
+        print("Retired shards are empty and can be deleted:")
+        for shard in retired:
+            print(f"  {shard.path}")
+
+    if report["moved_notes"] and settings.NEAR_DUPLICATE_INDEX_ON_WRITE:
+        await similarity_rebuild_command(args)
+
+
+async def related_rebuild_command(args: argparse.Namespace) -> None:
+    async with get_db_contextmanager(read_only=True) as db:
+        indexed = await related_index.rebuild(db)
+
+    print(f"Related notes index rebuilt for {indexed} notes.")
+
+
+async def nltk_download_command(args: argparse.Namespace) -> None:
+    download_nltk_data(args.resource or settings.NLTK_RESOURCES, args.directory)
+
+    print(f"NLTK data downloaded to {args.directory}.")
+
+
+async def backup_command(args: argparse.Namespace) -> None:
+    if is_sharded():
+        raise SystemExit("Backups cover a single database file, notes are sharded.")
+
+    report = await backup_database(args.directory, compress=args.compress)
+
+    print(json.dumps(report, indent=2))
+
+
+async def restore_command(args: argparse.Namespace) -> None:
+    if is_sharded():
+        raise SystemExit("Snapshots restore a single database file, notes are sharded.")
+
+    try:
+        report = await restore_snapshot(args.snapshot)
+    except ValueError as error:
+        raise SystemExit(f"Cannot restore {args.snapshot}: {error}")
+
+    print(json.dumps(report, indent=2))
+    print("Restart running app processes to drop their cached responses.")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="SmartNotes management commands.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compact = subparsers.add_parser(
+        "compact-versions", help="Enforce version retention policies and vacuum the database."
+    )
+    compact.add_argument("--note-id", type=int, help="Only compact a single note.")
+    compact.set_defaults(handler=compact_versions_command)
+
+    search_rebuild = subparsers.add_parser(
+        "search-rebuild", help="Rebuild the full-text search index from the stored notes."
+    )
+    search_rebuild.set_defaults(handler=search_rebuild_command)
+
+    search_optimize = subparsers.add_parser(
+        "search-optimize", help="Merge the full-text search index for faster queries."
+    )
+    search_optimize.set_defaults(handler=search_optimize_command)
+
+    prune_changes = subparsers.add_parser(
+        "prune-changes", help="Delete old entries from the note change log."
+    )
+    prune_changes.add_argument(
+        "--days", type=int, required=True, help="Keep entries newer than this many days."
+    )
+    prune_changes.set_defaults(handler=prune_changes_command)
+
+    similarity_rebuild = subparsers.add_parser(
+        "similarity-rebuild",
+        help="Recompute the MinHash signatures and LSH buckets of every note.",
+    )
+    similarity_rebuild.set_defaults(handler=similarity_rebuild_command)
+
+    related_rebuild = subparsers.add_parser(
+        "related-rebuild",
+        help="Recompute the TF-IDF related notes index and write it to disk.",
+    )
+    related_rebuild.set_defaults(handler=related_rebuild_command)
+
+    nltk_download = subparsers.add_parser(
+        "nltk-download",
+        help="Vendor NLTK data at build time, so the app never downloads it at runtime.",
+    )
+    nltk_download.add_argument(
+        "--resource",
+        action="append",
+        help="Resource to download, repeatable (default: NLTK_RESOURCES).",
+    )
+    nltk_download.add_argument(
+        "--directory",
+        default=settings.NLTK_DATA_PATH,
+        help="Target directory (default: NLTK_DATA_PATH).",
+    )
+    nltk_download.set_defaults(handler=nltk_download_command)
+
+    backup = subparsers.add_parser(
+        "backup",
+        help="Write a snapshot of the live database, without stopping the app.",
+    )
+    backup.add_argument("--compress", action="store_true", help="Gzip the snapshot.")
+    backup.add_argument(
+        "--directory",
+        default=settings.BACKUP_DIR,
+        help="Target directory (default: BACKUP_DIR).",
+    )
+    backup.set_defaults(handler=backup_command)
+
+    restore = subparsers.add_parser(
+        "restore", help="Replace the content of the database with a snapshot."
+    )
+    restore.add_argument("snapshot", help="Path of a .db or .db.gz snapshot.")
+    restore.set_defaults(handler=restore_command)
+
+    rebalance = subparsers.add_parser(
+        "rebalance",
+        help="Move every note and its versions to the shard of its ID, after changing SHARD_COUNT.",
+    )
+    rebalance.add_argument(
+        "--previous-count",
+        type=int,
+        default=settings.SHARD_COUNT,
+        help="The shard count before the change, to empty the shards past the new count.",
+    )
+    rebalance.add_argument(
+        "--batch-size",
+        type=int,
+        default=settings.SHARD_REBALANCE_BATCH_SIZE,
+        help="Notes moved per transaction (default: SHARD_REBALANCE_BATCH_SIZE).",
+    )
+    rebalance.set_defaults(handler=rebalance_command)
+
+    return parser
+
+
+async def run(args: argparse.Namespace) -> None:
+    await init_db()
+    try:
+        await args.handler(args)
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(build_parser().parse_args()))
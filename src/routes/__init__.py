@@ -1,3 +1,5 @@
 from routes.notes import router as note_router
 from routes.versions import router as version_router
-from routes.analytics import router as analytics_router
\ No newline at end of file
+from routes.analytics import router as analytics_router
+from routes.metrics import router as metrics_router
+from routes.admin import router as admin_router
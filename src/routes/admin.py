@@ -0,0 +1,102 @@
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from config import get_settings
+from database import backup_database, list_snapshots, SNAPSHOT_SUFFIXES
+from schemas import (
+    BackupRequestSchema,
+    BackupReportSchema,
+    SnapshotListSchema,
+    RestoreRequestSchema,
+    RestoreReportSchema,
+)
+from routes.metrics import MetricsRoute
+from routes.notes import require_single_shard, SINGLE_SHARD_ONLY
+from services import restore_snapshot
+
+settings = get_settings()
+
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Accept only requests carrying `ADMIN_TOKEN` in the `X-Admin-Token` header."""
+
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="The admin endpoints are disabled.")
+
+    if x_admin_token is None or not hmac.compare_digest(
+        x_admin_token.encode(), settings.ADMIN_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+
+# Snapshots cover a single database file, so they are refused when notes are sharded
+router = APIRouter(
+    route_class=MetricsRoute,
+    dependencies=[Depends(require_admin_token), Depends(require_single_shard)],
+    responses=SINGLE_SHARD_ONLY,
+)
+
+
+@router.post("/backup/", response_model=BackupReportSchema)
+async def create_backup(request: BackupRequestSchema = BackupRequestSchema()):
+    """
+    Write a snapshot of the live database to `BACKUP_DIR`, without stopping writers.
+
+    Args:
+        request (BackupRequestSchema): Whether to gzip the snapshot.
+
+    Returns:
+        The snapshot name and size, with the throughput and stall time of the copy.
+    """
+
+    report = await backup_database(settings.BACKUP_DIR, compress=request.compress)
+
+    return {**report, "name": os.path.basename(report["path"])}
+
+
+@router.get("/backups/", response_model=SnapshotListSchema)
+async def get_backup_list():
+    """
+    List the snapshots in `BACKUP_DIR`.
+
+    Returns:
+        The name, size and time of every snapshot, newest first.
+    """
+
+    return {"snapshots": list_snapshots(settings.BACKUP_DIR)}
+
+
+@router.post("/restore/", response_model=RestoreReportSchema)
+async def restore_backup(request: RestoreRequestSchema):
+    """
+    Replace the live database with a snapshot from `BACKUP_DIR`.
+
+    Writes wait for the restore to finish; the database connections and caches of this
+    process are reset afterwards.
+
+    Args:
+        request (RestoreRequestSchema): The file name of the snapshot.
+
+    Returns:
+        The size of the restored database and the duration of the restore.
+    """
+
+    name = request.name
+    if os.path.basename(name) != name or not name.endswith(SNAPSHOT_SUFFIXES):
+        raise HTTPException(status_code=400, detail="Invalid snapshot name.")
+
+    path = os.path.join(settings.BACKUP_DIR, name)
+    if not os.path.isfile(path):
+        raise HTTPException(
+            status_code=404, detail="Snapshot with the given name was not found."
+        )
+
+    try:
+        report = await restore_snapshot(path)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+    return {**report, "name": name}
@@ -1,24 +1,61 @@
+import heapq
+from datetime import date, datetime
+from typing import Optional, Tuple
+
 from fastapi import Depends, APIRouter, HTTPException
 from fastapi.params import Query
-from sqlalchemy import select, func, cast, Float
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db, NoteModel
-from routes.notes import retrieve_note
-from services import get_common_words_phrases, genai_summarize
+from config import get_settings
+from database import get_db, gather_shards, NoteModel
+from routes.metrics import MetricsRoute
+from routes.notes import get_note_or_404, require_single_shard, SINGLE_SHARD_ONLY
+from services import (
+    get_common_words_phrases,
+    genai_summarize,
+    to_naive_utc,
+    created_between,
+    get_note_totals,
+    get_daily_stats,
+    merge_totals,
+    merge_daily_stats,
+    find_duplicate_pairs,
+)
+
+settings = get_settings()
 
-router = APIRouter()
+router = APIRouter(route_class=MetricsRoute)
 
 
 async def is_note_exists(db: AsyncSession):
-    note_exists = await db.scalar(select(func.count(NoteModel.id) > 0))
+    note_exists = await gather_shards(
+        db, lambda session: session.scalar(select(func.count(NoteModel.id) > 0))
+    )
 
-    if not note_exists:
+    if not any(note_exists):
         raise HTTPException(
             status_code=404, detail="There are no notes in the database."
         )
 
 
+def get_time_range(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Read the creation time window `[from, to)` of the analytics routes, as naive UTC.
+    """
+
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(
+            status_code=400, detail="'from' must be earlier than 'to'."
+        )
+
+    return start, end
+
+
 @router.get("/summary/")
 async def get_note_summary(
     note_id: int = Query(),
@@ -37,44 +74,46 @@ async def get_note_summary(
         The summary of the note.
     """
 
-    note = await retrieve_note(note_id, db)
+    note = await get_note_or_404(note_id, db)
     summary = await genai_summarize(note.content, max_words)
 
     return {"summary": summary}
 
 
 @router.get("/total-words/")
-async def get_total_words(db: AsyncSession = Depends(get_db)):
+async def get_total_words(
+    time_range: Tuple[Optional[datetime], Optional[datetime]] = Depends(get_time_range),
+    db: AsyncSession = Depends(get_db),
+):
     """
-    Retrieve the total word count from all notes in the database using SQLAlchemy.
+    Retrieve the total word count from all notes in the database, read from the daily rollup.
 
     Args:
+        time_range (tuple): Only count notes created in `[from, to)` (default: all notes).
         db (AsyncSession): Database session dependency.
 
     Returns:
-        The total word count of all notes in the database.
+        The total word count of the notes in the database.
     """
     await is_note_exists(db)
 
-    statement = select(
-        func.sum(
-            func.length(NoteModel.content)
-            - func.length(func.replace(NoteModel.content, " ", ""))
-            + 1
-        )
+    totals = merge_totals(
+        await gather_shards(db, lambda session: get_note_totals(session, *time_range))
     )
-    result = await db.execute(statement)
-    total_words = result.scalar() or 0
 
-    return {"total_words": total_words}
+    return {"total_words": totals["words"]}
 
 
 @router.get("/avg-note-length/")
-async def get_avg_note_length(db: AsyncSession = Depends(get_db)):
+async def get_avg_note_length(
+    time_range: Tuple[Optional[datetime], Optional[datetime]] = Depends(get_time_range),
+    db: AsyncSession = Depends(get_db),
+):
     """
     Calculate the average note length across all notes in the database (by character count).
 
     Args:
+        time_range (tuple): Only include notes created in `[from, to)` (default: all notes).
         db (AsyncSession): Database session dependency.
 
     Returns:
@@ -83,12 +122,11 @@ async def get_avg_note_length(db: AsyncSession = Depends(get_db)):
 
     await is_note_exists(db)
 
-    statement = select(
-        func.sum(func.length(NoteModel.content)) / cast(func.count(NoteModel.id), Float)
+    totals = merge_totals(
+        await gather_shards(db, lambda session: get_note_totals(session, *time_range))
     )
-    result = await db.execute(statement)
 
-    avg_note_length = result.scalar()
+    avg_note_length = totals["chars"] / totals["notes"] if totals["notes"] else 0
     avg_note_length_rounded = round(avg_note_length, 2) if avg_note_length else 0
 
     return {"avg_note_length": avg_note_length_rounded}
@@ -96,13 +134,16 @@ async def get_avg_note_length(db: AsyncSession = Depends(get_db)):
 
 @router.get("/most-common-words-or-phrases/")
 async def get_most_common_words_or_phrases(
-    max_phrase_length: int = Query(3, ge=1, le=10), db: AsyncSession = Depends(get_db)
+    max_phrase_length: int = Query(3, ge=1, le=10),
+    time_range: Tuple[Optional[datetime], Optional[datetime]] = Depends(get_time_range),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Extract the most common words or phrases from all notes in the database.
 
     Args:
         max_phrase_length (int): The maximum length of phrases to consider, ranging from 1 to 10 words (default: 3 words).
+        time_range (tuple): Only include notes created in `[from, to)` (default: all notes).
         db (AsyncSession): Database session dependency.
 
     Returns:
@@ -111,8 +152,17 @@ async def get_most_common_words_or_phrases(
 
     await is_note_exists(db)
 
-    result = await db.execute(select(NoteModel.content))
-    notes = result.scalars().all()
+    async def select_contents(session: AsyncSession) -> list:
+        result = await session.execute(
+            select(NoteModel.content).where(*created_between(*time_range))
+        )
+        return result.scalars().all()
+
+    notes = [
+        content
+        for contents in await gather_shards(db, select_contents)
+        for content in contents
+    ]
 
     result = await get_common_words_phrases(notes, max_phrase_length)
 
@@ -120,11 +170,15 @@ async def get_most_common_words_or_phrases(
 
 
 @router.get("/top-3-longest-notes/")
-async def get_top_3_longest_notes(db: AsyncSession = Depends(get_db)):
+async def get_top_3_longest_notes(
+    time_range: Tuple[Optional[datetime], Optional[datetime]] = Depends(get_time_range),
+    db: AsyncSession = Depends(get_db),
+):
     """
     Retrieve the top 3 longest notes in the database (by character count).
 
     Args:
+        time_range (tuple): Only include notes created in `[from, to)` (default: all notes).
         db (AsyncSession): Database session dependency.
 
     Returns:
@@ -133,31 +187,46 @@ async def get_top_3_longest_notes(db: AsyncSession = Depends(get_db)):
 
     await is_note_exists(db)
 
-    statement = (
-        select(NoteModel).order_by(func.length(NoteModel.content).desc()).limit(3)
+    async def select_longest(session: AsyncSession) -> list:
+        statement = (
+            select(NoteModel)
+            .where(*created_between(*time_range))
+            .order_by(func.length(NoteModel.content).desc())
+            .limit(3)
+        )
+        result = await session.execute(statement)
+        notes = result.scalars().all()
+
+        # Add length information to each note
+        return [
+            {
+                "id": note.id,
+                "length": len(note.content),
+                "content": note.content,
+            }
+            for note in notes
+        ]
+
+    # The top 3 of every shard hold the overall top 3
+    notes_with_length = heapq.nlargest(
+        3,
+        (note for notes in await gather_shards(db, select_longest) for note in notes),
+        key=lambda note: note["length"],
     )
-    result = await db.execute(statement)
-    notes = result.scalars().all()
-
-    # Add length information to each note
-    notes_with_length = [
-        {
-            "id": note.id,
-            "length": len(note.content),
-            "content": note.content,
-        }
-        for note in notes
-    ]
 
     return {"top_3_longest_notes": notes_with_length}
 
 
 @router.get("/top-3-shortest-notes/")
-async def get_top_3_shortest_notes(db: AsyncSession = Depends(get_db)):
+async def get_top_3_shortest_notes(
+    time_range: Tuple[Optional[datetime], Optional[datetime]] = Depends(get_time_range),
+    db: AsyncSession = Depends(get_db),
+):
     """
     Retrieve the top 3 shortest notes in the database (by character count).
 
     Args:
+        time_range (tuple): Only include notes created in `[from, to)` (default: all notes).
         db (AsyncSession): Database session dependency.
 
     Returns:
@@ -166,18 +235,87 @@ async def get_top_3_shortest_notes(db: AsyncSession = Depends(get_db)):
 
     await is_note_exists(db)
 
-    statement = select(NoteModel).order_by(func.length(NoteModel.content)).limit(3)
-    result = await db.execute(statement)
-    notes = result.scalars().all()
-
-    # Add length information to each note
-    notes_with_length = [
-        {
-            "id": note.id,
-            "length": len(note.content),
-            "content": note.content,
-        }
-        for note in notes
-    ]
+    async def select_shortest(session: AsyncSession) -> list:
+        statement = (
+            select(NoteModel)
+            .where(*created_between(*time_range))
+            .order_by(func.length(NoteModel.content))
+            .limit(3)
+        )
+        result = await session.execute(statement)
+        notes = result.scalars().all()
+
+        # Add length information to each note
+        return [
+            {
+                "id": note.id,
+                "length": len(note.content),
+                "content": note.content,
+            }
+            for note in notes
+        ]
+
+    # The top 3 of every shard hold the overall top 3
+    notes_with_length = heapq.nsmallest(
+        3,
+        (note for notes in await gather_shards(db, select_shortest) for note in notes),
+        key=lambda note: note["length"],
+    )
 
     return {"top_3_shortest_notes": notes_with_length}
+
+
+@router.get("/daily/")
+async def get_daily_note_stats(
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Retrieve the number of notes, words and characters per day of creation (UTC).
+
+    Args:
+        start (date): The first day to include (default: the first day with notes).
+        end (date): The last day to include (default: the last day with notes).
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        One entry per day that has notes, oldest first.
+    """
+
+    if start is not None and end is not None and start > end:
+        raise HTTPException(
+            status_code=400, detail="'from' must not be later than 'to'."
+        )
+
+    days = await gather_shards(db, lambda session: get_daily_stats(session, start, end))
+
+    return {"days": merge_daily_stats(days)}
+
+
+@router.get(
+    "/duplicates/",
+    dependencies=[Depends(require_single_shard)],
+    responses=SINGLE_SHARD_ONLY,
+)
+async def get_duplicate_notes(
+    threshold: Optional[float] = Query(None, ge=0, le=1),
+    limit: int = Query(100, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Find pairs of near-duplicate notes with the MinHash/LSH index.
+
+    Args:
+        threshold (float): The minimum estimated Jaccard similarity (default: `NEAR_DUPLICATE_THRESHOLD`).
+        limit (int): The maximum number of pairs to return (default: 100).
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        Pairs of note IDs with their estimated similarity, most similar first.
+    """
+
+    if threshold is None:
+        threshold = settings.NEAR_DUPLICATE_THRESHOLD
+
+    return {"duplicates": await find_duplicate_pairs(db, threshold, limit)}
@@ -0,0 +1,71 @@
+import time
+
+from fastapi import APIRouter, Response
+from fastapi.routing import APIRoute
+
+from config import get_settings
+from services.metrics import (
+    CONTENT_TYPE,
+    HTTP_REQUESTS,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS_IN_PROGRESS,
+    HTTP_REQUEST_DB_QUERIES,
+    HTTP_REQUEST_DB_DURATION,
+    registry,
+    request_queries,
+)
+
+settings = get_settings()
+
+router = APIRouter()
+
+
+class MetricsRoute(APIRoute):
+    """
+    Route that records its requests in the metrics, labelled with its path template.
+
+    Timing starts once the request is routed and ends when the last body chunk is sent,
+    so streamed responses are measured in full.
+    """
+
+    async def handle(self, scope, receive, send) -> None:
+        if not settings.METRICS_ENABLED:
+            return await super().handle(scope, receive, send)
+
+        method = scope["method"]
+        status = 500
+
+        async def send_and_record_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method, self.path)
+        in_progress.inc()
+        queries = [0, 0.0]
+        token = request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            await super().handle(scope, receive, send_and_record_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_queries.reset(token)
+            in_progress.dec()
+
+            HTTP_REQUESTS.labels(method, self.path, str(status)).inc()
+            HTTP_REQUEST_DURATION.labels(method, self.path).observe(elapsed)
+            HTTP_REQUEST_DB_QUERIES.labels(method, self.path).observe(queries[0])
+            HTTP_REQUEST_DB_DURATION.labels(method, self.path).observe(queries[1])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Expose the metrics in the Prometheus text format.
+
+    Returns:
+        Request, database, GenAI, cache and event loop metrics of this process.
+    """
+
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
@@ -1,23 +1,202 @@
+import heapq
+from collections import defaultdict
 from datetime import datetime, UTC
+from itertools import islice
+from typing import List, Literal, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select, func
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Text, cast, delete, func, insert, literal, select, update
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from database import get_db, NoteModel, VersionModel
+from config import get_settings
+from database import (
+    get_db,
+    get_read_db,
+    is_database_busy,
+    run_write,
+    NoteModel,
+    VersionModel,
+    NoteChangeModel,
+    NoteUploadModel,
+    write_blob,
+    is_sharded,
+    gather_shards,
+    get_shard,
+    shards,
+    allocate_note_id,
+)
 from schemas import (
     NoteListResponseSchema,
     NoteDetailResponseSchema,
     NoteCreateRequestSchema,
     NoteUpdateRequestSchema,
+    NoteUploadResponseSchema,
+    NoteBulkDeleteRequestSchema,
+    NoteBulkDeleteResponseSchema,
+    NoteImportResponseSchema,
+    NoteSearchResponseSchema,
+    NoteBatchRequestSchema,
+    NoteBatchResponseSchema,
+    NoteChangeListSchema,
+    NoteSimilarListSchema,
+    NoteRelatedListSchema,
+)
+from routes.metrics import MetricsRoute
+from services import (
+    import_note_stream,
+    export_note_stream,
+    search_notes,
+    NOTE_CACHE_CONTROL,
+    etag_matches,
+    not_modified,
+    note_etag,
+    get_note_etag,
+    note_list_etag,
+    get_note_list_etag,
+    note_cache,
+    CachedNote,
+    json_response,
+    CHANGE_CREATED,
+    CHANGE_UPDATED,
+    CHANGE_DELETED,
+    change_notifier,
+    record_changes,
+    fetch_changes,
+    get_oldest_change_id,
+    stream_changes,
+    index_notes,
+    index_signatures,
+    find_similar_notes,
+    find_related_notes,
+    NoteUpload,
+    NoteUploadTooLarge,
+    NoteContentReader,
+    spool_note_upload,
+    parse_byte_range,
 )
 
-router = APIRouter()
+settings = get_settings()
+
+router = APIRouter(route_class=MetricsRoute)
+
+SINGLE_SHARD_ONLY = {501: {"description": "Not available when notes are sharded"}}
+
+
+async def require_single_shard() -> None:
+    """
+    Refuse routes that scan the whole table of the first shard or keep indexes across
+    notes (changes, search, similar and related notes, import and export) when notes
+    are sharded.
+    """
+    if is_sharded():
+        raise HTTPException(
+            status_code=501, detail="This endpoint is not available when notes are sharded."
+        )
+
+
+async def _attach_versions(db: AsyncSession, notes: list) -> list:
+    """
+    Load the versions of `(id, content, created_at, updated_at)` note rows and shape
+    both as plain dicts, straight from result tuples.
+
+    This skips the ORM identity map and Pydantic validation; the keys follow the field
+    order of `NoteDetailResponseSchema`, so the encoded body is unchanged.
+    """
+
+    versions = defaultdict(list)
+    result = await db.execute(
+        select(
+            VersionModel.id,
+            VersionModel.note_id,
+            VersionModel.version,
+            VersionModel.content,
+            VersionModel.created_at,
+        )
+        .where(VersionModel.note_id.in_([note[0] for note in notes]))
+        .order_by(VersionModel.note_id, VersionModel.id)
+    )
+    for version_id, note_id, version, content, created_at in result:
+        versions[note_id].append(
+            {
+                "id": version_id,
+                "note_id": note_id,
+                "version": version,
+                "content": content,
+                "created_at": created_at,
+            }
+        )
+
+    return [
+        {
+            "id": note_id,
+            "content": content,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "versions": versions[note_id],
+        }
+        for note_id, content, created_at, updated_at in notes
+    ]
+
+
+NOTE_ROW_COLUMNS = (NoteModel.id, NoteModel.content, NoteModel.created_at, NoteModel.updated_at)
+
+
+async def _select_note_rows(db: AsyncSession, offset: int, limit: int) -> list:
+    """Load a page of notes and their versions as plain dicts."""
+
+    notes = (
+        await db.execute(select(*NOTE_ROW_COLUMNS).offset(offset).limit(limit))
+    ).all()
+    if not notes:
+        return []
+
+    return await _attach_versions(db, notes)
+
+
+async def _select_sharded_note_page(page: int, per_page: int) -> Tuple[list, int]:
+    """
+    Load a page of notes from every shard, in ID order like the list of a single database.
+
+    Each shard returns the IDs of its first `page * per_page` notes; merging them gives
+    the IDs of the page, which every shard then loads if it holds them.
+
+    :return: The notes of the page as plain dicts, and the number of notes in all shards.
+    """
+
+    offset = (page - 1) * per_page
+
+    async def read_ids(db: AsyncSession) -> Tuple[list, int]:
+        note_ids = await db.scalars(
+            select(NoteModel.id).order_by(NoteModel.id).limit(offset + per_page)
+        )
+        return note_ids.all(), await db.scalar(select(func.count(NoteModel.id)))
+
+    results = await gather_shards(None, read_ids)
+    total_notes = sum(count for _, count in results)
+    page_ids = list(
+        islice(heapq.merge(*(note_ids for note_ids, _ in results)), offset, offset + per_page)
+    )
+    if not page_ids:
+        return [], total_notes
+
+    async def read_notes(db: AsyncSession) -> list:
+        notes = (
+            await db.execute(select(*NOTE_ROW_COLUMNS).where(NoteModel.id.in_(page_ids)))
+        ).all()
+        return await _attach_versions(db, notes) if notes else []
+
+    notes = [note for shard_notes in await gather_shards(None, read_notes) for note in shard_notes]
+
+    return sorted(notes, key=lambda note: note["id"]), total_notes
 
 
 @router.get("/", response_model=NoteListResponseSchema)
 async def get_note_list(
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=20),
     db: AsyncSession = Depends(get_db),
@@ -25,7 +204,14 @@ async def get_note_list(
     """
     Retrieve a paginated list of notes.
 
+    The response carries an ETag; a request with a matching `If-None-Match` header
+    gets a `304 Not Modified` without any note content being loaded. With
+    `FAST_LIST_SERIALIZATION`, rows are encoded straight from the SQL results. With
+    sharding, the shards are read concurrently and merged in ID order.
+
     Args:
+        request (Request): The incoming request, for its conditional headers.
+        response (Response): The outgoing response, for its caching headers.
         page (int): The page number to retrieve (default: 1).
         per_page (int): The number of items per page (default: 10, max: 20).
         db (AsyncSession): Database session dependency.
@@ -34,55 +220,438 @@ async def get_note_list(
         A paginated list of notes with pagination metadata.
     """
 
-    offset = (page - 1) * per_page
+    if is_sharded():
+        # The page is loaded from every shard before the ETag can be compared
+        notes, total_notes = await _select_sharded_note_page(page, per_page)
+        etag = note_list_etag(
+            page,
+            per_page,
+            total_notes,
+            [
+                (
+                    note["id"],
+                    note["updated_at"],
+                    len(note["versions"]),
+                    note["versions"][-1]["id"] if note["versions"] else None,
+                )
+                for note in notes
+            ],
+        )
+    else:
+        etag = await get_note_list_etag(db, page, per_page)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, NOTE_CACHE_CONTROL)
 
-    result = await db.execute(
-        select(NoteModel)
-        .options(selectinload(NoteModel.versions))
-        .offset(offset)
-        .limit(per_page)
-    )
-    notes = result.scalars().all()
+    headers = {"ETag": etag, "Cache-Control": NOTE_CACHE_CONTROL}
+
+    if not is_sharded():
+        offset = (page - 1) * per_page
+
+        if settings.FAST_LIST_SERIALIZATION:
+            notes = await _select_note_rows(db, offset, per_page)
+        else:
+            result = await db.execute(
+                select(NoteModel)
+                .options(selectinload(NoteModel.versions))
+                .offset(offset)
+                .limit(per_page)
+            )
+            notes = result.scalars().all()
+
+        if notes:
+            total_notes = await db.scalar(select(func.count(NoteModel.id)))
 
     if not notes:
-        return {
+        payload = {
             "notes": [],
             "prev_page": None,
             "next_page": None,
             "total_pages": 0,
             "total_items": 0,
         }
+    else:
+        total_pages = (total_notes + per_page - 1) // per_page
+
+        payload = {
+            "notes": notes,
+            "prev_page": (
+                f"/notes/?page={page - 1}&per_page={per_page}" if page > 1 else None
+            ),
+            "next_page": (
+                f"/notes/?page={page + 1}&per_page={per_page}"
+                if page < total_pages
+                else None
+            ),
+            "total_pages": total_pages,
+            "total_items": total_notes,
+        }
+
+    if settings.FAST_LIST_SERIALIZATION:
+        return json_response(payload, headers)
+
+    response.headers.update(headers)
+
+    return payload
+
+
+@router.get(
+    "/export/",
+    response_class=StreamingResponse,
+    dependencies=[Depends(require_single_shard)],
+    responses={
+        200: {
+            "content": {
+                "application/x-ndjson": {"schema": {"type": "string"}},
+                "text/csv": {"schema": {"type": "string"}},
+            }
+        },
+        **SINGLE_SHARD_ONLY,
+    },
+)
+async def export_notes(
+    file_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    since: Optional[datetime] = Query(None),
+    include_versions: bool = Query(False),
+    gzip: bool = Query(False),
+):
+    """
+    Stream every note as NDJSON or CSV, with constant memory use on the server.
+
+    Args:
+        file_format (str): "ndjson" or "csv" (default: "ndjson").
+        since (Optional[datetime]): Only export notes updated at or after this time, for incremental exports.
+        include_versions (bool): Embed the versions of each note (NDJSON only, default: False).
+        gzip (bool): Compress the body on the fly with `Content-Encoding: gzip` (default: False).
+
+    Returns:
+        A streaming response with one note per line (NDJSON) or per row (CSV).
+    """
+
+    if file_format == "csv" and include_versions:
+        raise HTTPException(
+            status_code=400, detail="Versions can only be exported as NDJSON."
+        )
+
+    media_type = "text/csv" if file_format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="notes.{file_format}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        export_note_stream(file_format, since, include_versions, gzip),
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+async def _load_note_batch(db: AsyncSession, ids: List[int], versions: str) -> dict:
+    """
+    Load many notes, and their versions or a summary of them, in two queries.
+
+    :param versions: "none", "summary" or "full".
+    :return: The found notes in the order of `ids` and the ids that do not exist.
+    """
 
-    total_notes = await db.scalar(select(func.count(NoteModel.id)))
-    total_pages = (total_notes + per_page - 1) // per_page
+    ids = list(dict.fromkeys(ids))
+
+    notes = {
+        note_id: {
+            "id": note_id,
+            "content": content,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "version_summary": None,
+            "versions": None,
+        }
+        for note_id, content, created_at, updated_at in await db.execute(
+            select(
+                NoteModel.id, NoteModel.content, NoteModel.created_at, NoteModel.updated_at
+            ).where(NoteModel.id.in_(ids))
+        )
+    }
+
+    if notes and versions == "summary":
+        for note in notes.values():
+            note["version_summary"] = {
+                "count": 0,
+                "latest_version": None,
+                "latest_created_at": None,
+            }
+
+        result = await db.execute(
+            select(
+                VersionModel.note_id,
+                func.count(VersionModel.id),
+                func.max(VersionModel.version),
+                func.max(VersionModel.created_at),
+            )
+            .where(VersionModel.note_id.in_(notes))
+            .group_by(VersionModel.note_id)
+        )
+        for note_id, count, latest_version, latest_created_at in result:
+            notes[note_id]["version_summary"] = {
+                "count": count,
+                "latest_version": latest_version,
+                "latest_created_at": latest_created_at,
+            }
+
+    elif notes and versions == "full":
+        for note in notes.values():
+            note["versions"] = []
+
+        result = await db.execute(
+            select(
+                VersionModel.id,
+                VersionModel.note_id,
+                VersionModel.version,
+                VersionModel.content,
+                VersionModel.created_at,
+            )
+            .where(VersionModel.note_id.in_(notes))
+            .order_by(VersionModel.note_id, VersionModel.id)
+        )
+        for version_id, note_id, version, content, created_at in result:
+            notes[note_id]["versions"].append(
+                {
+                    "id": version_id,
+                    "note_id": note_id,
+                    "version": version,
+                    "content": content,
+                    "created_at": created_at,
+                }
+            )
 
     return {
-        "notes": notes,
-        "prev_page": (
-            f"/notes/?page={page - 1}&per_page={per_page}" if page > 1 else None
-        ),
-        "next_page": (
-            f"/notes/?page={page + 1}&per_page={per_page}"
-            if page < total_pages
-            else None
-        ),
-        "total_pages": total_pages,
-        "total_items": total_notes,
+        "notes": [notes[note_id] for note_id in ids if note_id in notes],
+        "missing": [note_id for note_id in ids if note_id not in notes],
     }
 
 
-@router.get("/{note_id}/", response_model=NoteDetailResponseSchema)
-async def retrieve_note(note_id: int, db: AsyncSession = Depends(get_db)):
+def _group_by_shard(ids: List[int]) -> dict:
+    """Split note IDs by the index of the shard that holds them."""
+    by_shard = defaultdict(list)
+    for note_id in ids:
+        by_shard[get_shard(note_id).index].append(note_id)
+
+    return by_shard
+
+
+async def _load_sharded_note_batch(ids: List[int], versions: str) -> dict:
+    """Load a batch of notes from the shards that hold them, concurrently."""
+    by_shard = _group_by_shard(ids)
+
+    batches = await gather_shards(
+        None,
+        lambda session: _load_note_batch(session, by_shard[session.info["shard"]], versions),
+        shard_list=[shard for shard in shards if shard.index in by_shard],
+    )
+    notes = {note["id"]: note for batch in batches for note in batch["notes"]}
+    ids = list(dict.fromkeys(ids))
+
+    return {
+        "notes": [notes[note_id] for note_id in ids if note_id in notes],
+        "missing": [note_id for note_id in ids if note_id not in notes],
+    }
+
+
+async def _note_batch_response(
+    db: AsyncSession, ids: List[int], versions: str
+) -> Response | dict:
+    if len(ids) > settings.NOTE_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.NOTE_BATCH_MAX_IDS} notes can be retrieved at once.",
+        )
+
+    if is_sharded():
+        payload = await _load_sharded_note_batch(ids, versions)
+    else:
+        payload = await _load_note_batch(db, ids, versions)
+    if settings.FAST_LIST_SERIALIZATION:
+        return json_response(payload)
+
+    return payload
+
+
+@router.get(
+    "/batch/",
+    response_model=NoteBatchResponseSchema,
+)
+async def get_note_batch(
+    ids: str = Query(..., pattern=r"^\d+(,\d+)*$", description="Comma-separated note IDs"),
+    versions: Literal["none", "summary", "full"] = Query("summary"),
+    db: AsyncSession = Depends(get_db),
+):
     """
-    Retrieve a single note by ID.
+    Retrieve many notes in one request, e.g. every card of a board.
 
     Args:
-        note_id (int): The ID of the note to retrieve.
+        ids (str): Comma-separated note IDs, e.g. `3,1,2`.
+        versions (str): "none", "summary" (count and newest version) or "full" (default: "summary").
         db (AsyncSession): Database session dependency.
 
     Returns:
-        The note with the given ID.
+        The found notes in the requested order, and the requested IDs that do not exist.
+    """
+
+    return await _note_batch_response(
+        db, [int(note_id) for note_id in ids.split(",")], versions
+    )
+
+
+@router.post(
+    "/batch/",
+    response_model=NoteBatchResponseSchema,
+)
+async def post_note_batch(
+    batch_data: NoteBatchRequestSchema, db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Retrieve many notes in one request, for ID lists too long for a query string.
+
+    Args:
+        batch_data (NoteBatchRequestSchema): The note IDs and the versions to include.
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        The found notes in the requested order, and the requested IDs that do not exist.
+    """
+
+    return await _note_batch_response(db, batch_data.ids, batch_data.versions)
+
+
+@router.get(
+    "/changes/",
+    response_model=NoteChangeListSchema,
+    dependencies=[Depends(require_single_shard)],
+    responses={
+        200: {"content": {"text/event-stream": {"schema": {"type": "string"}}}},
+        **SINGLE_SHARD_ONLY,
+    },
+)
+async def get_note_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+):
     """
+    Read the feed of note creations, updates and deletions, in the order they happened.
+
+    With `Accept: text/event-stream`, the response is a server-sent event stream that
+    pushes new changes as they are committed; reconnecting clients resume from their
+    `Last-Event-ID`. Otherwise, the changes after `since` are returned as one page.
+
+    Args:
+        request (Request): The incoming request, for its `Accept` and `Last-Event-ID` headers.
+        since (Optional[int]): The `id` of the last change seen (default: 0, or the end of the feed for streams).
+        limit (int): The maximum number of changes in a page (default: 100, max: 1000).
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        A page of changes and the cursor to continue from, or an event stream.
+    """
+
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+
+    streaming = "text/event-stream" in request.headers.get("accept", "")
+    if since is None and streaming:
+        # A new stream starts at the end of the feed, a page at its beginning
+        since = await db.scalar(select(func.max(NoteChangeModel.id))) or 0
+    elif since is None:
+        since = 0
+    else:
+        oldest_id = await get_oldest_change_id(db)
+        if oldest_id is not None and since + 1 < oldest_id:
+            raise HTTPException(
+                status_code=410,
+                detail="Changes after the given ID were pruned, reload the notes.",
+            )
+
+    if streaming:
+        return StreamingResponse(
+            stream_changes(since),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    changes = await fetch_changes(db, since, limit)
+
+    return {"changes": changes, "last_id": changes[-1]["id"] if changes else since}
+
+
+@router.get(
+    "/search/",
+    response_model=NoteSearchResponseSchema,
+    dependencies=[Depends(require_single_shard)],
+    responses=SINGLE_SHARD_ONLY,
+)
+async def search_note_list(
+    q: str = Query(..., min_length=1, max_length=500),
+    scope: Literal["notes", "versions"] = Query("notes"),
+    limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
+    raw: bool = Query(False),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Full-text search over notes, or over their previous versions, ranked by relevance.
+
+    Args:
+        q (str): The search terms; all of them must match, `term*` matches a prefix.
+        scope (str): "notes" or "versions" (default: "notes").
+        limit (int): The number of results per page (default: 10, max: 50).
+        cursor (Optional[str]): The `next_cursor` returned with the previous page.
+        raw (bool): Interpret `q` as FTS5 query syntax, e.g. `apple OR pear` (default: False).
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        The matching notes or versions with highlighted snippets, and the cursor of the next page.
+    """
+
+    if scope == "versions" and not settings.SEARCH_INDEX_VERSIONS:
+        raise HTTPException(status_code=400, detail="Version search is disabled.")
+
+    try:
+        return await search_notes(db, q, scope, limit, cursor, raw)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    except OperationalError as error:
+        if is_database_busy(error):
+            raise
+        raise HTTPException(status_code=400, detail="Invalid search query.")
+
+
+@router.get(
+    "/related/",
+    response_model=NoteRelatedListSchema,
+    dependencies=[Depends(require_single_shard)],
+    responses=SINGLE_SHARD_ONLY,
+)
+async def get_notes_related_to_text(
+    q: str = Query(..., min_length=1, max_length=10000),
+    k: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Rank notes by topic similarity to free text, using the TF-IDF related notes index.
+
+    Args:
+        q (str): The text to compare the notes with.
+        k (int): The maximum number of notes to return (default: 10).
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        The most related notes, best first.
+    """
+
+    return {"related": await find_related_notes(db, k, text=q)}
+
+
+async def get_note_or_404(note_id: int, db: AsyncSession) -> NoteModel:
+    """Load a note with its versions, or raise a 404 if it does not exist."""
 
     result = await db.execute(
         select(NoteModel)
@@ -98,52 +667,188 @@ async def retrieve_note(note_id: int, db: AsyncSession = Depends(get_db)):
     return note
 
 
-@router.post("/", response_model=NoteDetailResponseSchema)
-async def create_note(
-    note_data: NoteCreateRequestSchema, db: AsyncSession = Depends(get_db)
+def _set_note_headers(response: Response, note: NoteDetailResponseSchema) -> None:
+    response.headers["ETag"] = note_etag(
+        note.id,
+        note.updated_at,
+        len(note.versions),
+        max((version.id for version in note.versions), default=None),
+    )
+    response.headers["Cache-Control"] = NOTE_CACHE_CONTROL
+
+
+def _cached_note_response(entry: CachedNote, if_none_match: Optional[str]) -> Response:
+    if etag_matches(if_none_match, entry.etag):
+        return not_modified(entry.etag, NOTE_CACHE_CONTROL)
+
+    return Response(
+        content=entry.body,
+        media_type="application/json",
+        headers={"ETag": entry.etag, "Cache-Control": NOTE_CACHE_CONTROL},
+    )
+
+
+@router.get("/{note_id}/", response_model=NoteDetailResponseSchema)
+async def retrieve_note(
+    note_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
 ):
     """
-    Create a new note.
+    Retrieve a single note by ID.
+
+    The encoded response is kept in an in-process LRU cache, so hot notes are served
+    without querying the database or validating the ORM objects again. The response
+    carries an ETag; a request with a matching `If-None-Match` header gets a
+    `304 Not Modified` without the note being loaded.
 
     Args:
-        note_data (NoteCreateRequestSchema): The data for the new note.
+        note_id (int): The ID of the note to retrieve.
+        request (Request): The incoming request, for its conditional headers.
         db (AsyncSession): Database session dependency.
 
     Returns:
-        The newly created note with an empty list of versions.
+        The note with the given ID.
     """
 
-    note = NoteModel(**note_data.model_dump())
-    db.add(note)
-    await db.commit()
+    if_none_match = request.headers.get("if-none-match")
 
-    # Refresh with explicit relationship loading
-    result = await db.execute(
-        select(NoteModel)
-        .where(NoteModel.id == note.id)
-        .options(selectinload(NoteModel.versions))
+    cached = note_cache.get(note_id)
+    if cached and settings.NOTE_CACHE_REVALIDATE:
+        # Another process may have written the note, check it with one indexed lookup
+        if await get_note_etag(db, note_id) != cached.etag:
+            cached = None
+    if cached:
+        return _cached_note_response(cached, if_none_match)
+
+    generation = note_cache.generation
+
+    etag = await get_note_etag(db, note_id)
+    if etag is None:
+        raise HTTPException(
+            status_code=404, detail="Note with the given ID was not found."
+        )
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, NOTE_CACHE_CONTROL)
+
+    note = await get_note_or_404(note_id, db)
+    entry = CachedNote(
+        etag,
+        NoteDetailResponseSchema.model_validate(note, from_attributes=True)
+        .model_dump_json()
+        .encode("utf-8"),
     )
+    note_cache.put(note_id, entry, generation)
 
-    return result.scalar_one()
+    return _cached_note_response(entry, if_none_match)
 
 
-@router.put("/{note_id}/", response_model=NoteDetailResponseSchema)
-async def update_note(
-    note_id: int, note_data: NoteUpdateRequestSchema, db: AsyncSession = Depends(get_db)
+@router.get(
+    "/{note_id}/similar/",
+    response_model=NoteSimilarListSchema,
+    dependencies=[Depends(require_single_shard)],
+    responses=SINGLE_SHARD_ONLY,
+)
+async def get_similar_notes(
+    note_id: int,
+    threshold: Optional[float] = Query(None, ge=0, le=1),
+    limit: int = Query(20, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
 ):
     """
-    Update a note by its ID, creating a new version of the existing note.
+    Find near-duplicates of a note, using the MinHash/LSH index instead of comparing every note.
 
     Args:
-        note_id (int): The ID of the note to update.
-        note_data (NoteUpdateRequestSchema): The updated note data.
+        note_id (int): The ID of the note.
+        threshold (float): The minimum estimated Jaccard similarity (default: `NEAR_DUPLICATE_THRESHOLD`).
+        limit (int): The maximum number of notes to return (default: 20).
         db (AsyncSession): Database session dependency.
 
     Returns:
-        The updated note, with a new version preserving the previous content.
+        The similar notes, most similar first.
     """
 
-    note = await retrieve_note(note_id, db)
+    result = await db.execute(select(NoteModel).where(NoteModel.id == note_id))
+    note = result.scalar_one_or_none()
+    if not note:
+        raise HTTPException(
+            status_code=404, detail="Note with the given ID was not found."
+        )
+
+    if threshold is None:
+        threshold = settings.NEAR_DUPLICATE_THRESHOLD
+
+    return {
+        "note_id": note_id,
+        "similar": await find_similar_notes(db, note, threshold, limit),
+    }
+
+
+@router.get(
+    "/{note_id}/related/",
+    response_model=NoteRelatedListSchema,
+    dependencies=[Depends(require_single_shard)],
+    responses=SINGLE_SHARD_ONLY,
+)
+async def get_related_notes(
+    note_id: int,
+    k: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Rank other notes by topic similarity to a note, using the TF-IDF related notes index.
+
+    Args:
+        note_id (int): The ID of the note.
+        k (int): The maximum number of notes to return (default: 10).
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        The most related notes, best first.
+    """
+
+    result = await db.execute(select(NoteModel).where(NoteModel.id == note_id))
+    note = result.scalar_one_or_none()
+    if not note:
+        raise HTTPException(
+            status_code=404, detail="Note with the given ID was not found."
+        )
+
+    return {"related": await find_related_notes(db, k, note=note)}
+
+
+async def _load_note_detail(db: AsyncSession, note_id: int) -> NoteDetailResponseSchema:
+    """Reload a note with its versions after a flush and detach it as a schema."""
+
+    result = await db.execute(
+        select(NoteModel)
+        .where(NoteModel.id == note_id)
+        .options(selectinload(NoteModel.versions))
+        .execution_options(populate_existing=True)
+    )
+
+    return NoteDetailResponseSchema.model_validate(
+        result.scalar_one(), from_attributes=True
+    )
+
+
+async def _create_note(
+    db: AsyncSession, note_data: NoteCreateRequestSchema
+) -> NoteDetailResponseSchema:
+    note = NoteModel(**note_data.model_dump())
+    db.add(note)
+    await db.flush()
+    await record_changes(db, [note.id], CHANGE_CREATED)
+    if settings.NEAR_DUPLICATE_INDEX_ON_WRITE:
+        await index_notes(db, [(note.id, note.content)])
+
+    return await _load_note_detail(db, note.id)
+
+
+async def _update_note(
+    db: AsyncSession, note_id: int, note_data: NoteUpdateRequestSchema
+) -> NoteDetailResponseSchema:
+    note = await get_note_or_404(note_id, db)
 
     # Check the latest version of the note
     latest_version_result = await db.execute(
@@ -163,12 +868,312 @@ async def update_note(
     note.content = note_data.content
 
     db.add(version)
-    await db.commit()
-    await db.refresh(note)
+    await db.flush()
+    await record_changes(db, [note_id], CHANGE_UPDATED)
+    if settings.NEAR_DUPLICATE_INDEX_ON_WRITE:
+        await index_notes(db, [(note_id, note.content)])
+
+    return await _load_note_detail(db, note_id)
+
+
+async def _write_note_upload(
+    db: AsyncSession, upload: NoteUpload, note_id: Optional[int] = None
+) -> dict:
+    """
+    Create a note from a spooled upload, or replace the content of a note and keep the
+    previous content as a version.
+
+    The upload is copied chunk by chunk into a staging blob, then into the note by SQL,
+    so the content is never loaded in Python.
+    """
+    if note_id is not None:
+        if not await db.scalar(select(NoteModel.id).where(NoteModel.id == note_id)):
+            raise HTTPException(
+                status_code=404, detail="Note with the given ID was not found."
+            )
+        latest_version = await db.scalar(
+            select(func.max(VersionModel.version)).where(VersionModel.note_id == note_id)
+        )
+
+    staged_id = await db.scalar(
+        insert(NoteUploadModel)
+        .values(data=func.zeroblob(upload.size))
+        .returning(NoteUploadModel.id)
+    )
+    if upload.size:
+        await write_blob(
+            db,
+            NoteUploadModel.__tablename__,
+            "data",
+            staged_id,
+            upload.file,
+            settings.NOTE_BLOB_CHUNK_SIZE,
+        )
+    content = (
+        select(cast(NoteUploadModel.data, Text))
+        .where(NoteUploadModel.id == staged_id)
+        .scalar_subquery()
+    )
+
+    if note_id is None:
+        note_id = await db.scalar(
+            insert(NoteModel)
+            .values(id=await allocate_note_id(db), content=content)
+            .returning(NoteModel.id)
+        )
+        action = CHANGE_CREATED
+    else:
+        await db.execute(
+            insert(VersionModel).from_select(
+                ["note_id", "content", "version", "created_at"],
+                select(
+                    NoteModel.id,
+                    NoteModel.content,
+                    literal((latest_version or 0) + 1),
+                    NoteModel.updated_at,
+                ).where(NoteModel.id == note_id),
+            )
+        )
+        await db.execute(
+            update(NoteModel).where(NoteModel.id == note_id).values(content=content)
+        )
+        action = CHANGE_UPDATED
+
+    await db.execute(delete(NoteUploadModel).where(NoteUploadModel.id == staged_id))
+    await record_changes(db, [note_id], action)
+    if settings.NEAR_DUPLICATE_INDEX_ON_WRITE:
+        await index_signatures(db, [(note_id, upload.signature)])
+
+    version_count = (
+        select(func.count(VersionModel.id))
+        .where(VersionModel.note_id == NoteModel.id)
+        .scalar_subquery()
+    )
+    note = (
+        await db.execute(
+            select(
+                NoteModel.id, NoteModel.created_at, NoteModel.updated_at, version_count
+            ).where(NoteModel.id == note_id)
+        )
+    ).one()
+
+    return {
+        "id": note[0],
+        "size": upload.size,
+        "versions": note[3],
+        "created_at": note[1],
+        "updated_at": note[2],
+    }
+
+
+async def _receive_note_upload(request: Request) -> NoteUpload:
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.NOTE_UPLOAD_MAX_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"The note is larger than {settings.NOTE_UPLOAD_MAX_BYTES} bytes.",
+        )
+
+    try:
+        return await spool_note_upload(request.stream())
+    except NoteUploadTooLarge as error:
+        raise HTTPException(status_code=413, detail=str(error))
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+
+RAW_NOTE_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"text/plain": {"schema": {"type": "string"}}},
+    }
+}
+
+
+async def _delete_note(db: AsyncSession, note_id: int) -> None:
+    # Versions are removed by `ON DELETE CASCADE`, without loading them first
+    result = await db.execute(delete(NoteModel).where(NoteModel.id == note_id))
+    if not result.rowcount:
+        raise HTTPException(
+            status_code=404, detail="Note with the given ID was not found."
+        )
+
+    await record_changes(db, [note_id], CHANGE_DELETED)
+
+
+@router.post("/", response_model=NoteDetailResponseSchema)
+async def create_note(
+    note_data: NoteCreateRequestSchema,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Create a new note.
+
+    Args:
+        note_data (NoteCreateRequestSchema): The data for the new note.
+        response (Response): The outgoing response, for its caching headers.
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        The newly created note with an empty list of versions.
+    """
+
+    note = await run_write(db, lambda session: _create_note(session, note_data))
+    change_notifier.notify()
+    _set_note_headers(response, note)
+
+    return note
+
+
+@router.put("/{note_id}/", response_model=NoteDetailResponseSchema)
+async def update_note(
+    note_id: int,
+    note_data: NoteUpdateRequestSchema,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Update a note by its ID, creating a new version of the existing note.
+
+    Args:
+        note_id (int): The ID of the note to update.
+        note_data (NoteUpdateRequestSchema): The updated note data.
+        response (Response): The outgoing response, for its caching headers.
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        The updated note, with a new version preserving the previous content.
+    """
+
+    note = await run_write(
+        db, lambda session: _update_note(session, note_id, note_data)
+    )
+    note_cache.invalidate(note_id)
+    change_notifier.notify()
+    _set_note_headers(response, note)
+
+    return note
+
+
+@router.post(
+    "/upload/",
+    response_model=NoteUploadResponseSchema,
+    openapi_extra=RAW_NOTE_BODY,
+)
+async def upload_note(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Create a note from the raw request body, for notes too large to send as a JSON string.
+
+    The body is streamed to a spool file and written to the database in chunks with
+    incremental blob I/O, so the content is never held in memory as a whole.
+
+    Args:
+        request (Request): The incoming request, whose UTF-8 body is the note content.
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        The ID, size and timestamps of the new note, without its content.
+    """
+
+    upload = await _receive_note_upload(request)
+    try:
+        note = await run_write(db, lambda session: _write_note_upload(session, upload))
+    finally:
+        upload.close()
+    change_notifier.notify()
 
     return note
 
 
+@router.put(
+    "/{note_id}/content/",
+    response_model=NoteUploadResponseSchema,
+    openapi_extra=RAW_NOTE_BODY,
+)
+async def upload_note_content(
+    note_id: int, request: Request, db: AsyncSession = Depends(get_db)
+):
+    """
+    Replace the content of a note with the raw request body, creating a new version of
+    the existing note.
+
+    Args:
+        note_id (int): The ID of the note to update.
+        request (Request): The incoming request, whose UTF-8 body is the new content.
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        The ID, size, version count and timestamps of the note, without its content.
+    """
+
+    upload = await _receive_note_upload(request)
+    try:
+        note = await run_write(
+            db, lambda session: _write_note_upload(session, upload, note_id)
+        )
+    finally:
+        upload.close()
+    note_cache.invalidate(note_id)
+    change_notifier.notify()
+
+    return note
+
+
+@router.get(
+    "/{note_id}/content/",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"text/plain": {"schema": {"type": "string"}}}},
+        206: {"description": "The requested byte range of the content"},
+        416: {"description": "The range starts past the end of the content"},
+    },
+)
+async def retrieve_note_content(
+    note_id: int, range_header: Optional[str] = Header(None, alias="range")
+):
+    """
+    Stream the content of a note as UTF-8 bytes, or the byte range asked for in a
+    `Range` header, e.g. `bytes=0-65535` to show the beginning of a large note.
+
+    The content is read with incremental blob I/O, one chunk at a time in a short read
+    transaction of its own, so only the requested bytes are read and slow clients hold
+    no database connection. If the note changes during the download, the stream ends
+    early. A range may split a multi-byte character.
+
+    Args:
+        note_id (int): The ID of the note.
+        range_header (Optional[str]): The `Range` header; a single range of bytes is supported.
+
+    Returns:
+        The content, or `206 Partial Content` with the requested range.
+    """
+
+    reader = NoteContentReader(note_id)
+    size = await reader.open()
+    if size is None:
+        raise HTTPException(status_code=404, detail="Note with the given ID was not found.")
+
+    try:
+        byte_range = parse_byte_range(range_header, size)
+    except ValueError as error:
+        raise HTTPException(
+            status_code=416, detail=str(error), headers={"Content-Range": f"bytes */{size}"}
+        )
+
+    start, end = byte_range or (0, size)
+    headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start)}
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+
+    return StreamingResponse(
+        reader.read(start, end),
+        status_code=206 if byte_range else 200,
+        media_type="text/plain; charset=utf-8",
+        headers=headers,
+    )
+
+
 @router.delete("/{note_id}/")
 async def delete_note(note_id: int, db: AsyncSession = Depends(get_db)):
     """
@@ -182,9 +1187,152 @@ async def delete_note(note_id: int, db: AsyncSession = Depends(get_db)):
         A message indicating the note was deleted successfully.
     """
 
-    note = await retrieve_note(note_id, db)
-
-    await db.delete(note)
-    await db.commit()
+    await run_write(db, lambda session: _delete_note(session, note_id))
+    note_cache.invalidate(note_id)
+    change_notifier.notify()
 
     return {"message": "Note deleted successfully."}
+
+
+async def _bulk_delete(
+    db: AsyncSession, ids: Optional[List[int]], filters: list
+) -> Tuple[int, int]:
+    """
+    Delete the notes with the given IDs, or else every note, that match the filters,
+    in batches of `BULK_DELETE_BATCH_SIZE` each committed on its own.
+
+    :return: The number of deleted notes and the number of batches used.
+    """
+    batch_size = settings.BULK_DELETE_BATCH_SIZE
+    deleted = 0
+    batches = 0
+
+    if ids is not None:
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start : start + batch_size]
+            result = await db.execute(
+                delete(NoteModel)
+                .where(NoteModel.id.in_(batch), *filters)
+                .returning(NoteModel.id)
+            )
+            deleted_ids = result.scalars().all()
+            await record_changes(db, deleted_ids, CHANGE_DELETED)
+            await db.commit()
+            note_cache.invalidate(*deleted_ids)
+
+            deleted += len(deleted_ids)
+            batches += 1
+    else:
+        while True:
+            batch = (
+                await db.scalars(
+                    select(NoteModel.id).where(*filters).limit(batch_size)
+                )
+            ).all()
+            if not batch:
+                break
+
+            await db.execute(delete(NoteModel).where(NoteModel.id.in_(batch)))
+            await record_changes(db, batch, CHANGE_DELETED)
+            await db.commit()
+            note_cache.invalidate(*batch)
+
+            deleted += len(batch)
+            batches += 1
+
+    return deleted, batches
+
+
+@router.post(
+    "/bulk-delete/",
+    response_model=NoteBulkDeleteResponseSchema,
+)
+async def bulk_delete_notes(
+    delete_data: NoteBulkDeleteRequestSchema, db: AsyncSession = Depends(get_db)
+):
+    """
+    Delete many notes at once, by IDs and/or by last update time.
+
+    Notes are deleted with set-based statements in batches of `BULK_DELETE_BATCH_SIZE`,
+    each committed on its own so the database is never locked for long.
+
+    Args:
+        delete_data (NoteBulkDeleteRequestSchema): The IDs and/or filters of the notes to delete.
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        The number of deleted notes and the number of batches used.
+    """
+
+    filters = []
+    if delete_data.updated_before is not None:
+        filters.append(NoteModel.updated_at < delete_data.updated_before)
+
+    if not is_sharded():
+        deleted, batches = await _bulk_delete(db, delete_data.ids, filters)
+    else:
+        # Every shard has a writer of its own, so they delete concurrently
+        by_shard = _group_by_shard(delete_data.ids or [])
+        results = await gather_shards(
+            None,
+            lambda session: _bulk_delete(
+                session,
+                None if delete_data.ids is None else by_shard[session.info["shard"]],
+                filters,
+            ),
+            read_only=False,
+            shard_list=[
+                shard
+                for shard in shards
+                if delete_data.ids is None or shard.index in by_shard
+            ],
+        )
+        deleted = sum(count for count, _ in results)
+        batches = sum(count for _, count in results)
+
+    if deleted:
+        change_notifier.notify()
+
+    return {"deleted": deleted, "batches": batches}
+
+
+@router.post(
+    "/import/",
+    response_model=NoteImportResponseSchema,
+    dependencies=[Depends(require_single_shard)],
+    responses=SINGLE_SHARD_ONLY,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {"schema": {"type": "string"}},
+                "text/csv": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def import_notes(
+    request: Request,
+    file_format: Optional[Literal["ndjson", "csv"]] = Query(None, alias="format"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Import notes from a streamed NDJSON or CSV request body.
+
+    Each NDJSON line is a note object with `content`, optional `created_at`/`updated_at`
+    and an optional `versions` list. CSV needs a header row with a `content` column.
+
+    Args:
+        request (Request): The incoming request, whose body is read as a stream.
+        file_format (Optional[str]): "ndjson" or "csv" (default: inferred from Content-Type).
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        Counts of imported notes and versions, the rejected lines and the throughput.
+    """
+
+    if file_format is None:
+        content_type = request.headers.get("content-type", "")
+        file_format = "csv" if content_type.startswith("text/csv") else "ndjson"
+
+    return await import_note_stream(db, request.stream(), file_format)
@@ -1,20 +1,95 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db, VersionModel
-from routes.notes import retrieve_note
+from config import get_settings
+from database import (
+    get_db,
+    gather_shards,
+    NoteModel,
+    VersionModel,
+    VersionRetentionPolicyModel,
+)
+from routes.metrics import MetricsRoute
+from routes.notes import get_note_or_404
 from schemas import (
     VersionListResponseSchema,
     VersionDetailResponseSchema,
+    VersionDiffResponseSchema,
+    RetentionPolicySchema,
+    RetentionPolicyResponseSchema,
+    CompactionReportSchema,
+)
+from services import (
+    compact_versions,
+    merge_compaction_reports,
+    get_global_retention_policy,
+    NOTE_CACHE_CONTROL,
+    VERSION_CACHE_CONTROL,
+    etag_matches,
+    not_modified,
+    version_etag,
+    version_diff_etag,
+    get_version_list_etag,
+    note_cache,
+    dump_json,
+    json_response,
+    DiffCacheKey,
+    diff_texts,
+    format_unified_diff,
+    version_diff_cache,
+    CHANGE_UPDATED,
+    change_notifier,
+    record_changes,
 )
 
-router = APIRouter()
+settings = get_settings()
+
+router = APIRouter(route_class=MetricsRoute)
+
+
+async def ensure_note_exists(note_id: int, db: AsyncSession):
+    note_exists = await db.scalar(select(NoteModel.id).where(NoteModel.id == note_id))
+
+    if not note_exists:
+        raise HTTPException(
+            status_code=404, detail="Note with the given ID was not found."
+        )
+
+
+@router.post("/compact/", response_model=CompactionReportSchema)
+async def compact_version_history(
+    note_id: Optional[int] = Query(None), db: AsyncSession = Depends(get_db)
+):
+    """
+    Run a version compaction pass now, instead of waiting for the background task.
+
+    With sharding, a pass over all notes runs on every shard concurrently.
+
+    Args:
+        note_id (Optional[int]): Restrict the pass to a single note (default: all notes).
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        The number of version rows and bytes reclaimed by the pass.
+    """
+
+    if note_id is not None:
+        return await compact_versions(db, note_id)
+
+    reports = await gather_shards(db, compact_versions, read_only=False)
+
+    return merge_compaction_reports(reports)
 
 
 @router.get("/{note_id}", response_model=VersionListResponseSchema)
 async def get_version_list(
     note_id: int,
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=20),
     db: AsyncSession = Depends(get_db),
@@ -22,8 +97,15 @@ async def get_version_list(
     """
     Retrieve a paginated list of versions for a note by note ID.
 
+    The response carries an ETag; a request with a matching `If-None-Match` header
+    gets a `304 Not Modified` without any version content being loaded. With
+    `FAST_LIST_SERIALIZATION`, only the requested page is read and encoded straight
+    from the SQL results.
+
     Args:
         note_id (int): The ID of the note to retrieve versions for.
+        request (Request): The incoming request, for its conditional headers.
+        response (Response): The outgoing response, for its caching headers.
         page (int): The page number to retrieve (default: 1).
         per_page (int): The number of items per page (default: 10, max: 100).
         db (AsyncSession): Database session dependency.
@@ -32,20 +114,56 @@ async def get_version_list(
         A paginated list of versions with pagination metadata.
     """
 
-    note = await retrieve_note(note_id, db)
+    await ensure_note_exists(note_id, db)
+
+    etag = await get_version_list_etag(db, note_id, page, per_page)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, NOTE_CACHE_CONTROL)
+
+    headers = {"ETag": etag, "Cache-Control": NOTE_CACHE_CONTROL}
+
+    if settings.FAST_LIST_SERIALIZATION:
+        # Only the requested page is read, as plain tuples in `VersionDetailResponseSchema` order
+        total_versions = await db.scalar(
+            select(func.count(VersionModel.id)).where(VersionModel.note_id == note_id)
+        )
+        result = await db.execute(
+            select(
+                VersionModel.id,
+                VersionModel.note_id,
+                VersionModel.version,
+                VersionModel.content,
+                VersionModel.created_at,
+            )
+            .where(VersionModel.note_id == note_id)
+            .order_by(VersionModel.id)
+            .offset((page - 1) * per_page)
+            .limit(per_page)
+        )
+        paginated_versions = [
+            {
+                "id": version_id,
+                "note_id": version_note_id,
+                "version": version,
+                "content": content,
+                "created_at": created_at,
+            }
+            for version_id, version_note_id, version, content, created_at in result
+        ]
+    else:
+        note = await get_note_or_404(note_id, db)
+        versions = note.versions
+        total_versions = len(versions)
 
-    versions = note.versions
+        offset = (page - 1) * per_page
+        paginated_versions = versions[offset : offset + per_page]
 
-    if not versions:
+    if not total_versions:
         raise HTTPException(status_code=404, detail="No versions found.")
 
-    total_versions = len(versions)
     total_pages = (total_versions + per_page - 1) // per_page
 
-    offset = (page - 1) * per_page
-    paginated_versions = versions[offset : offset + per_page]
-
-    return {
+    payload = {
         "versions": paginated_versions,
         "prev_page": (
             f"/notes/{note_id}/versions/?page={page - 1}&per_page={per_page}"
@@ -61,39 +179,275 @@ async def get_version_list(
         "total_items": total_versions,
     }
 
+    if settings.FAST_LIST_SERIALIZATION:
+        return json_response(payload, headers)
+
+    response.headers.update(headers)
+
+    return payload
+
+
+async def get_version_or_404(
+    note_id: int, version_id: int, db: AsyncSession
+) -> VersionModel:
+    """Load a version of a note, or raise a 404 if it does not exist."""
+
+    result = await db.execute(
+        select(VersionModel)
+        .where(VersionModel.note_id == note_id)
+        .where(VersionModel.version == version_id)
+    )
+
+    version = result.scalar_one_or_none()
+    if not version:
+        raise HTTPException(
+            status_code=404, detail="Version with the given ID was not found."
+        )
+
+    return version
+
+
+@router.get("/{note_id}/diff/", response_model=VersionDiffResponseSchema)
+async def diff_versions(
+    note_id: int,
+    request: Request,
+    from_version: int = Query(..., alias="from", ge=1),
+    to_version: int = Query(..., alias="to", ge=1),
+    granularity: str = Query("line", pattern="^(line|word)$"),
+    context: int = Query(3, ge=0, le=100),
+    format: str = Query("json", pattern="^(json|unified)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Compare two versions of a note on the server, returning only the changed hunks.
+
+    Versions are immutable, so the diff is cached in process and served with an ETag and
+    a long-lived `Cache-Control`; a request with a matching `If-None-Match` header gets
+    a `304 Not Modified` without either version being loaded.
+
+    Args:
+        note_id (int): The ID of the note.
+        request (Request): The incoming request, for its conditional headers.
+        from_version (int): The version diffed from (`from` query parameter).
+        to_version (int): The version diffed to (`to` query parameter).
+        granularity (str): Compare `line`s, or `word`s within lines (default: line).
+        context (int): Unchanged lines or words kept around each change (default: 3).
+        format (str): `json` hunks, or a `unified` patch for line diffs (default: json).
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        The hunks with the number of inserted and deleted lines or words, or the patch.
+    """
+
+    if format == "unified" and granularity != "line":
+        raise HTTPException(
+            status_code=400, detail="The unified format is only available for line diffs."
+        )
+
+    result = await db.execute(
+        select(VersionModel.version, VersionModel.id)
+        .where(VersionModel.note_id == note_id)
+        .where(VersionModel.version.in_((from_version, to_version)))
+    )
+    row_ids = dict(result.all())
+    if from_version not in row_ids or to_version not in row_ids:
+        await ensure_note_exists(note_id, db)
+        raise HTTPException(
+            status_code=404, detail="Version with the given ID was not found."
+        )
+
+    key = DiffCacheKey(
+        note_id, row_ids[from_version], row_ids[to_version], granularity, context, format
+    )
+    etag = version_diff_etag(*key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, VERSION_CACHE_CONTROL)
+
+    headers = {"ETag": etag, "Cache-Control": VERSION_CACHE_CONTROL}
+    media_type = "text/x-diff; charset=utf-8" if format == "unified" else "application/json"
+
+    body = version_diff_cache.get(key)
+    if body is None:
+        result = await db.execute(
+            select(VersionModel.id, VersionModel.content).where(
+                VersionModel.id.in_((key.from_id, key.to_id))
+            )
+        )
+        contents = dict(result.all())
+
+        # Matching long notes is CPU-bound, keep it off the event loop
+        diff = await asyncio.to_thread(
+            diff_texts, contents[key.from_id], contents[key.to_id], granularity, context
+        )
+        if format == "unified":
+            body = format_unified_diff(
+                diff, f"notes/{note_id}@{from_version}", f"notes/{note_id}@{to_version}"
+            ).encode("utf-8")
+        else:
+            body = dump_json(
+                {
+                    "note_id": note_id,
+                    "from_version": from_version,
+                    "to_version": to_version,
+                    "granularity": granularity,
+                    "context": context,
+                    **diff,
+                }
+            )
+        version_diff_cache.put(key, body)
+
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+@router.get("/{note_id}/retention/", response_model=RetentionPolicyResponseSchema)
+async def get_retention_policy(note_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Retrieve the retention policy that applies to the versions of a note.
+
+    Args:
+        note_id (int): The ID of the note.
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        The note's own policy if it has one, otherwise the global policy.
+    """
+
+    await ensure_note_exists(note_id, db)
+
+    policy = await db.scalar(
+        select(VersionRetentionPolicyModel).where(
+            VersionRetentionPolicyModel.note_id == note_id
+        )
+    )
+    if not policy:
+        return {
+            "note_id": note_id,
+            "scope": "global",
+            **get_global_retention_policy().model_dump(),
+        }
+
+    return {
+        "note_id": note_id,
+        "scope": "note",
+        **RetentionPolicySchema.model_validate(policy, from_attributes=True).model_dump(),
+    }
+
+
+@router.put("/{note_id}/retention/", response_model=RetentionPolicyResponseSchema)
+async def set_retention_policy(
+    note_id: int,
+    policy_data: RetentionPolicySchema,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Set a retention policy for the versions of a note, overriding the global policy.
+
+    Args:
+        note_id (int): The ID of the note.
+        policy_data (RetentionPolicySchema): The retention rules, `null` disables a rule.
+        db (AsyncSession): Database session dependency.
 
-@router.get("/{note_id}/{version_id}", response_model=VersionDetailResponseSchema)
+    Returns:
+        The stored policy.
+    """
+
+    await ensure_note_exists(note_id, db)
+
+    policy = await db.scalar(
+        select(VersionRetentionPolicyModel).where(
+            VersionRetentionPolicyModel.note_id == note_id
+        )
+    )
+    if not policy:
+        policy = VersionRetentionPolicyModel(note_id=note_id)
+        db.add(policy)
+
+    for field, value in policy_data.model_dump().items():
+        setattr(policy, field, value)
+
+    await db.commit()
+
+    return {"note_id": note_id, "scope": "note", **policy_data.model_dump()}
+
+
+@router.delete("/{note_id}/retention/")
+async def delete_retention_policy(note_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Remove the retention policy of a note, so the global policy applies again.
+
+    Args:
+        note_id (int): The ID of the note.
+        db (AsyncSession): Database session dependency.
+
+    Returns:
+        A message indicating the policy was deleted successfully.
+    """
+
+    policy = await db.scalar(
+        select(VersionRetentionPolicyModel).where(
+            VersionRetentionPolicyModel.note_id == note_id
+        )
+    )
+    if not policy:
+        raise HTTPException(
+            status_code=404, detail="Retention policy for the given note was not found."
+        )
+
+    await db.delete(policy)
+    await db.commit()
+
+    return {"message": "Retention policy deleted successfully."}
+
+
+# Declared after the routes above, and typed, so `/{note_id}/retention` is redirected to
+# the retention routes instead of being read as a version ID
+@router.get("/{note_id}/{version_id:int}", response_model=VersionDetailResponseSchema)
 async def retrieve_version(
-    note_id: int, version_id: int, db: AsyncSession = Depends(get_db)
+    note_id: int,
+    version_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Retrieve a version of a note by note ID and version ID.
 
+    Versions never change, so the response may be cached for `VERSION_CACHE_MAX_AGE`
+    and a request with a matching `If-None-Match` header gets a `304 Not Modified`
+    without the content being loaded.
+
     Args:
         note_id (int): The ID of the note to retrieve the version for.
         version_id (int): The ID of the version to retrieve.
+        request (Request): The incoming request, for its conditional headers.
+        response (Response): The outgoing response, for its caching headers.
         db (AsyncSession): Database session dependency.
 
     Returns:
         The version of the note.
     """
 
-    result = await db.execute(
-        select(VersionModel)
+    row_id = await db.scalar(
+        select(VersionModel.id)
         .where(VersionModel.note_id == note_id)
         .where(VersionModel.version == version_id)
     )
-
-    version = result.scalar_one_or_none()
-    if not version:
+    if row_id is None:
         raise HTTPException(
             status_code=404, detail="Version with the given ID was not found."
         )
 
-    return version
+    etag = version_etag(note_id, version_id, row_id)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, VERSION_CACHE_CONTROL)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = VERSION_CACHE_CONTROL
+
+    return await get_version_or_404(note_id, version_id, db)
 
 
-@router.delete("/{note_id}/{version_id}")
+@router.delete("/{note_id}/{version_id:int}")
 async def delete_version(
     note_id: int, version_id: int, db: AsyncSession = Depends(get_db)
 ):
@@ -109,9 +463,12 @@ async def delete_version(
         A message indicating the version was deleted successfully
     """
 
-    version = await retrieve_version(note_id, version_id, db)
+    version = await get_version_or_404(note_id, version_id, db)
 
     await db.delete(version)
+    await record_changes(db, [note_id], CHANGE_UPDATED)
     await db.commit()
+    note_cache.invalidate(note_id)
+    change_notifier.notify()
 
     return {"message": "Version deleted successfully."}
@@ -3,9 +3,33 @@ from schemas.notes import (
     NoteListResponseSchema,
     NoteCreateRequestSchema,
     NoteUpdateRequestSchema,
+    NoteUploadResponseSchema,
+    NoteBulkDeleteRequestSchema,
+    NoteBulkDeleteResponseSchema,
+    NoteImportRecordSchema,
+    NoteImportResponseSchema,
+    NoteSearchResponseSchema,
+    NoteBatchRequestSchema,
+    NoteBatchResponseSchema,
+    NoteChangeListSchema,
+    NoteSimilarListSchema,
+    NoteRelatedListSchema,
 )
 
 from schemas.versions import (
     VersionDetailResponseSchema,
     VersionListResponseSchema,
+    VersionDiffHunkSchema,
+    VersionDiffResponseSchema,
+    RetentionPolicySchema,
+    RetentionPolicyResponseSchema,
+    CompactionReportSchema,
+)
+
+from schemas.admin import (
+    BackupRequestSchema,
+    BackupReportSchema,
+    SnapshotListSchema,
+    RestoreRequestSchema,
+    RestoreReportSchema,
 )
@@ -0,0 +1,43 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class BackupRequestSchema(BaseModel):
+    compress: bool = Field(False, description="Gzip the snapshot once copied")
+
+
+class BackupReportSchema(BaseModel):
+    name: str = Field(..., description="File name of the snapshot in the backup directory")
+    bytes: int = Field(..., description="Size of the copied database")
+    compressed_bytes: Optional[int] = Field(None, description="Size of the gzipped snapshot")
+    pages: int = Field(..., description="Database pages copied")
+    steps: int = Field(..., description="Backup steps the copy took")
+    restarts: int = Field(..., description="Times the copy started over after a write")
+    copy_seconds: float = Field(..., description="Duration of the copy")
+    total_seconds: float = Field(..., description="Duration including compression")
+    mb_per_second: float = Field(..., description="Copy throughput in megabytes per second")
+    max_stall_ms: float = Field(
+        ..., description="Longest backup step, the longest a writer could have waited"
+    )
+
+
+class SnapshotSchema(BaseModel):
+    name: str = Field(..., description="File name of the snapshot")
+    bytes: int = Field(..., description="Size of the snapshot file")
+    modified_at: datetime = Field(..., description="When the snapshot was written")
+
+
+class SnapshotListSchema(BaseModel):
+    snapshots: List[SnapshotSchema] = Field(..., description="Snapshots, newest first")
+
+
+class RestoreRequestSchema(BaseModel):
+    name: str = Field(..., description="File name of a snapshot in the backup directory")
+
+
+class RestoreReportSchema(BaseModel):
+    name: str = Field(..., description="File name of the restored snapshot")
+    bytes: int = Field(..., description="Size of the restored database")
+    seconds: float = Field(..., description="Duration of the restore")
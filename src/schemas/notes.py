@@ -1,7 +1,7 @@
-from datetime import datetime
-from typing import List, Optional
+from datetime import datetime, UTC
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 from schemas.versions import VersionDetailResponseSchema
 
@@ -23,9 +23,156 @@ class NoteListResponseSchema(BaseModel):
     total_items: int = Field(..., description="Total number of notes")
 
 
+class VersionSummarySchema(BaseModel):
+    count: int = Field(..., description="Number of stored versions")
+    latest_version: Optional[int] = Field(None, description="Highest version number")
+    latest_created_at: Optional[datetime] = Field(
+        None, description="Creation time of the newest version"
+    )
+
+
+class NoteBatchItemSchema(BaseModel):
+    id: int
+    content: str
+    created_at: datetime
+    updated_at: datetime
+    version_summary: Optional[VersionSummarySchema] = None
+    versions: Optional[List[VersionDetailResponseSchema]] = None
+
+
+class NoteBatchRequestSchema(BaseModel):
+    ids: List[int] = Field(..., min_length=1, description="IDs of the notes to load")
+    versions: Literal["none", "summary", "full"] = Field(
+        "summary", description="Include no versions, a summary, or every version"
+    )
+
+
+class NoteBatchResponseSchema(BaseModel):
+    notes: List[NoteBatchItemSchema] = Field(
+        ..., description="Found notes, in the requested order"
+    )
+    missing: List[int] = Field(..., description="Requested IDs that do not exist")
+
+
 class NoteCreateRequestSchema(BaseModel):
     content: str = Field(..., description="The content of the note")
 
 
 class NoteUpdateRequestSchema(BaseModel):
     content: str = Field(..., description="The updated content of the note")
+
+
+class NoteUploadResponseSchema(BaseModel):
+    id: int = Field(..., description="ID of the created or updated note")
+    size: int = Field(..., description="Size of the content in bytes")
+    versions: int = Field(..., description="Number of stored versions")
+    created_at: datetime
+    updated_at: datetime
+
+
+class NoteBulkDeleteRequestSchema(BaseModel):
+    ids: Optional[List[int]] = Field(None, description="IDs of the notes to delete")
+    updated_before: Optional[datetime] = Field(
+        None, description="Delete notes last updated before this time (UTC)"
+    )
+
+    @field_validator("updated_before")
+    @classmethod
+    def to_naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # Timestamps are stored as naive UTC
+        if value is not None and value.tzinfo is not None:
+            return value.astimezone(UTC).replace(tzinfo=None)
+        return value
+
+    @model_validator(mode="after")
+    def check_filter_present(self):
+        if self.ids is None and self.updated_before is None:
+            raise ValueError("Either 'ids' or 'updated_before' must be provided.")
+        return self
+
+
+class NoteBulkDeleteResponseSchema(BaseModel):
+    deleted: int = Field(..., description="Number of deleted notes")
+    batches: int = Field(..., description="Number of delete batches executed")
+
+
+class VersionImportRecordSchema(BaseModel):
+    version: Optional[int] = Field(None, ge=1, description="Version number, defaults to the position in the list")
+    content: str = Field(..., description="The content of the version")
+    created_at: Optional[datetime] = Field(None, description="When the version was created")
+
+
+class NoteImportRecordSchema(BaseModel):
+    content: str = Field(..., description="The content of the note")
+    created_at: Optional[datetime] = Field(None, description="When the note was created")
+    updated_at: Optional[datetime] = Field(None, description="When the note was last updated")
+    versions: List[VersionImportRecordSchema] = Field(
+        default_factory=list, description="Previous versions of the note, oldest first"
+    )
+
+    @field_validator("created_at", "updated_at", mode="before")
+    @classmethod
+    def empty_string_to_none(cls, value):
+        # CSV cells are always strings, so a missing timestamp arrives as ""
+        return value or None
+
+
+class ImportErrorSchema(BaseModel):
+    line: int = Field(..., description="Line number in the uploaded body, starting at 1")
+    error: str = Field(..., description="Why the line was rejected")
+
+
+class NoteImportResponseSchema(BaseModel):
+    imported: int = Field(..., description="Number of imported notes")
+    versions_imported: int = Field(..., description="Number of imported versions")
+    failed: int = Field(..., description="Number of rejected lines")
+    errors: List[ImportErrorSchema] = Field(..., description="The first rejected lines")
+    elapsed_seconds: float = Field(..., description="Wall-clock duration of the import")
+    rows_per_second: float = Field(..., description="Imported notes per second")
+
+
+class NoteSearchResultSchema(BaseModel):
+    id: int = Field(..., description="ID of the matching note or version")
+    note_id: int
+    version: Optional[int] = Field(None, description="Version number, for version matches")
+    snippet: str = Field(..., description="Matching excerpt, terms wrapped in <mark> tags")
+    score: float = Field(..., description="BM25 relevance, higher is better")
+    updated_at: datetime
+
+
+class NoteSearchResponseSchema(BaseModel):
+    results: List[NoteSearchResultSchema]
+
+    next_cursor: Optional[str] = Field(None, description="Cursor of the next page")
+
+
+class NoteChangeSchema(BaseModel):
+    id: int = Field(..., description="Position in the change log, use it as `since`")
+    note_id: int
+    action: Literal["created", "updated", "deleted"]
+    created_at: datetime
+
+
+class NoteChangeListSchema(BaseModel):
+    changes: List[NoteChangeSchema]
+
+    last_id: int = Field(..., description="Pass as `since` to get the following changes")
+
+
+class NoteSimilarSchema(BaseModel):
+    id: int = Field(..., description="ID of the similar note")
+    similarity: float = Field(..., description="Estimated Jaccard similarity of the word shingles")
+
+
+class NoteSimilarListSchema(BaseModel):
+    note_id: int
+    similar: List[NoteSimilarSchema]
+
+
+class NoteRelatedSchema(BaseModel):
+    id: int = Field(..., description="ID of the related note")
+    score: float = Field(..., description="TF-IDF cosine similarity, higher is better")
+
+
+class NoteRelatedListSchema(BaseModel):
+    related: List[NoteRelatedSchema]
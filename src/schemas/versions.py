@@ -19,3 +19,52 @@ class VersionListResponseSchema(BaseModel):
     next_page: Optional[str] = Field(None, description="URL for next page")
     total_pages: int = Field(..., description="Total number of pages")
     total_items: int = Field(..., description="Total number of notes")
+
+
+class VersionDiffHunkSchema(BaseModel):
+    from_start: int = Field(..., description="0-based start of the hunk in the old text")
+    from_count: int = Field(..., description="Number of old units the hunk covers")
+    to_start: int = Field(..., description="0-based start of the hunk in the new text")
+    to_count: int = Field(..., description="Number of new units the hunk covers")
+    lines: List[str] = Field(
+        ..., description="Units prefixed by ' ' (unchanged), '-' (deleted) or '+' (inserted)"
+    )
+
+
+class VersionDiffResponseSchema(BaseModel):
+    note_id: int
+    from_version: int
+    to_version: int
+    granularity: str = Field(..., description="Units compared: 'line' or 'word'")
+    context: int = Field(..., description="Unchanged units kept around each change")
+    insertions: int = Field(..., description="Number of inserted units")
+    deletions: int = Field(..., description="Number of deleted units")
+    hunks: List[VersionDiffHunkSchema]
+
+
+class RetentionPolicySchema(BaseModel):
+    keep_last: Optional[int] = Field(
+        None, ge=1, description="Keep only the newest N versions"
+    )
+    hourly_after_days: Optional[int] = Field(
+        None, ge=0, description="Keep one version per hour once versions are older than this"
+    )
+    daily_after_days: Optional[int] = Field(
+        None, ge=0, description="Keep one version per day once versions are older than this"
+    )
+    max_total_bytes: Optional[int] = Field(
+        None, ge=1, description="Maximum total size of the version history in bytes"
+    )
+
+
+class RetentionPolicyResponseSchema(RetentionPolicySchema):
+    note_id: int
+    scope: str = Field(..., description="Where the policy comes from: 'note' or 'global'")
+
+
+class CompactionReportSchema(BaseModel):
+    notes_scanned: int = Field(..., description="Number of notes with versions inspected")
+    deleted_versions: int = Field(..., description="Number of version rows deleted")
+    deleted_bytes: int = Field(..., description="Content bytes of the deleted versions")
+    reclaimed_file_bytes: int = Field(..., description="Bytes the database file shrank by")
+    duration_seconds: float = Field(..., description="Wall-clock duration of the pass")
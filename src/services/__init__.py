@@ -1,2 +1,92 @@
 from services.genai import genai_summarize
-from services.analytics_nltk import get_common_words_phrases
\ No newline at end of file
+from services.analytics_nltk import (
+    get_common_words_phrases,
+    tokenize,
+    download_nltk_data,
+)
+from services.retention import (
+    compact_versions,
+    merge_compaction_reports,
+    get_global_retention_policy,
+    run_compaction_loop,
+)
+from services.importer import import_note_stream
+from services.exporter import export_note_stream
+from services.search import search_notes
+from services.etags import (
+    NOTE_CACHE_CONTROL,
+    VERSION_CACHE_CONTROL,
+    etag_matches,
+    not_modified,
+    note_etag,
+    version_etag,
+    version_diff_etag,
+    get_note_etag,
+    note_list_etag,
+    get_note_list_etag,
+    get_version_list_etag,
+)
+from services.note_cache import note_cache, CachedNote
+from services.version_diff import (
+    GRANULARITIES,
+    FORMATS,
+    DiffCacheKey,
+    diff_texts,
+    format_unified_diff,
+    version_diff_cache,
+)
+from services.serialization import dump_json, json_response
+from services.changes import (
+    CHANGE_CREATED,
+    CHANGE_UPDATED,
+    CHANGE_DELETED,
+    change_notifier,
+    record_changes,
+    fetch_changes,
+    get_oldest_change_id,
+    get_latest_change_id,
+    stream_changes,
+    prune_change_log,
+)
+from services.note_stats import (
+    to_naive_utc,
+    created_between,
+    get_note_totals,
+    get_daily_stats,
+    merge_totals,
+    merge_daily_stats,
+)
+from services.similarity import (
+    compute_signature,
+    estimate_similarity,
+    SignatureBuilder,
+    index_notes,
+    index_signatures,
+    find_similar_notes,
+    find_duplicate_pairs,
+    rebuild_similarity_index,
+)
+from services.related import related_index, find_related_notes
+from services.note_content import (
+    NoteUpload,
+    NoteUploadTooLarge,
+    NoteContentReader,
+    NoteContentChanged,
+    spool_note_upload,
+    parse_byte_range,
+)
+from services.backups import restore_snapshot
+from services.startup import warm_up_services
+from services.metrics import (
+    registry,
+    instrument_engine,
+    record_genai_call,
+    run_loop_lag_monitor,
+)
+from services.query_profiler import (
+    QueryProfilerMiddleware,
+    enable_query_profiler,
+    disable_query_profiler,
+    statement_shape,
+)
+from services.request_profiler import RequestProfilerMiddleware, RequestSampler
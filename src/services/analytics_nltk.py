@@ -1,22 +1,48 @@
-import nltk
-from nltk import FreqDist, RegexpTokenizer
-from nltk.util import ngrams
+from functools import lru_cache
 
 from config import get_settings
 
 settings = get_settings()
 
 
-# # Ensure NLTK looks for data in this directory
-nltk.data.path.append(settings.NLTK_DATA_PATH)
-nltk.download("punkt_tab", download_dir=str(settings.NLTK_DATA_PATH))
+@lru_cache(maxsize=None)
+def get_tokenizer():
+    """
+    Import NLTK and build the word tokenizer on first use.
+
+    Importing NLTK takes over a second, so it is kept out of application startup. No
+    data is downloaded at runtime: vendor it with `python manage.py nltk-download`.
+    """
+    import nltk
+    from nltk import RegexpTokenizer
+
+    # Ensure NLTK looks for data in this directory
+    if settings.NLTK_DATA_PATH not in nltk.data.path:
+        nltk.data.path.append(settings.NLTK_DATA_PATH)
+
+    return RegexpTokenizer(r"\w+")
+
+
+def download_nltk_data(resources, directory: str) -> None:
+    """Download NLTK resources into `directory`, e.g. while building an offline image."""
+    import nltk
+
+    for resource in resources:
+        if not nltk.download(resource, download_dir=directory, raise_on_error=True):
+            raise RuntimeError(f"Could not download the NLTK resource {resource!r}.")
+
+
+def tokenize(text: str) -> list:
+    """Split text into word tokens, as the phrase analytics and related notes index do."""
+    return get_tokenizer().tokenize(text)
 
 
 async def get_common_words_phrases(notes, max_phrase_length: int):
+    from nltk import FreqDist
+    from nltk.util import ngrams
 
     # Tokenize the content
-    tokenizer = RegexpTokenizer(r"\w+")
-    word_tokenized = tokenizer.tokenize(" ".join(notes))
+    word_tokenized = tokenize(" ".join(notes))
 
     # Initialize a frequency distribution
     fd = FreqDist()
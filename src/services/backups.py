@@ -0,0 +1,24 @@
+from database import restore_database
+from services.note_cache import note_cache
+from services.related import related_index
+from services.version_diff import version_diff_cache
+
+
+async def restore_snapshot(path: str) -> dict:
+    """
+    Restore the database from a snapshot and drop what this process derived from the
+    old content: cached note responses and diffs, and the related notes index.
+
+    Other processes using the same database keep their caches until restarted.
+
+    :param path: Path of a snapshot made by `backup_database`.
+    :raise ValueError: When the file is not an intact snapshot of the notes database.
+    :return: The report of `restore_database`.
+    """
+    report = await restore_database(path)
+
+    note_cache.clear()
+    version_diff_cache.clear()
+    await related_index.discard()
+
+    return report
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from contextlib import suppress
+from datetime import datetime, timedelta, UTC
+from typing import AsyncIterator, Iterable, List, Optional
+
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import get_settings
+from database import NoteChangeModel, get_db_contextmanager
+from services.serialization import dump_json
+
+settings = get_settings()
+
+CHANGE_CREATED = "created"
+CHANGE_UPDATED = "updated"
+CHANGE_DELETED = "deleted"
+
+
+class ChangeNotifier:
+    """
+    Wake up every waiting change feed stream of this process at once.
+
+    Each `notify` sets the current event and replaces it, so a stream that starts
+    waiting afterwards waits for the next change.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+
+    def _current_event(self) -> asyncio.Event:
+        loop = asyncio.get_running_loop()
+        if self._event is None or self._loop is not loop:
+            self._loop = loop
+            self._event = asyncio.Event()
+
+        return self._event
+
+    def notify(self) -> None:
+        event = self._current_event()
+        self._event = asyncio.Event()
+        event.set()
+
+    async def wait(self, timeout: float) -> None:
+        """Wait for the next `notify`, or at most `timeout` seconds."""
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._current_event().wait(), timeout)
+
+
+change_notifier = ChangeNotifier()
+
+
+async def record_changes(db: AsyncSession, note_ids: Iterable[int], action: str) -> None:
+    """
+    Append entries to the change log, in the caller's transaction.
+
+    Callers should call `change_notifier.notify()` once the transaction is committed.
+    """
+    rows = [{"note_id": note_id, "action": action} for note_id in note_ids]
+    if rows:
+        await db.execute(insert(NoteChangeModel.__table__), rows)
+
+
+async def get_oldest_change_id(db: AsyncSession) -> Optional[int]:
+    return await db.scalar(select(func.min(NoteChangeModel.id)))
+
+
+async def get_latest_change_id(db: AsyncSession) -> int:
+    return await db.scalar(select(func.max(NoteChangeModel.id))) or 0
+
+
+async def fetch_changes(db: AsyncSession, since: int, limit: int) -> List[dict]:
+    """Read up to `limit` change log entries newer than the entry with id `since`."""
+    result = await db.execute(
+        select(
+            NoteChangeModel.id,
+            NoteChangeModel.note_id,
+            NoteChangeModel.action,
+            NoteChangeModel.created_at,
+        )
+        .where(NoteChangeModel.id > since)
+        .order_by(NoteChangeModel.id)
+        .limit(limit)
+    )
+
+    return [
+        {"id": change_id, "note_id": note_id, "action": action, "created_at": created_at}
+        for change_id, note_id, action, created_at in result
+    ]
+
+
+def format_event(change: dict) -> bytes:
+    return (
+        f"id: {change['id']}\nevent: {change['action']}\ndata: ".encode("utf-8")
+        + dump_json(change)
+        + b"\n\n"
+    )
+
+
+async def stream_changes(
+    since: int, poll_interval: Optional[float] = None
+) -> AsyncIterator[bytes]:
+    """
+    Yield the change log as server-sent events, starting after the entry `since`.
+
+    The stream catches up in batches of `CHANGE_FEED_BATCH_SIZE`, then sleeps until a
+    write of this process calls `change_notifier.notify()`. It also wakes up every
+    `poll_interval` seconds to pick up writes of other processes, and sends a comment
+    every `CHANGE_FEED_HEARTBEAT_SECONDS` so proxies keep the connection open.
+
+    A session is opened for each read rather than held for the life of the stream.
+    """
+
+    poll_interval = poll_interval or settings.CHANGE_FEED_POLL_SECONDS
+    last_id = since
+    last_sent = time.monotonic()
+
+    # Clients reconnect after this many milliseconds, sending `Last-Event-ID`
+    yield f"retry: {int(poll_interval * 1000)}\n\n".encode("utf-8")
+
+    while True:
+        async with get_db_contextmanager(read_only=True) as db:
+            changes = await fetch_changes(db, last_id, settings.CHANGE_FEED_BATCH_SIZE)
+
+        if changes:
+            yield b"".join(format_event(change) for change in changes)
+            last_id = changes[-1]["id"]
+            last_sent = time.monotonic()
+
+            if len(changes) == settings.CHANGE_FEED_BATCH_SIZE:
+                continue
+        elif time.monotonic() - last_sent >= settings.CHANGE_FEED_HEARTBEAT_SECONDS:
+            yield b": keep-alive\n\n"
+            last_sent = time.monotonic()
+
+        await change_notifier.wait(poll_interval)
+
+
+async def prune_change_log(db: AsyncSession, older_than_days: int) -> int:
+    """
+    Delete change log entries older than `older_than_days`.
+
+    :return: The number of deleted entries.
+    """
+    cutoff = datetime.now(UTC).replace(tzinfo=None) - timedelta(days=older_than_days)
+    result = await db.execute(
+        delete(NoteChangeModel).where(NoteChangeModel.created_at < cutoff)
+    )
+    await db.commit()
+
+    return result.rowcount
@@ -0,0 +1,141 @@
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+from fastapi import Response
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import get_settings
+from database import NoteModel, VersionModel
+
+settings = get_settings()
+
+# Notes change in place, so clients may store them but have to revalidate every time
+NOTE_CACHE_CONTROL = "no-cache"
+VERSION_CACHE_CONTROL = f"public, max-age={settings.VERSION_CACHE_MAX_AGE}, immutable"
+
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag from values that change whenever the representation does."""
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Evaluate an `If-None-Match` header against the current ETag.
+
+    `If-None-Match` uses the weak comparison, so a `W/` prefix is ignored.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+
+    return etag in candidates
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(
+        status_code=304, headers={"ETag": etag, "Cache-Control": cache_control}
+    )
+
+
+def note_etag(
+    note_id: int,
+    updated_at: datetime,
+    version_count: int,
+    last_version_id: Optional[int],
+) -> str:
+    """
+    ETag of a note detail.
+
+    `updated_at` only has a one second resolution and does not move when a version is
+    deleted, so the size and the newest row of the version history are part of it too.
+    """
+    return make_etag("note", note_id, updated_at, version_count, last_version_id)
+
+
+def version_etag(note_id: int, version: int, version_id: int) -> str:
+    # Version ids are never reused (AUTOINCREMENT), so the row id pins the content
+    return make_etag("version", note_id, version, version_id)
+
+
+def version_diff_etag(note_id: int, from_id: int, to_id: int, *options) -> str:
+    # Both version rows are immutable, so their ids and the diff options pin the patch
+    return make_etag("diff", note_id, from_id, to_id, *options)
+
+
+def _version_stats(note_ids):
+    return (
+        select(
+            VersionModel.note_id,
+            func.count(VersionModel.id),
+            func.max(VersionModel.id),
+        )
+        .where(VersionModel.note_id.in_(note_ids))
+        .group_by(VersionModel.note_id)
+    )
+
+
+async def get_note_etag(db: AsyncSession, note_id: int) -> Optional[str]:
+    """
+    Compute the ETag of a note from indexed columns, without loading any content.
+
+    :return: The ETag, or None if the note does not exist.
+    """
+    updated_at = await db.scalar(
+        select(NoteModel.updated_at).where(NoteModel.id == note_id)
+    )
+    if updated_at is None:
+        return None
+
+    row = (await db.execute(_version_stats([note_id]))).first()
+    version_count, last_version_id = (row[1], row[2]) if row else (0, None)
+
+    return note_etag(note_id, updated_at, version_count, last_version_id)
+
+
+def note_list_etag(page: int, per_page: int, total_notes: int, notes: list) -> str:
+    """
+    ETag of a page of `get_note_list`.
+
+    :param notes: `(id, updated_at, version count, last version id)` of the notes on the page.
+    """
+    return make_etag("notes", page, per_page, total_notes, notes)
+
+
+async def get_note_list_etag(db: AsyncSession, page: int, per_page: int) -> str:
+    """Compute the ETag of a page of `get_note_list` without loading any content."""
+    offset = (page - 1) * per_page
+
+    notes = (
+        await db.execute(
+            select(NoteModel.id, NoteModel.updated_at).offset(offset).limit(per_page)
+        )
+    ).all()
+    stats = {
+        row[0]: (row[1], row[2])
+        for row in await db.execute(_version_stats([note.id for note in notes]))
+    }
+    total_notes = await db.scalar(select(func.count(NoteModel.id)))
+
+    return note_list_etag(
+        page,
+        per_page,
+        total_notes,
+        [(note.id, note.updated_at, *stats.get(note.id, (0, None))) for note in notes],
+    )
+
+
+async def get_version_list_etag(
+    db: AsyncSession, note_id: int, page: int, per_page: int
+) -> str:
+    """Compute the ETag of a page of versions from the size of the history."""
+    row = (await db.execute(_version_stats([note_id]))).first()
+    version_count, last_version_id = (row[1], row[2]) if row else (0, None)
+
+    return make_etag("versions", note_id, page, per_page, version_count, last_version_id)
@@ -0,0 +1,156 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, UTC
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import select
+
+from config import get_settings
+from database import NoteModel, VersionModel, get_db_contextmanager
+
+settings = get_settings()
+
+NOTE_CSV_COLUMNS = ["id", "content", "created_at", "updated_at"]
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+async def _iter_ndjson(db, since: Optional[datetime], include_versions: bool) -> AsyncIterator[str]:
+    if not include_versions:
+        statement = select(
+            NoteModel.id, NoteModel.content, NoteModel.created_at, NoteModel.updated_at
+        )
+    else:
+        # A single ordered join keeps at most one note's versions in memory
+        statement = select(
+            NoteModel.id,
+            NoteModel.content,
+            NoteModel.created_at,
+            NoteModel.updated_at,
+            VersionModel.version,
+            VersionModel.content,
+            VersionModel.created_at,
+        ).outerjoin(VersionModel, VersionModel.note_id == NoteModel.id)
+
+    if since is not None:
+        statement = statement.where(NoteModel.updated_at >= since)
+    statement = statement.order_by(NoteModel.id)
+    if include_versions:
+        statement = statement.order_by(VersionModel.version)
+
+    result = await db.stream(
+        statement.execution_options(yield_per=settings.EXPORT_FETCH_SIZE)
+    )
+
+    current = None
+    async for row in result:
+        if current is not None and current["id"] != row[0]:
+            yield json.dumps(current) + "\n"
+            current = None
+
+        if current is None:
+            current = {
+                "id": row[0],
+                "content": row[1],
+                "created_at": _isoformat(row[2]),
+                "updated_at": _isoformat(row[3]),
+            }
+            if include_versions:
+                current["versions"] = []
+
+        if include_versions and row[4] is not None:
+            current["versions"].append(
+                {"version": row[4], "content": row[5], "created_at": _isoformat(row[6])}
+            )
+
+    if current is not None:
+        yield json.dumps(current) + "\n"
+
+
+async def _iter_csv(db, since: Optional[datetime]) -> AsyncIterator[str]:
+    statement = select(
+        NoteModel.id, NoteModel.content, NoteModel.created_at, NoteModel.updated_at
+    ).order_by(NoteModel.id)
+    if since is not None:
+        statement = statement.where(NoteModel.updated_at >= since)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(NOTE_CSV_COLUMNS)
+
+    result = await db.stream(
+        statement.execution_options(yield_per=settings.EXPORT_FETCH_SIZE)
+    )
+    async for row in result:
+        writer.writerow(
+            [row[0], row[1], _isoformat(row[2]), _isoformat(row[3])]
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def export_note_stream(
+    file_format: str,
+    since: Optional[datetime] = None,
+    include_versions: bool = False,
+    compress: bool = False,
+) -> AsyncIterator[bytes]:
+    """
+    Stream every note (optionally with versions) as NDJSON or CSV.
+
+    Rows are read from a server-side cursor in `EXPORT_FETCH_SIZE` partitions and written
+    out in chunks of about `EXPORT_CHUNK_SIZE` bytes, so memory use does not depend on
+    the size of the corpus.
+
+    The session is opened here rather than taken from `get_db`, because the dependency
+    is closed before a streaming response starts sending its body.
+
+    Args:
+        file_format (str): Either "ndjson" or "csv".
+        since (Optional[datetime]): Only export notes updated at or after this time.
+        include_versions (bool): Embed each note's versions (NDJSON only).
+        compress (bool): Gzip the output on the fly.
+
+    Returns:
+        An async iterator of encoded body chunks.
+    """
+
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(UTC).replace(tzinfo=None)
+
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+    pending = []
+    pending_size = 0
+
+    async with get_db_contextmanager(read_only=True) as db:
+        if file_format == "csv":
+            lines = _iter_csv(db, since)
+        else:
+            lines = _iter_ndjson(db, since, include_versions)
+
+        async for line in lines:
+            data = line.encode("utf-8")
+            if compressor:
+                data = compressor.compress(data)
+
+            pending.append(data)
+            pending_size += len(data)
+
+            if pending_size >= settings.EXPORT_CHUNK_SIZE:
+                yield b"".join(pending)
+                pending.clear()
+                pending_size = 0
+
+    if compressor:
+        pending.append(compressor.flush())
+
+    if pending:
+        yield b"".join(pending)
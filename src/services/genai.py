@@ -1,13 +1,34 @@
 import asyncio
+import time
+from functools import lru_cache
 
 from fastapi import HTTPException
-from google import genai
 
 from config import get_settings
+from services.metrics import record_genai_call
 
 settings = get_settings()
 
-client = genai.Client(api_key=settings.GENAI_API_KEY)
+
+@lru_cache(maxsize=None)
+def get_client():
+    """
+    Import the GenAI SDK and create its client on first use, keeping both out of
+    application startup.
+    """
+    from google import genai
+
+    return genai.Client(api_key=settings.GENAI_API_KEY)
+
+
+def stub_summarize(content: str, max_words: int) -> str:
+    """
+    Stand-in for the GenAI API: block for `GENAI_STUB_LATENCY_MS`, like the SDK's
+    synchronous call does, then return the first `max_words` words of the content.
+    """
+    time.sleep(settings.GENAI_STUB_LATENCY_MS / 1000)
+
+    return " ".join(content.split()[:max_words])
 
 
 async def genai_summarize(content: str, max_words: int) -> str:
@@ -17,17 +38,27 @@ async def genai_summarize(content: str, max_words: int) -> str:
     if max_words < 1:
         raise HTTPException(status_code=400, detail="max_words must be positive.")
 
-    prompt = f"Summarize the following text: {content}. Make summary not longer than {max_words} words."
-
+    started = time.perf_counter()
     try:
-        response = await asyncio.to_thread(
-            client.models.generate_content,
-            model=settings.GENAI_MODEL,
-            contents=prompt,
-        )
-        return response.text.strip()
+        if settings.GENAI_STUB:
+            # Runs on the same thread pool as the real client
+            summary = await asyncio.to_thread(stub_summarize, content, max_words)
+        else:
+            prompt = f"Summarize the following text: {content}. Make summary not longer than {max_words} words."
+
+            client = await asyncio.to_thread(get_client)
+            response = await asyncio.to_thread(
+                client.models.generate_content,
+                model=settings.GENAI_MODEL,
+                contents=prompt,
+            )
+            summary = response.text.strip()
 
     except Exception as e:
+        record_genai_call(time.perf_counter() - started, "error")
         raise HTTPException(
             status_code=400, detail=f"Failed to generate summary: {str(e)}"
         )
+
+    record_genai_call(time.perf_counter() - started, "ok")
+    return summary
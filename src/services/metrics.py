@@ -0,0 +1,353 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from services.note_cache import note_cache
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+
+    return "{" + pairs + "}"
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "count")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        # One count per bucket plus `+Inf`, made cumulative only when rendered
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric(ABC):
+    """
+    A metric family in the Prometheus text format, with one child per label combination.
+
+    Children are created on first use and kept, so hot paths should hold on to the child
+    returned by `labels` when their labels do not change.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    @abstractmethod
+    def _new_child(self):
+        """Create the child holding the value of one label combination."""
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+
+        return child
+
+    def _samples(self, values: Tuple[str, ...], child) -> List[str]:
+        labels = _format_labels(self.labelnames, values)
+        return [f"{self.name}{labels} {_format_value(child.value)}"]
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._samples(values, child))
+
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _samples(self, values: Tuple[str, ...], child: _HistogramChild) -> List[str]:
+        names = self.labelnames + ("le",)
+        samples = []
+        cumulative = 0
+        for upper_bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            labels = _format_labels(names, values + (_format_value(upper_bound),))
+            samples.append(f"{self.name}_bucket{labels} {cumulative}")
+
+        labels = _format_labels(self.labelnames, values)
+        samples.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        samples.append(f"{self.name}_count{labels} {child.count}")
+
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Run `collector` before every scrape, to copy values kept elsewhere into metrics."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            collector()
+
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.register(
+    Counter(
+        "http_requests_total",
+        "Requests handled, by route and status.",
+        ("method", "route", "status"),
+    )
+)
+HTTP_REQUEST_DURATION = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time to handle a request, including streaming the body.",
+        ("method", "route"),
+    )
+)
+HTTP_REQUESTS_IN_PROGRESS = registry.register(
+    Gauge(
+        "http_requests_in_progress",
+        "Requests currently being handled.",
+        ("method", "route"),
+    )
+)
+HTTP_REQUEST_DB_QUERIES = registry.register(
+    Histogram(
+        "http_request_db_queries",
+        "Database queries per request.",
+        ("method", "route"),
+        QUERY_COUNT_BUCKETS,
+    )
+)
+HTTP_REQUEST_DB_DURATION = registry.register(
+    Histogram(
+        "http_request_db_seconds",
+        "Time spent in database queries per request.",
+        ("method", "route"),
+    )
+)
+DB_QUERIES = registry.register(
+    Counter(
+        "db_queries_total",
+        "Database queries executed, by engine.",
+        ("engine",),
+    )
+)
+DB_QUERY_ERRORS = registry.register(
+    Counter(
+        "db_query_errors_total",
+        "Database queries that raised an error, by engine.",
+        ("engine",),
+    )
+)
+DB_QUERY_DURATION = registry.register(
+    Histogram(
+        "db_query_duration_seconds",
+        "Time to execute a database query, by engine.",
+        ("engine",),
+    )
+)
+GENAI_REQUESTS = registry.register(
+    Counter(
+        "genai_requests_total",
+        "Summaries requested from the GenAI API, by outcome.",
+        ("outcome",),
+    )
+)
+GENAI_REQUEST_DURATION = registry.register(
+    Histogram(
+        "genai_request_duration_seconds",
+        "Time to get a summary from the GenAI API.",
+        ("outcome",),
+    )
+)
+NOTE_CACHE_LOOKUPS = registry.register(
+    Counter(
+        "note_cache_lookups_total",
+        "Lookups in the note response cache, by result.",
+        ("result",),
+    )
+)
+NOTE_CACHE_HIT_RATIO = registry.register(
+    Gauge(
+        "note_cache_hit_ratio",
+        "Share of note response cache lookups that were hits.",
+    )
+)
+NOTE_CACHE_BYTES = registry.register(
+    Gauge(
+        "note_cache_bytes",
+        "Size of the responses held by the note response cache.",
+    )
+)
+EVENT_LOOP_LAG = registry.register(
+    Histogram(
+        "event_loop_lag_seconds",
+        "How late the event loop woke a sleeping task.",
+    )
+)
+
+# `[query count, query seconds]` of the request being handled, if any
+request_queries: ContextVar[Optional[list]] = ContextVar("request_queries", default=None)
+
+
+def _collect_note_cache() -> None:
+    stats = note_cache.stats()
+    NOTE_CACHE_LOOKUPS.labels("hit").value = stats["hits"]
+    NOTE_CACHE_LOOKUPS.labels("miss").value = stats["misses"]
+    NOTE_CACHE_HIT_RATIO.labels().set(stats["hit_ratio"])
+    NOTE_CACHE_BYTES.labels().set(stats["bytes"])
+
+
+registry.add_collector(_collect_note_cache)
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """
+    Count and time every query of a (sync) engine, in total and for the current request.
+
+    :param engine: The engine to listen to, `AsyncEngine.sync_engine` for async engines.
+    :param name: The `engine` label of its metrics, e.g. "write" or "read".
+    """
+    queries = DB_QUERIES.labels(name)
+    errors = DB_QUERY_ERRORS.labels(name)
+    duration = DB_QUERY_DURATION.labels(name)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        queries.inc()
+        duration.observe(elapsed)
+
+        current = request_queries.get()
+        if current is not None:
+            current[0] += 1
+            current[1] += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context) -> None:
+        started = context.connection.info.get("query_started") if context.connection else None
+        if started:
+            started.pop()
+        errors.inc()
+
+
+def record_genai_call(seconds: float, outcome: str) -> None:
+    GENAI_REQUESTS.labels(outcome).inc()
+    GENAI_REQUEST_DURATION.labels(outcome).observe(seconds)
+
+
+async def run_loop_lag_monitor(interval: float) -> None:
+    """
+    Sleep for `interval` seconds over and over, recording how much later than asked the
+    event loop resumes; anything blocking the loop shows up as lag.
+    """
+    lag = EVENT_LOOP_LAG.labels()
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag.observe(max(time.perf_counter() - started - interval, 0.0))
@@ -0,0 +1,83 @@
+from typing import NamedTuple, Optional
+
+from cachetools import LRUCache
+
+from config import get_settings
+
+settings = get_settings()
+
+
+class CachedNote(NamedTuple):
+    etag: str
+    body: bytes
+
+
+class NoteResponseCache:
+    """
+    LRU cache of encoded note detail responses, bounded by the total size of the bodies.
+
+    Entries are dropped by the routes that write notes or versions. A read that started
+    before such a write could otherwise store what it loaded after the write dropped the
+    entry, so `put` ignores bodies read before the latest invalidation.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = LRUCache(
+            maxsize=max(max_bytes, 1), getsizeof=lambda entry: len(entry.body)
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, note_id: int) -> Optional[CachedNote]:
+        entry = self._entries.get(note_id)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return entry
+
+    def put(self, note_id: int, entry: CachedNote, generation: int) -> None:
+        """
+        Store the response of a note.
+
+        :param generation: The value of `generation` before the note was read.
+        """
+        if not self.enabled or generation != self.generation:
+            return
+
+        # Bodies larger than the whole cache are not worth evicting everything else for
+        if len(entry.body) > self.max_bytes:
+            return
+
+        self._entries[note_id] = entry
+
+    def invalidate(self, *note_ids: int) -> None:
+        self.generation += 1
+        for note_id in note_ids:
+            self._entries.pop(note_id, None)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+
+        return {
+            "entries": len(self._entries),
+            "bytes": self._entries.currsize,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+note_cache = NoteResponseCache(settings.NOTE_CACHE_MAX_BYTES)
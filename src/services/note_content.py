@@ -0,0 +1,173 @@
+import asyncio
+import codecs
+import re
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, Optional, Tuple
+
+import numpy as np
+
+from config import get_settings
+from database import get_db_contextmanager, read_blob
+from services.etags import get_note_etag
+from services.similarity import SignatureBuilder
+
+settings = get_settings()
+
+_BYTE_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class NoteUploadTooLarge(ValueError):
+    pass
+
+
+class NoteUpload:
+    """
+    A raw note body, spooled in memory up to `NOTE_UPLOAD_SPOOL_BYTES` and to a
+    temporary file past that, so the content is never held as one string.
+    """
+
+    def __init__(self):
+        self.file = SpooledTemporaryFile(max_size=settings.NOTE_UPLOAD_SPOOL_BYTES)
+        self.size = 0
+        self.signature: Optional[np.ndarray] = None
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def _inspect_upload(upload: NoteUpload) -> None:
+    """Check that the spooled body is UTF-8, computing its MinHash signature on the way."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    signature = SignatureBuilder() if settings.NEAR_DUPLICATE_INDEX_ON_WRITE else None
+
+    upload.file.seek(0)
+    try:
+        while chunk := upload.file.read(settings.NOTE_BLOB_CHUNK_SIZE):
+            text = decoder.decode(chunk)
+            if signature:
+                signature.update(text)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError as error:
+        raise ValueError(f"The note is not valid UTF-8: {error}") from error
+    upload.file.seek(0)
+
+    if signature:
+        upload.signature = signature.finish()
+
+
+async def spool_note_upload(chunks: AsyncIterator[bytes]) -> NoteUpload:
+    """
+    Spool a streamed note body and check it.
+
+    :param chunks: The request body, e.g. `request.stream()`.
+    :raise NoteUploadTooLarge: When the body exceeds `NOTE_UPLOAD_MAX_BYTES`.
+    :raise ValueError: When the body is not valid UTF-8.
+    :return: The spooled body, rewound, with its size and signature. The caller closes it.
+    """
+    upload = NoteUpload()
+    try:
+        async for chunk in chunks:
+            upload.size += len(chunk)
+            if upload.size > settings.NOTE_UPLOAD_MAX_BYTES:
+                raise NoteUploadTooLarge(
+                    f"The note is larger than {settings.NOTE_UPLOAD_MAX_BYTES} bytes."
+                )
+            upload.file.write(chunk)
+
+        # Decoding and hashing a large note would hold up the event loop
+        await asyncio.to_thread(_inspect_upload, upload)
+    except BaseException:
+        upload.close()
+        raise
+
+    return upload
+
+
+def parse_byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a `Range` header asking for one range of bytes.
+
+    Headers in another unit, with several ranges or that do not parse are ignored,
+    as HTTP allows, and the whole content is sent.
+
+    :param header: The `Range` header, if any.
+    :param size: The size of the content in bytes.
+    :raise ValueError: When the range starts past the end of the content.
+    :return: The half-open `(start, end)` byte range, or `None` for the whole content.
+    """
+    match = _BYTE_RANGE.fullmatch(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+
+    first, last = match.groups()
+    if first == "":
+        # `bytes=-N` is the last N bytes
+        if int(last) == 0:
+            raise ValueError("The range is empty.")
+        start, end = max(size - int(last), 0), size
+    else:
+        start = int(first)
+        end = size if last == "" else int(last) + 1
+        if last != "" and end <= start:
+            return None
+
+    if start >= size:
+        raise ValueError("The range starts past the end of the content.")
+
+    return start, min(end, size)
+
+
+class NoteContentChanged(RuntimeError):
+    pass
+
+
+class NoteContentReader:
+    """
+    Read a note's content as bytes with incremental blob I/O, without loading the rest.
+
+    Every chunk is read in a short read transaction of its own, so a client that reads
+    slowly holds neither a pooled connection nor a WAL snapshot between chunks. The
+    note's ETag is checked with every chunk: when the note changed since `open`, the
+    stream stops, leaving the client a body shorter than its `Content-Length`, instead
+    of mixing the bytes of two contents.
+    """
+
+    def __init__(self, note_id: int):
+        self.note_id = note_id
+        self._etag: Optional[str] = None
+
+    async def _read_chunk(self, start: int, size: int) -> Optional[Tuple[bytes, int]]:
+        async with get_db_contextmanager(read_only=True, note_id=self.note_id) as db:
+            etag = await get_note_etag(db, self.note_id)
+            if etag is None:
+                return None
+            if self._etag is None:
+                self._etag = etag
+            elif etag != self._etag:
+                raise NoteContentChanged(f"Note {self.note_id} changed while being read.")
+
+            return await read_blob(db, "notes", "content", self.note_id, start, size)
+
+    async def open(self) -> Optional[int]:
+        """
+        :return: The size of the content in bytes, or `None` when the note does not exist.
+        """
+        read = await self._read_chunk(0, 0)
+
+        return None if read is None else read[1]
+
+    async def read(self, start: int, end: int) -> AsyncIterator[bytes]:
+        """Stream the bytes in `[start, end)`, `NOTE_BLOB_CHUNK_SIZE` at a time."""
+        position = start
+        while position < end:
+            read = await self._read_chunk(
+                position, min(settings.NOTE_BLOB_CHUNK_SIZE, end - position)
+            )
+            if read is None:
+                raise NoteContentChanged(f"Note {self.note_id} was deleted while being read.")
+
+            chunk = read[0]
+            if not chunk:
+                break
+            yield chunk
+            position += len(chunk)
@@ -0,0 +1,164 @@
+from datetime import date, datetime, time, timedelta, UTC
+from typing import List, Optional, Tuple
+
+from sqlalchemy import String, select, func, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import NoteModel, DailyNoteStatsModel
+
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Timestamps are stored as naive UTC
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(UTC).replace(tzinfo=None)
+    return value
+
+
+def created_between(start: Optional[datetime], end: Optional[datetime]) -> list:
+    """
+    Filters on `NoteModel.created_at` for the range `[start, end)`, served by its index.
+
+    Bounds are compared as text in SQLite's own format, so a timestamp stored without
+    fractional seconds still compares equal to a bound that has none.
+    """
+    created_at = type_coerce(NoteModel.created_at, String)
+    filters = []
+    if start is not None:
+        filters.append(created_at >= start.isoformat(sep=" "))
+    if end is not None:
+        filters.append(created_at < end.isoformat(sep=" "))
+
+    return filters
+
+
+def _full_days(
+    start: Optional[datetime], end: Optional[datetime]
+) -> Tuple[Optional[date], Optional[date]]:
+    """The days `[first, last)` that lie entirely inside `[start, end)`."""
+    first = None
+    if start is not None:
+        first = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+
+    return first, end.date() if end is not None else None
+
+
+async def _scan_totals(
+    db: AsyncSession, start: Optional[datetime], end: Optional[datetime]
+) -> Tuple[int, int, int]:
+    note_count, word_count, char_count = (
+        await db.execute(
+            select(
+                func.count(NoteModel.id),
+                func.sum(
+                    func.length(NoteModel.content)
+                    - func.length(func.replace(NoteModel.content, " ", ""))
+                    + 1
+                ),
+                func.sum(func.length(NoteModel.content)),
+            ).where(*created_between(start, end))
+        )
+    ).one()
+
+    return note_count, word_count or 0, char_count or 0
+
+
+async def get_note_totals(
+    db: AsyncSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> dict:
+    """
+    Count the notes created in `[start, end)`, with their words and characters.
+
+    Whole days are read from the `daily_note_stats` rollup, so the cost grows with the
+    number of days; only the partial days at the edges of the range scan `notes`,
+    through the `created_at` index.
+    """
+
+    first_day, last_day = _full_days(start, end)
+    if first_day is not None and last_day is not None and first_day >= last_day:
+        note_count, word_count, char_count = await _scan_totals(db, start, end)
+        return {"notes": note_count, "words": word_count, "chars": char_count}
+
+    filters = []
+    if first_day is not None:
+        filters.append(DailyNoteStatsModel.day >= first_day)
+    if last_day is not None:
+        filters.append(DailyNoteStatsModel.day < last_day)
+
+    note_count, word_count, char_count = (
+        await db.execute(
+            select(
+                func.coalesce(func.sum(DailyNoteStatsModel.note_count), 0),
+                func.coalesce(func.sum(DailyNoteStatsModel.word_count), 0),
+                func.coalesce(func.sum(DailyNoteStatsModel.char_count), 0),
+            ).where(*filters)
+        )
+    ).one()
+
+    edges = []
+    if start is not None and start < datetime.combine(first_day, time.min):
+        edges.append((start, datetime.combine(first_day, time.min)))
+    if end is not None and end > datetime.combine(last_day, time.min):
+        edges.append((datetime.combine(last_day, time.min), end))
+
+    for edge_start, edge_end in edges:
+        edge = await _scan_totals(db, edge_start, edge_end)
+        note_count += edge[0]
+        word_count += edge[1]
+        char_count += edge[2]
+
+    return {"notes": note_count, "words": word_count, "chars": char_count}
+
+
+async def get_daily_stats(
+    db: AsyncSession, first_day: Optional[date], last_day: Optional[date]
+) -> List[dict]:
+    """Read the rollup for the days `[first_day, last_day]`, skipping days without notes."""
+
+    filters = [DailyNoteStatsModel.note_count > 0]
+    if first_day is not None:
+        filters.append(DailyNoteStatsModel.day >= first_day)
+    if last_day is not None:
+        filters.append(DailyNoteStatsModel.day <= last_day)
+
+    result = await db.execute(
+        select(
+            DailyNoteStatsModel.day,
+            DailyNoteStatsModel.note_count,
+            DailyNoteStatsModel.word_count,
+            DailyNoteStatsModel.char_count,
+        )
+        .where(*filters)
+        .order_by(DailyNoteStatsModel.day)
+    )
+
+    return [
+        {"day": day, "notes": note_count, "words": word_count, "chars": char_count}
+        for day, note_count, word_count, char_count in result
+    ]
+
+
+def merge_totals(parts: List[dict]) -> dict:
+    """Add up the `get_note_totals` of several shards."""
+    if len(parts) == 1:
+        return parts[0]
+
+    return {
+        key: sum(part[key] for part in parts) for key in ("notes", "words", "chars")
+    }
+
+
+def merge_daily_stats(parts: List[List[dict]]) -> List[dict]:
+    """Add up the `get_daily_stats` of several shards, day by day."""
+    if len(parts) == 1:
+        return parts[0]
+
+    days = {}
+    for part in parts:
+        for entry in part:
+            day = days.setdefault(entry["day"], dict(entry, notes=0, words=0, chars=0))
+            for key in ("notes", "words", "chars"):
+                day[key] += entry[key]
+
+    return [days[day] for day in sorted(days)]
@@ -0,0 +1,172 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import get_settings
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+# Statements worth a query plan; transaction control, pragmas and DDL are not
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class ProfiledQuery(NamedTuple):
+    statement: str
+    seconds: float
+
+
+class QueryProfile:
+    """The statements executed while handling one request."""
+
+    def __init__(self):
+        self.queries: List[ProfiledQuery] = []
+        self.slow = 0
+
+    @property
+    def seconds(self) -> float:
+        return sum(query.seconds for query in self.queries)
+
+    def repeated_shapes(self, threshold: int) -> Counter:
+        """
+        Statements run at least `threshold` times, e.g. one query per row of a list (N+1).
+
+        :return: The count of every repeated statement shape.
+        """
+        shapes = Counter(statement_shape(query.statement) for query in self.queries)
+
+        return Counter(
+            {shape: count for shape, count in shapes.items() if count >= threshold}
+        )
+
+    def summary(self) -> str:
+        repeated = self.repeated_shapes(settings.SQL_PROFILER_REPEAT_THRESHOLD)
+
+        return (
+            f"count={len(self.queries)}; time_ms={self.seconds * 1000:.2f}; "
+            f"repeated={len(repeated)}; slow={self.slow}"
+        )
+
+
+# Profile of the request being handled, while the profiler is enabled; group-committed
+# writes run in a copy of their request's context, so they land in its profile too
+current_profile: ContextVar[Optional[QueryProfile]] = ContextVar(
+    "current_profile", default=None
+)
+
+
+def statement_shape(statement: str) -> str:
+    """Collapse whitespace and `IN` lists of any length, so equal queries compare equal."""
+    return _PLACEHOLDER_LIST.sub("(?...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+def _log_query_plan(conn, statement: str, parameters, seconds: float) -> None:
+    # A DBAPI cursor on the same connection, so no SQLAlchemy events fire for it
+    explain_cursor = conn.connection.cursor()
+    try:
+        explain_cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        plan = "\n".join(f"  {row[-1]}" for row in explain_cursor.fetchall())
+    except Exception:
+        plan = "  (no plan available)"
+    finally:
+        explain_cursor.close()
+
+    logger.warning(
+        "Slow query (%.1f ms): %s\n%s", seconds * 1000, statement_shape(statement), plan
+    )
+
+
+def enable_query_profiler(engine: Engine) -> None:
+    """
+    Record the statements of every request in its `QueryProfile`, and log the query
+    plan of statements slower than `SQL_PROFILER_SLOW_QUERY_MS`.
+
+    :param engine: The engine to listen to, `AsyncEngine.sync_engine` for async engines.
+    """
+    if event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        return
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def disable_query_profiler(engine: Engine) -> None:
+    """Stop recording the statements of an engine enabled with `enable_query_profiler`."""
+    if not event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        return
+
+    event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+    event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile.get() is not None:
+        conn.info.setdefault("profiler_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    started = conn.info.get("profiler_started")
+    if profile is None or not started:
+        return
+
+    seconds = time.perf_counter() - started.pop()
+    profile.queries.append(ProfiledQuery(statement, seconds))
+
+    if seconds * 1000 >= settings.SQL_PROFILER_SLOW_QUERY_MS:
+        profile.slow += 1
+        if not executemany and statement.lstrip().upper().startswith(EXPLAINABLE):
+            _log_query_plan(conn, statement, parameters, seconds)
+
+
+class QueryProfilerMiddleware:
+    """
+    Profile the database queries of every HTTP request.
+
+    The summary is sent in the `SQL_PROFILER_HEADER` response header, so it covers the
+    queries run before the response started; repeated statements are logged when the
+    request is done.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.SQL_PROFILER_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = QueryProfile()
+        token = current_profile.set(profile)
+
+        async def send_with_summary(message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((self.header, profile.summary().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_summary)
+        finally:
+            current_profile.reset(token)
+
+        repeated = profile.repeated_shapes(settings.SQL_PROFILER_REPEAT_THRESHOLD)
+        for shape, count in repeated.most_common():
+            logger.warning(
+                "%s %s ran the same statement %d times (N+1?): %s",
+                scope["method"],
+                scope["path"],
+                count,
+                shape,
+            )
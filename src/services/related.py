@@ -0,0 +1,467 @@
+import asyncio
+import fcntl
+import json
+import shutil
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import get_settings
+from database import NoteModel
+from services.analytics_nltk import tokenize
+from services.changes import fetch_changes, get_oldest_change_id, get_latest_change_id
+
+if TYPE_CHECKING:
+    from scipy import sparse
+
+settings = get_settings()
+
+FETCH_SIZE = 1000
+INDEX_FILES = ("data", "indices", "indptr", "note_ids")
+
+
+def get_sparse():
+    # SciPy adds a noticeable share of the startup time, so it is imported on first use
+    from scipy import sparse
+
+    return sparse
+
+
+class RelatedNotesIndex:
+    """
+    TF-IDF vectors of every note, ranked by cosine similarity with sparse matrix products.
+
+    The matrix stores sublinear term frequencies (`1 + log(tf)`); inverse document
+    frequencies are applied at query time, so a changed note only touches its own row.
+    Rows live in a base CSR matrix, memory-mapped from `path`, and a small delta of
+    notes changed since it was written. Changes are read from the note change log, so
+    every write path and every process is picked up. Once the delta holds
+    `max_delta` notes, it is merged into a new base matrix and written to disk.
+
+    The IDF weights are fixed whenever the base matrix is replaced, which lets the
+    norms of its rows be computed once; a term first seen afterwards gets its weight
+    when it first appears.
+
+    Vectorizing, merging, storing and ranking run in worker threads, one at a time
+    under the index lock, so building the index never blocks the event loop.
+    """
+
+    def __init__(self, path: Optional[str], max_delta: int):
+        self.path = Path(path) if path else None
+        self.max_delta = max_delta
+        self._lock = asyncio.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.loaded = False
+        self.last_change_id = 0
+        self.vocabulary: Dict[str, int] = {}
+        self.document_frequency = np.zeros(0, dtype=np.int64)
+
+        # Set by the first `refresh`
+        self.base: Optional["sparse.csr_matrix"] = None
+        self.base_ids = np.zeros(0, dtype=np.int64)
+        self.base_rows: Dict[int, int] = {}
+        self.base_alive = np.zeros(0, dtype=bool)
+
+        # Notes changed since the base was built: note ID -> (term columns, weights)
+        self.delta: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+        self._delta_matrix = None
+        self._base_norms = None
+        self._idf_weights = None
+
+    @property
+    def note_count(self) -> int:
+        return int(self.base_alive.sum()) + len(self.delta)
+
+    # Vectors
+
+    def _vectorize(
+        self, text: str, add_terms: bool
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        counts = Counter(token.lower() for token in tokenize(text))
+
+        columns = []
+        frequencies = []
+        for term, count in counts.items():
+            column = self.vocabulary.get(term)
+            if column is None:
+                if not add_terms:
+                    continue
+                column = self.vocabulary[term] = len(self.vocabulary)
+
+            columns.append(column)
+            frequencies.append(count)
+
+        columns = np.array(columns, dtype=np.int32)
+        order = np.argsort(columns)
+
+        return columns[order], 1 + np.log(
+            np.array(frequencies, dtype=np.float32)[order]
+        )
+
+    def _count_terms(self, columns: np.ndarray, change: int) -> None:
+        if len(self.vocabulary) > len(self.document_frequency):
+            grown = np.zeros(
+                max(len(self.vocabulary), 2 * len(self.document_frequency)), dtype=np.int64
+            )
+            grown[: len(self.document_frequency)] = self.document_frequency
+            self.document_frequency = grown
+
+        self.document_frequency[columns] += change
+
+    def _idf(self) -> np.ndarray:
+        known = 0 if self._idf_weights is None else len(self._idf_weights)
+        if known < len(self.vocabulary):
+            document_frequency = self.document_frequency[known : len(self.vocabulary)]
+            weights = (
+                np.log((1 + self.note_count) / (1 + document_frequency)) + 1
+            ).astype(np.float32)
+            self._idf_weights = (
+                weights if not known else np.concatenate([self._idf_weights, weights])
+            )
+
+        return self._idf_weights
+
+    def _set_note(self, note_id: int, content: Optional[str]) -> None:
+        """Replace the vector of a note, or drop it when `content` is `None`."""
+
+        if note_id in self.delta:
+            self._count_terms(self.delta.pop(note_id)[0], -1)
+        else:
+            row = self.base_rows.get(note_id)
+            if row is not None and self.base_alive[row]:
+                start, end = self.base.indptr[row], self.base.indptr[row + 1]
+                self._count_terms(self.base.indices[start:end], -1)
+                self.base_alive[row] = False
+
+        if content is not None:
+            columns, weights = self._vectorize(content, add_terms=True)
+            if columns.size:
+                self.delta[note_id] = (columns, weights)
+                self._count_terms(columns, 1)
+
+        self._delta_matrix = None
+
+    def _set_notes(self, notes: List[Tuple[int, Optional[str]]]) -> None:
+        for note_id, content in notes:
+            self._set_note(note_id, content)
+
+    # Building and storing
+
+    def _set_base(self, matrix: "sparse.csr_matrix", note_ids: np.ndarray) -> None:
+        self.base = matrix
+        self.base_ids = note_ids
+        self.base_rows = {int(note_id): row for row, note_id in enumerate(note_ids)}
+        self.base_alive = np.ones(len(note_ids), dtype=bool)
+        self.delta = {}
+        self._delta_matrix = None
+        self._base_norms = None
+        self._idf_weights = None
+
+    def _stack_delta(self) -> Tuple[np.ndarray, "sparse.csr_matrix"]:
+        note_ids = np.fromiter(self.delta, dtype=np.int64, count=len(self.delta))
+        vectors = list(self.delta.values())
+
+        indptr = np.zeros(len(vectors) + 1, dtype=np.int64)
+        np.cumsum([columns.size for columns, _ in vectors], out=indptr[1:])
+        indices = (
+            np.concatenate([columns for columns, _ in vectors])
+            if vectors
+            else np.zeros(0, dtype=np.int32)
+        )
+        data = (
+            np.concatenate([weights for _, weights in vectors])
+            if vectors
+            else np.zeros(0, dtype=np.float32)
+        )
+
+        return note_ids, get_sparse().csr_matrix(
+            (data, indices, indptr), shape=(len(vectors), len(self.vocabulary))
+        )
+
+    def _merge(self) -> None:
+        """Fold the delta into a new base matrix and write it to disk."""
+
+        alive = np.flatnonzero(self.base_alive)
+        delta_ids, delta_matrix = self._stack_delta()
+
+        base = self.base[alive]
+        base.resize((base.shape[0], len(self.vocabulary)))
+
+        self._set_base(
+            get_sparse().vstack([base, delta_matrix], format="csr", dtype=np.float32),
+            np.concatenate([self.base_ids[alive], delta_ids]),
+        )
+        self._save()
+
+    def _base_from_delta(self) -> None:
+        """Turn the notes vectorized by a build into the base matrix and store it."""
+
+        delta_ids, delta_matrix = self._stack_delta()
+        self._set_base(delta_matrix, delta_ids)
+        self._save()
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool) -> Iterator[None]:
+        """Lock the stored index against other processes, while it is read or replaced."""
+
+        lock_path = self.path.with_name(self.path.name + ".lock")
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, "a") as lock_file:
+            # Released when the file is closed
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+
+        with self._file_lock(exclusive=True):
+            self._write_files()
+
+        # Serve the file that was just written rather than the in-memory copy
+        self._load()
+
+    def _write_files(self) -> None:
+        # Write a complete copy next to the current one, then swap the directories
+        staging = self.path.with_name(self.path.name + ".new")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+
+        index_dtype = np.int32 if self.base.nnz < np.iinfo(np.int32).max else np.int64
+        np.save(staging / "data.npy", self.base.data.astype(np.float32, copy=False))
+        np.save(staging / "indices.npy", self.base.indices.astype(index_dtype, copy=False))
+        np.save(staging / "indptr.npy", self.base.indptr.astype(index_dtype, copy=False))
+        np.save(staging / "note_ids.npy", self.base_ids)
+
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        (staging / "vocabulary.json").write_text(json.dumps(terms), encoding="utf-8")
+        (staging / "meta.json").write_text(
+            json.dumps(
+                {"last_change_id": self.last_change_id, "shape": list(self.base.shape)}
+            ),
+            encoding="utf-8",
+        )
+
+        previous = self.path.with_name(self.path.name + ".old")
+        shutil.rmtree(previous, ignore_errors=True)
+        if self.path.exists():
+            self.path.rename(previous)
+        staging.rename(self.path)
+        shutil.rmtree(previous, ignore_errors=True)
+
+    def _remove_files(self) -> None:
+        with self._file_lock(exclusive=True):
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def _load(self) -> bool:
+        if self.path is None:
+            return False
+
+        with self._file_lock(exclusive=False):
+            if not (self.path / "meta.json").exists():
+                return False
+
+            meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+            terms = json.loads((self.path / "vocabulary.json").read_text(encoding="utf-8"))
+            # Mapped arrays stay readable after another process swaps the directory
+            arrays = {
+                name: np.load(self.path / f"{name}.npy", mmap_mode="r")
+                for name in INDEX_FILES
+            }
+
+        self.vocabulary = {term: column for column, term in enumerate(terms)}
+        self._set_base(
+            get_sparse().csr_matrix(
+                (arrays["data"], arrays["indices"], arrays["indptr"]),
+                shape=tuple(meta["shape"]),
+                copy=False,
+            ),
+            arrays["note_ids"],
+        )
+        self.document_frequency = np.bincount(
+            self.base.indices, minlength=len(self.vocabulary)
+        ).astype(np.int64)
+        self.last_change_id = meta["last_change_id"]
+
+        return True
+
+    async def _build(self, db: AsyncSession) -> None:
+        """Vectorize every note, reading them in batches."""
+
+        self.reset()
+        # Read before the notes: later changes are replayed, which is idempotent
+        self.last_change_id = await get_latest_change_id(db)
+
+        last_id = 0
+        while True:
+            result = await db.execute(
+                select(NoteModel.id, NoteModel.content)
+                .where(NoteModel.id > last_id)
+                .order_by(NoteModel.id)
+                .limit(FETCH_SIZE)
+            )
+            notes = result.all()
+            if not notes:
+                break
+
+            await asyncio.to_thread(self._set_notes, notes)
+            last_id = notes[-1][0]
+
+        await asyncio.to_thread(self._base_from_delta)
+        self.loaded = True
+
+    # Updating
+
+    async def rebuild(self, db: AsyncSession) -> int:
+        """
+        Vectorize every note from scratch and store the matrix.
+
+        :return: The number of indexed notes.
+        """
+        async with self._lock:
+            await self._build(db)
+
+        return self.note_count
+
+    async def discard(self) -> None:
+        """Drop the index, in memory and on disk, so the next refresh builds it from scratch."""
+
+        async with self._lock:
+            self.reset()
+            if self.path is not None:
+                await asyncio.to_thread(self._remove_files)
+
+    async def refresh(self, db: AsyncSession) -> None:
+        """Load or build the index, then apply the changes logged since it was last updated."""
+
+        async with self._lock:
+            await self._refresh(db)
+
+    async def _refresh(self, db: AsyncSession) -> None:
+        if not self.loaded:
+            if await asyncio.to_thread(self._load):
+                self.loaded = True
+            else:
+                await self._build(db)
+
+        # Entries the index never saw were pruned from the change log
+        oldest_change_id = await get_oldest_change_id(db)
+        if oldest_change_id is not None and oldest_change_id > self.last_change_id + 1:
+            await self._build(db)
+
+        while True:
+            changes = await fetch_changes(db, self.last_change_id, FETCH_SIZE)
+            if not changes:
+                break
+
+            note_ids = {change["note_id"] for change in changes}
+            result = await db.execute(
+                select(NoteModel.id, NoteModel.content).where(NoteModel.id.in_(note_ids))
+            )
+            contents = dict(result.all())
+            await asyncio.to_thread(
+                self._set_notes, [(note_id, contents.get(note_id)) for note_id in note_ids]
+            )
+
+            self.last_change_id = changes[-1]["id"]
+
+        if len(self.delta) >= self.max_delta:
+            await asyncio.to_thread(self._merge)
+
+    async def find(
+        self,
+        db: AsyncSession,
+        k: int,
+        note: Optional[NoteModel] = None,
+        text: Optional[str] = None,
+    ) -> List[dict]:
+        """Bring the index up to date, then rank the notes related to a note or to free text."""
+
+        # Ranking fills the cached norms, so it must not overlap a refresh either
+        async with self._lock:
+            await self._refresh(db)
+
+            if note is not None:
+                return await asyncio.to_thread(self.related_to_note, note.id, note.content, k)
+
+            return await asyncio.to_thread(self.related_to_text, text, k)
+
+    # Querying
+
+    def _rank(
+        self, columns: np.ndarray, weights: np.ndarray, k: int, exclude: Optional[int]
+    ) -> List[dict]:
+        if not columns.size or not self.note_count:
+            return []
+
+        idf = self._idf()
+        query = weights * idf[columns]
+        query_norm = np.linalg.norm(query)
+
+        # tfidf(doc) . tfidf(query) = tf(doc) . (idf * tfidf(query))
+        projection = np.zeros(len(self.vocabulary), dtype=np.float32)
+        projection[columns] = query * idf[columns]
+        squared_idf = idf * idf
+
+        if self._base_norms is None:
+            squared = get_sparse().csr_matrix(
+                (np.square(self.base.data), self.base.indices, self.base.indptr),
+                shape=self.base.shape,
+            )
+            self._base_norms = np.sqrt(squared @ squared_idf[: self.base.shape[1]])
+
+        if self._delta_matrix is None:
+            self._delta_matrix = self._stack_delta()
+        delta_ids, delta_matrix = self._delta_matrix
+        delta_norms = np.sqrt(delta_matrix.multiply(delta_matrix) @ squared_idf)
+
+        alive = np.flatnonzero(self.base_alive)
+        note_ids = np.concatenate([self.base_ids[alive], delta_ids])
+        dots = np.concatenate(
+            [
+                (self.base @ projection[: self.base.shape[1]])[alive],
+                delta_matrix @ projection,
+            ]
+        )
+        norms = np.concatenate([self._base_norms[alive], delta_norms])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.where(norms > 0, dots / (norms * query_norm), 0)
+        if exclude is not None:
+            scores[note_ids == exclude] = 0
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        return [
+            {"id": int(note_ids[row]), "score": round(float(scores[row]), 4)}
+            for row in top
+            if scores[row] > 0
+        ]
+
+    def related_to_text(self, text: str, k: int, exclude: Optional[int] = None) -> List[dict]:
+        """Rank the indexed notes by cosine similarity to free text."""
+        return self._rank(*self._vectorize(text, add_terms=False), k, exclude)
+
+    def related_to_note(self, note_id: int, content: str, k: int) -> List[dict]:
+        return self.related_to_text(content, k, exclude=note_id)
+
+
+related_index = RelatedNotesIndex(settings.RELATED_INDEX_PATH, settings.RELATED_INDEX_MAX_DELTA)
+
+
+async def find_related_notes(
+    db: AsyncSession, k: int, note: Optional[NoteModel] = None, text: Optional[str] = None
+) -> List[dict]:
+    """Bring the index up to date, then rank the notes related to a note or to free text."""
+
+    return await related_index.find(db, k, note=note, text=text)
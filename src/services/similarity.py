@@ -0,0 +1,384 @@
+import heapq
+import re
+from hashlib import blake2b
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, insert, delete, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from config import get_settings
+from database import NoteModel, NoteSignatureModel, NoteLshBucketModel
+
+settings = get_settings()
+
+# Universal hashing modulo a Mersenne prime stands in for the random permutations.
+# The products wrap around 64 bits, which still mixes well after the modulo
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+WORD_PATTERN = re.compile(r"\w+")
+
+# Fixed seed: signatures must stay comparable across processes and restarts
+_permutation_rng = np.random.RandomState(0x5EED)
+PERMUTATION_A = _permutation_rng.randint(
+    1, MERSENNE_PRIME, size=(settings.NEAR_DUPLICATE_NUM_PERM, 1), dtype=np.uint64
+)
+PERMUTATION_B = _permutation_rng.randint(
+    0, MERSENNE_PRIME, size=(settings.NEAR_DUPLICATE_NUM_PERM, 1), dtype=np.uint64
+)
+ROWS_PER_BAND = max(settings.NEAR_DUPLICATE_NUM_PERM // settings.NEAR_DUPLICATE_BANDS, 1)
+
+# Signatures are stored as packed little-endian 32-bit integers
+SIGNATURE_DTYPE = np.dtype("<u4")
+
+# Shingles hashed by all permutations at once: 1024 x 128 permutations is 1 MB of uint64
+MIN_HASH_CHUNK_SIZE = 1024
+# Candidate pairs read from the database at a time by `find_duplicate_pairs`
+PAIR_FETCH_SIZE = 1000
+
+
+def _hash_shingles(shingles: Iterable[str]) -> np.ndarray:
+    shingles = list(shingles)
+
+    return np.fromiter(
+        (
+            int.from_bytes(blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+            for shingle in shingles
+        ),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+
+
+def _min_hashes(hashes: np.ndarray) -> np.ndarray:
+    # Permuting every shingle at once would take num_perm x n_shingles integers, so the
+    # shingles go through in chunks and only a running minimum is kept
+    minimums = np.full(len(PERMUTATION_A), MAX_HASH, dtype=np.uint64)
+    for start in range(0, len(hashes), MIN_HASH_CHUNK_SIZE):
+        chunk = hashes[start : start + MIN_HASH_CHUNK_SIZE]
+        permuted = (PERMUTATION_A * chunk + PERMUTATION_B) % MERSENNE_PRIME & MAX_HASH
+        np.minimum(minimums, permuted.min(axis=1), out=minimums)
+
+    return minimums.astype(SIGNATURE_DTYPE)
+
+
+def shingle_hashes(content: str) -> np.ndarray:
+    """Hash the overlapping word n-grams of a note, ignoring case and punctuation."""
+    words = WORD_PATTERN.findall(content.lower())
+    size = settings.NEAR_DUPLICATE_SHINGLE_SIZE
+
+    # A note shorter than one shingle is a single shingle
+    shingles = {
+        " ".join(words[i : i + size])
+        for i in range(max(len(words) - size + 1, 1 if words else 0))
+    }
+
+    return _hash_shingles(shingles)
+
+
+def compute_signature(content: str) -> Optional[np.ndarray]:
+    """
+    Compute the MinHash signature of a note, all permutations at once for each chunk
+    of `MIN_HASH_CHUNK_SIZE` shingles.
+
+    :return: `NEAR_DUPLICATE_NUM_PERM` minimums, or `None` for a note without words.
+    """
+    hashes = shingle_hashes(content)
+    if not hashes.size:
+        return None
+
+    return _min_hashes(hashes)
+
+
+class SignatureBuilder:
+    """
+    Compute the signature of `compute_signature` from consecutive pieces of a note, for
+    notes too large to hold in memory as one string.
+
+    Only the last words of a piece are kept for the shingles that span into the next one,
+    and the minimums of every piece are merged as they come.
+    """
+
+    def __init__(self):
+        self.size = settings.NEAR_DUPLICATE_SHINGLE_SIZE
+        self.minimums: Optional[np.ndarray] = None
+        self._window: List[str] = []
+        self._partial_word = ""
+
+    def update(self, text: str) -> None:
+        text = self._partial_word + text
+
+        # A word at the very end may go on in the next piece. Matched on the reversed
+        # text, since searching for `\w+\Z` is quadratic in the length of the word run
+        trailing = WORD_PATTERN.match(text[::-1])
+        cut = len(text) - (trailing.end() if trailing else 0)
+        self._partial_word = text[cut:]
+        text = text[:cut]
+
+        self._add_words(WORD_PATTERN.findall(text.lower()))
+
+    def _add_words(self, words: List[str]) -> None:
+        words = self._window + words
+        shingles = {
+            " ".join(words[i : i + self.size]) for i in range(len(words) - self.size + 1)
+        }
+        if shingles:
+            self._merge(_min_hashes(_hash_shingles(shingles)))
+
+        self._window = words[len(words) - self.size + 1 :] if self.size > 1 else []
+
+    def _merge(self, minimums: np.ndarray) -> None:
+        if self.minimums is None:
+            self.minimums = minimums
+        else:
+            np.minimum(self.minimums, minimums, out=self.minimums)
+
+    def finish(self) -> Optional[np.ndarray]:
+        """
+        :return: The signature of the whole note, or `None` for a note without words.
+        """
+        self._add_words(WORD_PATTERN.findall(self._partial_word.lower()))
+        self._partial_word = ""
+
+        # A note shorter than one shingle is a single shingle
+        if self.minimums is None and self._window:
+            self._merge(_min_hashes(_hash_shingles([" ".join(self._window)])))
+
+        return self.minimums
+
+
+def pack_signature(signature: np.ndarray) -> bytes:
+    return signature.tobytes()
+
+
+def unpack_signature(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=SIGNATURE_DTYPE)
+
+
+def band_buckets(signature: np.ndarray) -> List[Tuple[int, int]]:
+    """Hash each band of `ROWS_PER_BAND` minimums into a signed 64-bit bucket key."""
+    buckets = []
+    for band in range(settings.NEAR_DUPLICATE_BANDS):
+        rows = signature[band * ROWS_PER_BAND : (band + 1) * ROWS_PER_BAND]
+        if len(rows) < ROWS_PER_BAND:
+            break
+
+        digest = blake2b(rows.tobytes(), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "little", signed=True)))
+
+    return buckets
+
+
+def estimate_similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimate the Jaccard similarity of two notes from their signatures."""
+    return float(np.count_nonzero(first == second)) / len(first)
+
+
+async def index_notes(db: AsyncSession, notes: Iterable[Tuple[int, str]]) -> None:
+    """
+    Store the signatures and LSH buckets of notes, replacing previous ones, in the
+    caller's transaction. Deleted notes leave the index through `ON DELETE CASCADE`.
+    """
+
+    await index_signatures(
+        db, [(note_id, compute_signature(content)) for note_id, content in notes]
+    )
+
+
+async def index_signatures(
+    db: AsyncSession, signatures: Iterable[Tuple[int, Optional[np.ndarray]]]
+) -> None:
+    """Like `index_notes`, for signatures computed beforehand, `None` for notes without words."""
+
+    signatures = list(signatures)
+    note_ids = [note_id for note_id, _ in signatures]
+    if not note_ids:
+        return
+
+    await db.execute(
+        delete(NoteLshBucketModel).where(NoteLshBucketModel.note_id.in_(note_ids))
+    )
+    await db.execute(
+        delete(NoteSignatureModel).where(NoteSignatureModel.note_id.in_(note_ids))
+    )
+
+    signature_rows = []
+    bucket_rows = []
+    for note_id, signature in signatures:
+        if signature is None:
+            continue
+
+        signature_rows.append({"note_id": note_id, "signature": pack_signature(signature)})
+        bucket_rows.extend(
+            {"band": band, "bucket": bucket, "note_id": note_id}
+            for band, bucket in band_buckets(signature)
+        )
+
+    if signature_rows:
+        await db.execute(insert(NoteSignatureModel.__table__), signature_rows)
+        await db.execute(insert(NoteLshBucketModel.__table__), bucket_rows)
+
+
+async def _get_signature(db: AsyncSession, note: NoteModel) -> Optional[np.ndarray]:
+    data = await db.scalar(
+        select(NoteSignatureModel.signature).where(NoteSignatureModel.note_id == note.id)
+    )
+    if data is not None:
+        return unpack_signature(data)
+
+    # Notes written before the index existed, or with indexing on write disabled
+    return compute_signature(note.content)
+
+
+async def find_similar_notes(
+    db: AsyncSession, note: NoteModel, threshold: float, limit: int
+) -> List[dict]:
+    """
+    Find the notes whose estimated similarity to `note` is at least `threshold`.
+
+    Only notes sharing at least one LSH bucket with `note` are compared, so the cost
+    depends on the number of candidates rather than on the size of the corpus.
+    """
+
+    signature = await _get_signature(db, note)
+    if signature is None:
+        return []
+
+    # One primary key lookup per band; SQLite would scan for a row-value IN list
+    candidates = (
+        select(NoteLshBucketModel.note_id)
+        .where(
+            or_(
+                *(
+                    and_(
+                        NoteLshBucketModel.band == band,
+                        NoteLshBucketModel.bucket == bucket,
+                    )
+                    for band, bucket in band_buckets(signature)
+                )
+            ),
+            NoteLshBucketModel.note_id != note.id,
+        )
+        .distinct()
+    )
+    result = await db.execute(
+        select(NoteSignatureModel.note_id, NoteSignatureModel.signature).where(
+            NoteSignatureModel.note_id.in_(candidates)
+        )
+    )
+
+    similar = []
+    for note_id, data in result:
+        similarity = estimate_similarity(signature, unpack_signature(data))
+        if similarity >= threshold:
+            similar.append({"id": note_id, "similarity": round(similarity, 4)})
+
+    similar.sort(key=lambda match: (-match["similarity"], match["id"]))
+
+    return similar[:limit]
+
+
+async def find_duplicate_pairs(
+    db: AsyncSession, threshold: float, limit: int
+) -> List[dict]:
+    """
+    Find pairs of notes whose estimated similarity is at least `threshold`, most similar first.
+
+    Candidate pairs come from a self-join of the LSH buckets on the bucket index, so
+    only notes that share a bucket are ever compared. They are streamed in ID order and
+    only the best `limit` pairs are kept; reading stops once those are all exact matches.
+    """
+
+    first_bucket = aliased(NoteLshBucketModel)
+    second_bucket = aliased(NoteLshBucketModel)
+    pairs = (
+        select(
+            first_bucket.note_id.label("first_id"),
+            second_bucket.note_id.label("second_id"),
+        )
+        .join(
+            second_bucket,
+            and_(
+                first_bucket.band == second_bucket.band,
+                first_bucket.bucket == second_bucket.bucket,
+                first_bucket.note_id < second_bucket.note_id,
+            ),
+        )
+        .distinct()
+        .subquery()
+    )
+
+    first_signature = aliased(NoteSignatureModel)
+    second_signature = aliased(NoteSignatureModel)
+    result = await db.stream(
+        select(
+            pairs.c.first_id,
+            pairs.c.second_id,
+            first_signature.signature,
+            second_signature.signature,
+        )
+        .join(first_signature, first_signature.note_id == pairs.c.first_id)
+        .join(second_signature, second_signature.note_id == pairs.c.second_id)
+        .order_by(pairs.c.first_id, pairs.c.second_id)
+        .execution_options(yield_per=PAIR_FETCH_SIZE)
+    )
+
+    # `(similarity, -first_id, -second_id)` of the best pairs so far, worst first
+    best: List[Tuple[float, int, int]] = []
+    async for first_id, second_id, first_data, second_data in result:
+        similarity = estimate_similarity(
+            unpack_signature(first_data), unpack_signature(second_data)
+        )
+        if similarity < threshold:
+            continue
+
+        pair = (round(similarity, 4), -first_id, -second_id)
+        if len(best) < limit:
+            heapq.heappush(best, pair)
+        elif pair > best[0]:
+            heapq.heapreplace(best, pair)
+
+        # Later pairs have higher IDs, so none can rank above `limit` exact matches
+        if len(best) == limit and best[0][0] == 1:
+            await result.close()
+            break
+
+    return [
+        {"note_ids": [-first_id, -second_id], "similarity": similarity}
+        for similarity, first_id, second_id in sorted(best, reverse=True)
+    ]
+
+
+async def rebuild_similarity_index(db: AsyncSession, batch_size: int = 1000) -> int:
+    """
+    Recompute the signatures of every note, committing after each batch.
+
+    :return: The number of notes processed.
+    """
+
+    await db.execute(delete(NoteLshBucketModel))
+    await db.execute(delete(NoteSignatureModel))
+
+    processed = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(NoteModel.id, NoteModel.content)
+            .where(NoteModel.id > last_id)
+            .order_by(NoteModel.id)
+            .limit(batch_size)
+        )
+        notes = result.all()
+        if not notes:
+            break
+
+        await index_notes(db, notes)
+        await db.commit()
+
+        processed += len(notes)
+        last_id = notes[-1][0]
+
+    await db.commit()
+
+    return processed
@@ -0,0 +1,31 @@
+import logging
+import time
+
+from services.analytics_nltk import get_tokenizer
+from services.genai import get_client
+from services.related import get_sparse
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up_services() -> None:
+    """
+    Import the heavy optional dependencies and build their clients ahead of the first
+    request that needs them. Meant to run in a thread; failures are only logged, the
+    services retry on first use.
+    """
+
+    for name, warm_up in (
+        ("NLTK tokenizer", get_tokenizer),
+        ("GenAI client", get_client),
+        ("SciPy", get_sparse),
+    ):
+        started = time.perf_counter()
+        try:
+            warm_up()
+        except Exception:
+            logger.warning("Warming up the %s failed.", name, exc_info=True)
+        else:
+            logger.info(
+                "Warmed up the %s in %.2f s.", name, time.perf_counter() - started
+            )
@@ -0,0 +1,226 @@
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from cachetools import LRUCache
+
+from config import get_settings
+
+settings = get_settings()
+
+GRANULARITIES = ("line", "word")
+FORMATS = ("json", "unified")
+
+# Words, runs of whitespace (newlines included) and runs of punctuation
+_WORD_TOKENS = re.compile(r"\w+|\s+|[^\w\s]+")
+
+_OP_PREFIXES = {"equal": " ", "delete": "-", "insert": "+"}
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def tokenize_diff(text: str, granularity: str) -> List[str]:
+    """
+    Split a text into the units a diff compares.
+
+    Lines keep their line ending and words keep the whitespace between them as tokens of
+    their own, so joining the tokens gives the text back.
+    """
+    if granularity == "word":
+        return _WORD_TOKENS.findall(text)
+
+    return text.splitlines(keepends=True)
+
+
+def _diff_opcodes(old: Sequence[str], new: Sequence[str]) -> List[Opcode]:
+    """
+    Opcodes turning `old` into `new`, like `SequenceMatcher.get_opcodes`.
+
+    Edits usually touch a small part of a note, so the common head and tail are cut
+    off first and only the middle goes through the matcher, whose cost grows with the
+    product of the lengths it compares.
+    """
+    limit = min(len(old), len(new))
+    head = 0
+    while head < limit and old[head] == new[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and old[-1 - tail] == new[-1 - tail]:
+        tail += 1
+
+    opcodes: List[Opcode] = []
+    if head:
+        opcodes.append(("equal", 0, head, 0, head))
+
+    old_end, new_end = len(old) - tail, len(new) - tail
+    if head < old_end or head < new_end:
+        matcher = SequenceMatcher(None, old[head:old_end], new[head:new_end])
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            opcodes.append((tag, i1 + head, i2 + head, j1 + head, j2 + head))
+
+    if tail:
+        opcodes.append(("equal", old_end, len(old), new_end, len(new)))
+
+    return opcodes
+
+
+def _group_opcodes(opcodes: List[Opcode], context: int) -> List[List[Opcode]]:
+    """Group the changes with `context` units around them, like `get_grouped_opcodes`."""
+    if all(tag == "equal" for tag, *_ in opcodes):
+        return []
+
+    codes = list(opcodes)
+    tag, i1, i2, j1, j2 = codes[0]
+    if tag == "equal":
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    tag, i1, i2, j1, j2 = codes[-1]
+    if tag == "equal":
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    groups, group = [], []
+    for tag, i1, i2, j1, j2 in codes:
+        # A long unchanged run ends one hunk and starts the next
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+
+    return groups
+
+
+def _append_segment(lines: List[str], op: str, tokens: Sequence[str], merge: bool) -> None:
+    if not tokens:
+        return
+    prefix = _OP_PREFIXES[op]
+    if merge:
+        lines.append(prefix + "".join(tokens))
+    else:
+        lines.extend(prefix + token for token in tokens)
+
+
+def diff_texts(old: str, new: str, granularity: str = "line", context: int = 3) -> Dict:
+    """
+    Compute the changes between two texts as hunks.
+
+    :param old: The text diffed from.
+    :param new: The text diffed to.
+    :param granularity: `line`, or `word` to compare words within the changed lines.
+    :param context: The number of unchanged units kept around each change.
+    :return: The hunks and the number of inserted and deleted units. A hunk has the
+        0-based start and length of its range in each text and its units prefixed by
+        `" "`, `"-"` or `"+"`; with `word`, neighbouring units of one kind are merged.
+    """
+    old_tokens = tokenize_diff(old, granularity)
+    new_tokens = tokenize_diff(new, granularity)
+    merge = granularity == "word"
+
+    hunks = []
+    insertions = deletions = 0
+    for group in _group_opcodes(_diff_opcodes(old_tokens, new_tokens), context):
+        lines: List[str] = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                _append_segment(lines, "equal", old_tokens[i1:i2], merge)
+                continue
+            _append_segment(lines, "delete", old_tokens[i1:i2], merge)
+            _append_segment(lines, "insert", new_tokens[j1:j2], merge)
+            deletions += i2 - i1
+            insertions += j2 - j1
+
+        first, last = group[0], group[-1]
+        hunks.append(
+            {
+                "from_start": first[1],
+                "from_count": last[2] - first[1],
+                "to_start": first[3],
+                "to_count": last[4] - first[3],
+                "lines": lines,
+            }
+        )
+
+    return {"insertions": insertions, "deletions": deletions, "hunks": hunks}
+
+
+def _unified_range(start: int, count: int) -> str:
+    # An empty range names the line before it, as `diff -u` does
+    if count == 0:
+        return f"{start},0"
+    if count == 1:
+        return str(start + 1)
+
+    return f"{start + 1},{count}"
+
+
+def format_unified_diff(diff: Dict, from_label: str, to_label: str) -> str:
+    """
+    Render the hunks of a line diff in the unified format of `diff -u` and `git diff`.
+
+    :return: The patch text, empty when the texts are equal.
+    """
+    if not diff["hunks"]:
+        return ""
+
+    output = [f"--- {from_label}\n", f"+++ {to_label}\n"]
+    for hunk in diff["hunks"]:
+        output.append(
+            f"@@ -{_unified_range(hunk['from_start'], hunk['from_count'])} "
+            f"+{_unified_range(hunk['to_start'], hunk['to_count'])} @@\n"
+        )
+        for line in hunk["lines"]:
+            if line.endswith("\n"):
+                output.append(line)
+            else:
+                output.append(line + "\n\\ No newline at end of file\n")
+
+    return "".join(output)
+
+
+class DiffCacheKey(NamedTuple):
+    # Version row ids are never reused within a shard, so with the note they pin both texts
+    note_id: int
+    from_id: int
+    to_id: int
+    granularity: str
+    context: int
+    format: str
+
+
+class VersionDiffCache:
+    """
+    LRU cache of encoded diff responses, bounded by the total size of the bodies.
+
+    Versions are immutable, so entries never go stale and nothing invalidates them.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = LRUCache(maxsize=max(max_bytes, 1), getsizeof=len)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: DiffCacheKey) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return body
+
+    def put(self, key: DiffCacheKey, body: bytes) -> None:
+        if self.enabled and len(body) <= self.max_bytes:
+            self._entries[key] = body
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+version_diff_cache = VersionDiffCache(settings.VERSION_DIFF_CACHE_MAX_BYTES)
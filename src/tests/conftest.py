@@ -1,3 +1,6 @@
+import asyncio
+from typing import List
+
 import pytest
 import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
@@ -5,9 +8,15 @@ from httpx import ASGITransport, AsyncClient
 from database import (
     reset_sqlite_database,
     get_db_contextmanager,
+    create_shard,
+    init_db,
+    shards,
+    write_queue,
+    Shard,
     NoteModel,
 )
 from main import app
+from services import note_cache, related_index
 
 
 @pytest_asyncio.fixture(scope="function", autouse=True)
@@ -19,6 +28,9 @@ async def reset_db():
     It helps maintain test isolation by preventing data leakage between tests.
     """
     await reset_sqlite_database()
+    # Cached responses and indexed notes would outlive the rows they were built from
+    note_cache.clear()
+    related_index.reset()
 
 
 @pytest_asyncio.fixture(scope="function")
@@ -30,6 +42,62 @@ async def client():
         yield async_client
 
 
+@pytest_asyncio.fixture(scope="function")
+async def group_commit(monkeypatch):
+    """
+    Enable group commit for one test, and stop the queue's worker before the test's
+    event loop closes.
+    """
+    monkeypatch.setattr("database.group_commit.settings.GROUP_COMMIT_ENABLED", True)
+    yield
+    await write_queue.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def file_shards(tmp_path, monkeypatch):
+    """
+    Provide a function that moves the app to new database files in a temporary directory.
+
+    The suite runs on an in-memory database, whose readers share the writer's connection,
+    so the separate read engine, its pool and sharding only run on files. The function
+    takes the number of shards and returns them; the in-memory database is put back and
+    the files' engines disposed after the test.
+    """
+    original = list(shards)
+    opened: List[Shard] = []
+
+    async def open_shards(count: int = 1) -> List[Shard]:
+        new = [
+            create_shard(
+                index,
+                str(tmp_path / ("notes.db" if index == 0 else f"notes.shard{index}.db")),
+                count,
+            )
+            for index in range(count)
+        ]
+        opened.extend(new)
+        await init_db(new)
+
+        shards[:] = new
+        monkeypatch.setattr("database.session.AsyncSQLiteSessionLocal", new[0].session_factory)
+        monkeypatch.setattr(
+            "database.session.AsyncSQLiteReadSessionLocal", new[0].read_session_factory
+        )
+        monkeypatch.setattr(write_queue, "_session_factory", new[0].session_factory)
+
+        return new
+
+    yield open_shards
+
+    shards[:] = original
+    # A worker left by an earlier test belongs to that test's closed loop
+    if write_queue._loop is asyncio.get_running_loop():
+        await write_queue.close()
+    for shard in opened:
+        await shard.engine.dispose()
+        await shard.read_engine.dispose()
+
+
 @pytest_asyncio.fixture(scope="function")
 async def db_session():
     """
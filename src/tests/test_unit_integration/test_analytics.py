@@ -1,8 +1,17 @@
+import json
+import os
 import random
+import subprocess
+import sys
+from datetime import datetime
+
 import pytest
+from httpx import ASGITransport, AsyncClient
 from sqlalchemy import select, func, cast, Float
 
-from database import NoteModel
+from database import NoteModel, DailyNoteStatsModel, gather_shards
+from main import app
+from services import RequestProfilerMiddleware
 
 
 random_id = random.randint(1, 10)
@@ -70,6 +79,72 @@ async def test_summary_by_note_id_and_max_words(client):
     assert len(response.json()["summary"].split()) >= 1
 
 
+@pytest.mark.asyncio
+async def test_summary_with_genai_stub(client, monkeypatch):
+    """
+    Test summary endpoint with the local GenAI stub used by benchmarks.
+
+    Expected:
+        - 200 response status code.
+        - The summary is the first max_words words of the note.
+    """
+
+    monkeypatch.setattr("services.genai.settings.GENAI_STUB", True)
+
+    new_note = await client.post(
+        "/api/v1/notes/", json={"content": "This is a test note for the stub."}
+    )
+    note_id = new_note.json()["id"]
+
+    response = await client.get(
+        f"/api/v1/analytics/summary/?note_id={note_id}&max_words=3"
+    )
+    assert response.status_code == 200
+    assert response.json() == {"summary": "This is a"}
+
+
+@pytest.mark.asyncio
+async def test_request_profiler(client, monkeypatch, tmp_path):
+    """
+    Test profiling a request selected with the secret header.
+
+    Expected:
+        - A folded stack profile named after the route is saved.
+        - Time spent waiting on the GenAI thread is attributed to `genai_summarize`.
+        - Requests without the header are not profiled.
+    """
+    for name, value in {
+        "DEBUG": True,
+        "REQUEST_PROFILER_SECRET": "let-me-profile",
+        "REQUEST_PROFILER_DIR": str(tmp_path),
+    }.items():
+        monkeypatch.setattr(f"services.request_profiler.settings.{name}", value)
+    monkeypatch.setattr("services.genai.settings.GENAI_STUB", True)
+    monkeypatch.setattr("services.genai.settings.GENAI_STUB_LATENCY_MS", 50.0)
+
+    new_note = await client.post("/api/v1/notes/", json={"content": "Profile me."})
+    note_id = new_note.json()["id"]
+
+    async with AsyncClient(
+        transport=ASGITransport(app=RequestProfilerMiddleware(app)), base_url="http://test"
+    ) as profiled_client:
+        await profiled_client.get(f"/api/v1/analytics/summary/?note_id={note_id}")
+        response = await profiled_client.get(
+            f"/api/v1/analytics/summary/?note_id={note_id}",
+            headers={"X-Profile-Request": "let-me-profile"},
+        )
+
+    assert response.status_code == 200
+    profiles = list(tmp_path.iterdir())
+    assert len(profiles) == 1
+    assert "_GET_api_v1_analytics_summary_" in profiles[0].name
+    assert profiles[0].name.endswith("ms.folded")
+
+    stacks = profiles[0].read_text().splitlines()
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+    assert any("genai_summarize" in line and "<await" in line for line in stacks)
+
+
 @pytest.mark.asyncio
 async def test_total_words_no_notes(client):
     """
@@ -189,3 +264,237 @@ async def test_get_top3_shortest_notes(client, populate_test_10_notes_different_
 
     for i in range(len(top_3_shortest_notes) - 1):
         assert len(top_3_shortest_notes[i]) <= len(top_3_shortest_notes[i + 1])
+
+
+@pytest.mark.asyncio
+async def test_daily_rollup_follows_writes(client, db_session):
+    """
+    Test that the daily rollup stays equal to a scan of the notes after creates, updates and deletes.
+
+    Expected:
+        - The rollup of every day matches the notes created on that day.
+        - The daily endpoint returns the same numbers.
+    """
+
+    ids = []
+    for content in ("one two three", "four five", "six"):
+        response = await client.post("/api/v1/notes/", json={"content": content})
+        ids.append(response.json()["id"])
+
+    await client.put(f"/api/v1/notes/{ids[0]}/", json={"content": "one two three four"})
+    await client.delete(f"/api/v1/notes/{ids[2]}/")
+
+    expected = (
+        await db_session.execute(
+            select(
+                func.date(NoteModel.created_at),
+                func.count(NoteModel.id),
+                func.sum(
+                    func.length(NoteModel.content)
+                    - func.length(func.replace(NoteModel.content, " ", ""))
+                    + 1
+                ),
+                func.sum(func.length(NoteModel.content)),
+            ).group_by(func.date(NoteModel.created_at))
+        )
+    ).all()
+
+    rollup = (
+        await db_session.execute(
+            select(
+                DailyNoteStatsModel.day,
+                DailyNoteStatsModel.note_count,
+                DailyNoteStatsModel.word_count,
+                DailyNoteStatsModel.char_count,
+            ).where(DailyNoteStatsModel.note_count > 0)
+        )
+    ).all()
+
+    assert [(str(day), *counts) for day, *counts in rollup] == [
+        tuple(row) for row in expected
+    ]
+    assert expected[0][1:] == (2, 6, 27)
+
+    response = await client.get("/api/v1/analytics/daily/")
+
+    assert response.status_code == 200
+    assert response.json()["days"] == [
+        {"day": day, "notes": notes, "words": words, "chars": chars}
+        for day, notes, words, chars in expected
+    ]
+
+
+@pytest.mark.asyncio
+async def test_analytics_time_range(client, db_session):
+    """
+    Test the `from`/`to` filters across whole days and partial days of the range.
+
+    Expected:
+        - Only notes created in `[from, to)` are counted.
+        - The rollup and the partial-day scans add up to a direct count.
+        - 400 response status code when `from` is not earlier than `to`.
+    """
+
+    created_at = [
+        datetime(2024, 1, 1, 23, 0),
+        datetime(2024, 1, 2, 8, 0),
+        datetime(2024, 1, 3, 12, 0),
+        datetime(2024, 1, 4, 6, 0),
+        datetime(2024, 1, 4, 18, 0),
+        datetime(2024, 1, 6, 0, 0),
+    ]
+    db_session.add_all(
+        NoteModel(content=" ".join(["word"] * (i + 1)), created_at=timestamp)
+        for i, timestamp in enumerate(created_at)
+    )
+    await db_session.commit()
+
+    # Two partial days around two whole days: notes 2 to 4 have 2 + 3 + 4 words
+    response = await client.get(
+        "/api/v1/analytics/total-words/",
+        params={"from": "2024-01-01T23:30:00", "to": "2024-01-04T12:00:00"},
+    )
+    assert response.json() == {"total_words": 9}
+
+    response = await client.get(
+        "/api/v1/analytics/total-words/", params={"from": "2024-01-04T00:00:00Z"}
+    )
+    assert response.json() == {"total_words": 15}
+
+    response = await client.get(
+        "/api/v1/analytics/total-words/", params={"to": "2024-01-06T00:00:00"}
+    )
+    assert response.json() == {"total_words": 15}
+
+    response = await client.get(
+        "/api/v1/analytics/avg-note-length/",
+        params={"from": "2024-01-04T05:00:00", "to": "2024-01-04T19:00:00"},
+    )
+    assert response.json() == {"avg_note_length": round((19 + 24) / 2, 2)}
+
+    response = await client.get(
+        "/api/v1/analytics/top-3-longest-notes/",
+        params={"from": "2024-01-02T00:00:00", "to": "2024-01-04T00:00:00"},
+    )
+    assert [note["length"] for note in response.json()["top_3_longest_notes"]] == [14, 9]
+
+    response = await client.get(
+        "/api/v1/analytics/daily/", params={"from": "2024-01-03", "to": "2024-01-04"}
+    )
+    assert response.json()["days"] == [
+        {"day": "2024-01-03", "notes": 1, "words": 3, "chars": 14},
+        {"day": "2024-01-04", "notes": 2, "words": 9, "chars": 43},
+    ]
+
+    response = await client.get(
+        "/api/v1/analytics/total-words/",
+        params={"from": "2024-01-04T00:00:00", "to": "2024-01-04T00:00:00"},
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_sharded_analytics(client, file_shards):
+    """
+    Test the analytics endpoints with notes spread over three database files.
+
+    Expected:
+        - Totals, averages and daily stats sum up the notes of every shard.
+        - The top 3 longest and shortest notes are taken across the shards.
+        - The duplicates endpoint, which needs a single database, answers 501.
+    """
+    shard_list = await file_shards(3)
+
+    contents = ["a", "a b", "a b c", "a b c d", "a b c d e"]
+    ids = {}
+    for content in contents:
+        response = await client.post("/api/v1/notes/", json={"content": content})
+        ids[content] = response.json()["id"]
+
+    counts = await gather_shards(
+        None, lambda db: db.scalar(select(func.count(NoteModel.id))), shard_list=shard_list
+    )
+    assert sorted(counts) == [1, 2, 2]
+
+    response = await client.get("/api/v1/analytics/total-words/")
+    assert response.json() == {"total_words": 15}
+
+    response = await client.get("/api/v1/analytics/avg-note-length/")
+    assert response.json() == {"avg_note_length": 5.0}
+
+    response = await client.get("/api/v1/analytics/top-3-longest-notes/")
+    assert [note["id"] for note in response.json()["top_3_longest_notes"]] == [
+        ids[content] for content in reversed(contents[2:])
+    ]
+
+    response = await client.get("/api/v1/analytics/top-3-shortest-notes/")
+    assert [note["id"] for note in response.json()["top_3_shortest_notes"]] == [
+        ids[content] for content in contents[:3]
+    ]
+
+    response = await client.get("/api/v1/analytics/daily/")
+    [day] = response.json()["days"]
+    assert (day["notes"], day["words"], day["chars"]) == (5, 15, 25)
+
+    response = await client.get("/api/v1/analytics/duplicates/")
+    assert response.status_code == 501
+
+
+@pytest.mark.asyncio
+async def test_duplicate_notes(client):
+    """
+    Test listing near-duplicate pairs, including notes added by an import.
+
+    Expected:
+        - 200 response status code.
+        - Only the pairs of near-identical notes, most similar first.
+        - `limit` keeps the most similar pairs.
+    """
+
+    text = " ".join(f"word{i}" for i in range(60))
+    await client.post("/api/v1/notes/", json={"content": text})
+    await client.post("/api/v1/notes/", json={"content": "A short unrelated note"})
+
+    body = "\n".join(
+        json.dumps({"content": content})
+        for content in (text, text.replace("word30", "changed"))
+    )
+    await client.post(
+        "/api/v1/notes/import/?format=ndjson",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    response = await client.get("/api/v1/analytics/duplicates/")
+
+    assert response.status_code == 200
+    duplicates = response.json()["duplicates"]
+    assert [pair["note_ids"] for pair in duplicates] == [[1, 3], [1, 4], [3, 4]]
+    assert duplicates[0]["similarity"] == 1.0
+    assert duplicates[1]["similarity"] < 1.0
+
+    response = await client.get("/api/v1/analytics/duplicates/", params={"limit": 2})
+    assert response.json()["duplicates"] == duplicates[:2]
+
+
+def test_startup_is_lazy():
+    """
+    Test that importing the app does not import NLTK, the GenAI SDK or SciPy.
+
+    Expected:
+        - None of them is imported until a request needs it, so startup makes no network calls.
+    """
+
+    script = (
+        "import sys, main; "
+        "print([name for name in ('nltk', 'google.genai', 'scipy') if name in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "[]"
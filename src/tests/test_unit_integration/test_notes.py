@@ -1,8 +1,46 @@
+import asyncio
+import json
 import random
+import sqlite3
 import pytest
-from sqlalchemy import select, func
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import insert, select, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import NoteModel
+from database import (
+    engine,
+    get_db,
+    create_shard,
+    init_db,
+    gather_shards,
+    rebalance_shards,
+    next_note_id,
+    get_db_contextmanager,
+    NoteModel,
+    VersionModel,
+    NoteSignatureModel,
+    NoteLshBucketModel,
+    NoteUploadModel,
+    DailyNoteStatsModel,
+)
+from services import (
+    note_cache,
+    CachedNote,
+    stream_changes,
+    related_index,
+    QueryProfilerMiddleware,
+    enable_query_profiler,
+    disable_query_profiler,
+    statement_shape,
+    compute_signature,
+    SignatureBuilder,
+    NoteContentReader,
+    NoteContentChanged,
+    parse_byte_range,
+)
+from services.note_cache import NoteResponseCache
 
 
 random_id = random.randint(1, 10)
@@ -140,6 +178,88 @@ async def test_page_exceeds_maximum(client, db_session, populate_test_10_notes):
     assert response.json()["notes"] == []
 
 
+@pytest.mark.asyncio
+async def test_fast_list_serialization_matches_schema_path(
+    client, populate_test_10_notes, monkeypatch
+):
+    """
+    Test that encoding list responses from SQL rows gives the same body as the ORM path.
+
+    Expected:
+        - Byte-identical note list and version list bodies in both modes.
+    """
+    for n in range(1, 4):
+        await client.put("/api/v1/notes/2/", json={"content": f"Ünïcode ✓ {n}"})
+
+    bodies = {}
+    for fast in (True, False):
+        monkeypatch.setattr("routes.notes.settings.FAST_LIST_SERIALIZATION", fast)
+        monkeypatch.setattr("routes.versions.settings.FAST_LIST_SERIALIZATION", fast)
+        bodies[fast] = [
+            (await client.get(url)).content
+            for url in (
+                "/api/v1/notes/?per_page=5",
+                "/api/v1/notes/?page=2&per_page=5",
+                "/api/v1/versions/2?per_page=2",
+                "/api/v1/versions/2?page=2&per_page=2",
+            )
+        ]
+
+    assert bodies[True] == bodies[False]
+
+
+@pytest.mark.asyncio
+async def test_get_note_batch(client, populate_test_10_notes):
+    """
+    Test retrieving several notes at once, with a summary of their versions.
+
+    Expected:
+        - 200 response status code.
+        - Notes in the requested order, without duplicates.
+        - Missing IDs listed separately.
+    """
+    for n in range(1, 3):
+        await client.put("/api/v1/notes/4/", json={"content": f"Updated Content {n}"})
+
+    response = await client.get("/api/v1/notes/batch/", params={"ids": "4,99,2,4"})
+    assert response.status_code == 200
+
+    data = response.json()
+    assert [note["id"] for note in data["notes"]] == [4, 2]
+    assert data["missing"] == [99]
+    assert data["notes"][0]["version_summary"]["count"] == 2
+    assert data["notes"][0]["version_summary"]["latest_version"] == 2
+    assert data["notes"][1]["version_summary"]["count"] == 0
+    assert data["notes"][0]["versions"] is None
+
+
+@pytest.mark.asyncio
+async def test_post_note_batch_full_versions(client, populate_test_10_notes):
+    """
+    Test the POST variant of the batch retrieve with every version included.
+
+    Expected:
+        - 200 response status code.
+        - Full version lists and no summaries.
+        - 422 response status code for an empty ID list.
+    """
+    await client.put("/api/v1/notes/7/", json={"content": "Updated Content"})
+
+    response = await client.post(
+        "/api/v1/notes/batch/", json={"ids": [7, 1], "versions": "full"}
+    )
+    assert response.status_code == 200
+
+    data = response.json()
+    assert [note["id"] for note in data["notes"]] == [7, 1]
+    assert [version["content"] for version in data["notes"][0]["versions"]] == ["Content 7"]
+    assert data["notes"][1]["versions"] == []
+    assert data["notes"][0]["version_summary"] is None
+
+    response = await client.post("/api/v1/notes/batch/", json={"ids": []})
+    assert response.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_get_note_by_id_not_found(client):
     """
@@ -176,6 +296,315 @@ async def test_get_note_by_id_valid(client, db_session, populate_test_10_notes):
     assert response_data["content"] == expected_note.content
 
 
+@pytest.mark.asyncio
+async def test_get_note_changes(client):
+    """
+    Test the change feed catch-up query after creating, updating and deleting notes.
+
+    Expected:
+        - 200 response status code.
+        - One change per write, in order, with increasing IDs.
+        - Paging with `since` returns only newer changes.
+    """
+    await client.post("/api/v1/notes/", json={"content": "First"})
+    await client.post("/api/v1/notes/", json={"content": "Second"})
+    await client.put("/api/v1/notes/1/", json={"content": "First, edited"})
+    await client.delete("/api/v1/notes/2/")
+    await client.post("/api/v1/notes/bulk-delete/", json={"ids": [1, 99]})
+
+    response = await client.get("/api/v1/notes/changes/")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert [(change["note_id"], change["action"]) for change in data["changes"]] == [
+        (1, "created"),
+        (2, "created"),
+        (1, "updated"),
+        (2, "deleted"),
+        (1, "deleted"),
+    ]
+    assert data["last_id"] == data["changes"][-1]["id"]
+
+    response = await client.get(
+        "/api/v1/notes/changes/", params={"since": data["changes"][2]["id"]}
+    )
+    assert [change["action"] for change in response.json()["changes"]] == [
+        "deleted",
+        "deleted",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_note_changes_wakes_up_on_write(client):
+    """
+    Test that a change feed stream pushes a write without waiting for its poll interval.
+
+    Expected:
+        - A `retry` field first, then an SSE event for the created note.
+    """
+    stream = stream_changes(since=0, poll_interval=30)
+    try:
+        assert (await anext(stream)).startswith(b"retry:")
+
+        next_event = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)
+        await client.post("/api/v1/notes/", json={"content": "Pushed"})
+
+        event = await asyncio.wait_for(next_event, timeout=5)
+    finally:
+        await stream.aclose()
+
+    lines = event.decode().splitlines()
+    assert lines[0] == "id: 1"
+    assert lines[1] == "event: created"
+    assert json.loads(lines[2].removeprefix("data: "))["note_id"] == 1
+
+
+@pytest.mark.asyncio
+async def test_search_notes(client, db_session):
+    """
+    Test full-text search ranking, snippets and keyset pagination.
+
+    Expected:
+        - 200 response status code.
+        - The most relevant note first, with the term highlighted.
+        - Pages that do not overlap and together cover every match.
+    """
+    db_session.add_all(
+        [
+            NoteModel(content="Apple pie recipe with apple slices and more apple"),
+            NoteModel(content="Shopping list: bananas, pears"),
+            *[NoteModel(content=f"Note {i} mentions an apple once") for i in range(5)],
+        ]
+    )
+    await db_session.commit()
+
+    response = await client.get("/api/v1/notes/search/", params={"q": "apple", "limit": 3})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["results"][0]["note_id"] == 1
+    assert "<mark>apple</mark>" in data["results"][0]["snippet"].lower()
+    assert data["next_cursor"] is not None
+
+    seen = [result["id"] for result in data["results"]]
+    while data["next_cursor"]:
+        data = (
+            await client.get(
+                "/api/v1/notes/search/",
+                params={"q": "apple", "limit": 3, "cursor": data["next_cursor"]},
+            )
+        ).json()
+        seen.extend(result["id"] for result in data["results"])
+
+    assert sorted(seen) == [1, 3, 4, 5, 6, 7]
+
+
+@pytest.mark.asyncio
+async def test_search_notes_follows_writes(client, populate_test_10_notes):
+    """
+    Test that the search index is kept in sync with updates and deletes by triggers.
+
+    Expected:
+        - The new content is found in notes, the old content in versions.
+        - A deleted note is no longer found.
+    """
+    await client.put("/api/v1/notes/2/", json={"content": "Quarterly budget review"})
+
+    response = await client.get("/api/v1/notes/search/", params={"q": "budget"})
+    assert [result["id"] for result in response.json()["results"]] == [2]
+
+    response = await client.get(
+        "/api/v1/notes/search/", params={"q": "Content 2", "scope": "versions"}
+    )
+    [result] = response.json()["results"]
+    assert result["note_id"] == 2
+    assert result["version"] == 1
+
+    await client.delete("/api/v1/notes/2/")
+
+    response = await client.get("/api/v1/notes/search/", params={"q": "budget"})
+    assert response.json()["results"] == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"q": "apple AND", "raw": True},
+        {"q": "apple", "cursor": "not-a-cursor"},
+    ],
+)
+async def test_search_notes_invalid_input(client, params):
+    """
+    Test that malformed FTS5 queries and cursors are rejected.
+
+    Expected:
+        - 400 response status code.
+    """
+    response = await client.get("/api/v1/notes/search/", params=params)
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_file_database_engines(client, file_shards):
+    """
+    Test the writer and read-only engines of a database file.
+
+    Expected:
+        - Both engines' connections use WAL and the configured busy timeout.
+        - The read engine is a separate, read-only engine.
+        - A committed write is visible to a read through another connection.
+    """
+    [shard] = await file_shards()
+    assert shard.read_engine is not shard.engine
+
+    for db_engine in (shard.engine, shard.read_engine):
+        async with db_engine.connect() as conn:
+            journal_mode = (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar()
+            busy_timeout = (await conn.exec_driver_sql("PRAGMA busy_timeout")).scalar()
+            assert journal_mode == "wal"
+            assert busy_timeout == 5000
+
+    async with shard.read_engine.connect() as conn:
+        with pytest.raises(OperationalError, match="readonly"):
+            await conn.exec_driver_sql("INSERT INTO notes (content) VALUES ('x')")
+
+    response = await client.post("/api/v1/notes/", json={"content": "Written"})
+    note_id = response.json()["id"]
+
+    async with get_db_contextmanager(read_only=True) as read_db:
+        connection = await read_db.connection()
+        assert connection.engine is shard.read_engine
+        assert await read_db.scalar(
+            select(NoteModel.content).where(NoteModel.id == note_id)
+        ) == "Written"
+
+    response = await client.get(f"/api/v1/notes/{note_id}/")
+    assert response.json()["content"] == "Written"
+
+
+@pytest.mark.asyncio
+async def test_database_busy_is_retryable(client, monkeypatch):
+    """
+    Test that a database that stayed locked is reported as a retryable error.
+
+    Expected:
+        - 503 response status code with a Retry-After header.
+        - Other SQLite errors in a search are still reported as invalid queries.
+    """
+
+    def raise_error(message):
+        async def search_notes(*args):
+            raise OperationalError("SELECT", {}, sqlite3.OperationalError(message))
+
+        return search_notes
+
+    monkeypatch.setattr("routes.notes.search_notes", raise_error("database is locked"))
+    response = await client.get("/api/v1/notes/search/", params={"q": "apple"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert response.json() == {"detail": "The database is busy, retry later."}
+
+    monkeypatch.setattr("routes.notes.search_notes", raise_error("fts5: syntax error"))
+    response = await client.get("/api/v1/notes/search/", params={"q": "apple"})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_note_conditional_request(client, populate_test_10_notes):
+    """
+    Test ETag revalidation of a note and of the note list.
+
+    Expected:
+        - An ETag and `Cache-Control: no-cache` on the first response.
+        - 304 response status code with an empty body for a matching `If-None-Match`.
+        - A new ETag once the note is updated.
+    """
+    response = await client.get("/api/v1/notes/1/")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "no-cache"
+
+    response = await client.get("/api/v1/notes/1/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    list_response = await client.get("/api/v1/notes/")
+    list_etag = list_response.headers["etag"]
+    response = await client.get(
+        "/api/v1/notes/", headers={"If-None-Match": f'W/{list_etag}, "other"'}
+    )
+    assert response.status_code == 304
+
+    response_updated = await client.put("/api/v1/notes/1/", json={"content": "New"})
+    assert response_updated.headers["etag"] != etag
+
+    response = await client.get("/api/v1/notes/1/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] == response_updated.headers["etag"]
+
+    response = await client.get("/api/v1/notes/", headers={"If-None-Match": list_etag})
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_get_note_served_from_cache(client, db_session, populate_test_10_notes):
+    """
+    Test that note details are served from the response cache until a write invalidates them.
+
+    Expected:
+        - The cached body is identical to the one built from the database.
+        - Updating the note or deleting one of its versions drops the cached body.
+        - A deleted note is not served from the cache.
+    """
+    first = await client.get("/api/v1/notes/3/")
+    hits = note_cache.stats()["hits"]
+    second = await client.get("/api/v1/notes/3/")
+    assert second.content == first.content
+    assert second.headers["etag"] == first.headers["etag"]
+    assert note_cache.stats()["hits"] == hits + 1
+
+    await client.put("/api/v1/notes/3/", json={"content": "Cached content"})
+    response = await client.get("/api/v1/notes/3/")
+    assert response.json()["content"] == "Cached content"
+    assert len(response.json()["versions"]) == 1
+
+    await client.delete("/api/v1/versions/3/1")
+    response = await client.get("/api/v1/notes/3/")
+    assert response.json()["versions"] == []
+
+    await client.delete("/api/v1/notes/3/")
+    response = await client.get("/api/v1/notes/3/")
+    assert response.status_code == 404
+
+
+def test_note_cache_ignores_stale_reads():
+    """
+    Test that a body read before an invalidation is not stored, and that the byte bound holds.
+
+    Expected:
+        - A `put` with an outdated generation is ignored.
+        - Least recently used entries are evicted once `max_bytes` is exceeded.
+    """
+    cache = NoteResponseCache(max_bytes=10)
+
+    generation = cache.generation
+    cache.invalidate(1)
+    cache.put(1, CachedNote('"a"', b"stale"), generation)
+    assert cache.get(1) is None
+
+    cache.put(1, CachedNote('"a"', b"12345"), cache.generation)
+    cache.put(2, CachedNote('"b"', b"12345"), cache.generation)
+    cache.get(1)
+    cache.put(3, CachedNote('"c"', b"12345"), cache.generation)
+
+    assert cache.get(2) is None
+    assert cache.get(1).body == b"12345"
+    assert cache.stats()["bytes"] == 10
+
+
 @pytest.mark.asyncio
 async def test_update_note(client, populate_test_10_notes):
     """
@@ -200,6 +629,37 @@ async def test_update_note(client, populate_test_10_notes):
     )
 
 
+@pytest.mark.asyncio
+async def test_update_notes_group_commit(
+    client, db_session, populate_test_10_notes, group_commit
+):
+    """
+    Test concurrent updates batched into a shared transaction by the group-commit queue.
+
+    Expected:
+        - 200 response status code for every existing note.
+        - 404 response status code for a missing note, without failing the batch.
+        - One new version stored per successful update.
+    """
+
+    responses = await asyncio.gather(
+        *(
+            client.put(f"/api/v1/notes/{note_id}/", json={"content": f"Batched {note_id}"})
+            for note_id in [*range(1, 11), 999]
+        )
+    )
+
+    assert [response.status_code for response in responses] == [200] * 10 + [404]
+    for note_id, response in enumerate(responses[:10], start=1):
+        assert response.json()["content"] == f"Batched {note_id}"
+        assert response.json()["versions"][0]["content"] == f"Content {note_id}"
+
+    total_versions = await db_session.scalar(
+        select(func.count()).select_from(VersionModel)
+    )
+    assert total_versions == 10
+
+
 @pytest.mark.asyncio
 async def test_delete_note(client, db_session, populate_test_10_notes):
     """
@@ -221,3 +681,900 @@ async def test_delete_note(client, db_session, populate_test_10_notes):
     )
 
     assert number_of_notes_after_delete == total_notes - 1
+
+
+@pytest.mark.asyncio
+async def test_delete_note_cascades_versions(client, db_session, populate_test_10_notes):
+    """
+    Test that deleting a note also deletes its versions at the database level.
+
+    Expected:
+        - 200 response status code.
+        - No versions left for the deleted note.
+    """
+    for n in range(1, 4):
+        await client.put(
+            f"/api/v1/notes/{random_id}/", json={"content": f"Updated Content {n}"}
+        )
+
+    response = await client.delete(f"/api/v1/notes/{random_id}/")
+    assert response.status_code == 200
+
+    remaining_versions = await db_session.scalar(
+        select(func.count())
+        .select_from(VersionModel)
+        .where(VersionModel.note_id == random_id)
+    )
+    assert remaining_versions == 0
+
+
+@pytest.mark.asyncio
+async def test_delete_note_not_found(client):
+    """
+    Test deleting a note that does not exist.
+
+    Expected:
+        - 404 response status code.
+    """
+    response = await client.delete("/api/v1/notes/1/")
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Note with the given ID was not found."}
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete_notes_by_ids(client, db_session, populate_test_10_notes):
+    """
+    Test bulk deleting notes by IDs, including IDs that do not exist.
+
+    Expected:
+        - 200 response status code.
+        - Only the existing notes are counted as deleted.
+    """
+    response = await client.post(
+        "/api/v1/notes/bulk-delete/", json={"ids": [1, 2, 3, 100]}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["deleted"] == 3
+
+    total_notes = await db_session.scalar(select(func.count()).select_from(NoteModel))
+    assert total_notes == 7
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete_notes_updated_before(client, db_session, populate_test_10_notes):
+    """
+    Test bulk deleting every note last updated before a given time.
+
+    Expected:
+        - 200 response status code.
+        - All notes deleted.
+    """
+    response = await client.post(
+        "/api/v1/notes/bulk-delete/", json={"updated_before": "2999-01-01T00:00:00Z"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["deleted"] == 10
+
+    total_notes = await db_session.scalar(select(func.count()).select_from(NoteModel))
+    assert total_notes == 0
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete_notes_requires_filter(client):
+    """
+    Test bulk deleting notes without any filter.
+
+    Expected:
+        - 422 response status code.
+    """
+    response = await client.post("/api/v1/notes/bulk-delete/", json={})
+
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_import_notes_ndjson(client, db_session):
+    """
+    Test importing notes with version history from an NDJSON body with a broken line.
+
+    Expected:
+        - 200 response status code.
+        - Valid lines imported with their versions, the broken line reported.
+    """
+    body = (
+        '{"content": "First", "versions": [{"content": "First v1"}, {"content": "First v2"}]}\n'
+        '{"content": "Second", "created_at": "2024-01-01T00:00:00"}\n'
+        "not json\n"
+        '{"content": "Third"}'
+    )
+
+    response = await client.post(
+        "/api/v1/notes/import/",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+
+    response_data = response.json()
+    assert response_data["imported"] == 3
+    assert response_data["versions_imported"] == 2
+    assert response_data["failed"] == 1
+    assert response_data["errors"][0]["line"] == 3
+
+    response = await client.get("/api/v1/versions/1")
+    assert [version["content"] for version in response.json()["versions"]] == [
+        "First v1",
+        "First v2",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_import_notes_after_delete(client, populate_test_10_notes):
+    """
+    Test importing notes after the highest note was deleted.
+
+    Expected:
+        - The imported note gets a new ID instead of the deleted note's.
+    """
+    await client.delete("/api/v1/notes/10/")
+
+    response = await client.post(
+        "/api/v1/notes/import/",
+        content='{"content": "Imported"}',
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.json()["imported"] == 1
+
+    assert (await client.get("/api/v1/notes/10/")).status_code == 404
+    assert (await client.get("/api/v1/notes/11/")).json()["content"] == "Imported"
+
+
+@pytest.mark.asyncio
+async def test_import_notes_csv(client, db_session):
+    """
+    Test importing notes from a CSV body with a multi-line quoted field.
+
+    Expected:
+        - 200 response status code.
+        - Both rows imported with their content intact.
+    """
+    body = 'content,created_at\n"Line one\nLine two",2024-01-01T00:00:00\nPlain,\n'
+
+    response = await client.post(
+        "/api/v1/notes/import/", content=body, headers={"Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+
+    contents = (await db_session.scalars(select(NoteModel.content))).all()
+    assert sorted(contents) == ["Line one\nLine two", "Plain"]
+
+
+@pytest.mark.asyncio
+async def test_export_notes_ndjson_with_versions(client, populate_test_10_notes):
+    """
+    Test exporting all notes with their versions as gzip-compressed NDJSON.
+
+    Expected:
+        - 200 response status code.
+        - One line per note, with the versions of the updated note embedded.
+    """
+    await client.put(f"/api/v1/notes/{random_id}/", json={"content": "Updated"})
+
+    response = await client.get("/api/v1/notes/export/?include_versions=true&gzip=true")
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+
+    notes = [json.loads(line) for line in response.text.splitlines()]
+    assert [note["id"] for note in notes] == list(range(1, 11))
+
+    updated_note = notes[random_id - 1]
+    assert updated_note["content"] == "Updated"
+    assert [version["content"] for version in updated_note["versions"]] == [
+        f"Content {random_id}"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_export_notes_csv_since(client, populate_test_10_notes):
+    """
+    Test an incremental CSV export with a `since` filter in the future.
+
+    Expected:
+        - 200 response status code.
+        - Only the CSV header row.
+    """
+    response = await client.get(
+        "/api/v1/notes/export/?format=csv&since=2999-01-01T00:00:00"
+    )
+
+    assert response.status_code == 200
+    assert response.text.splitlines() == ["id,content,created_at,updated_at"]
+
+
+NEAR_DUPLICATE_TEXT = (
+    "The quarterly planning meeting covered the roadmap for the search service, "
+    "the migration of the storage layer, hiring for the platform team, and the "
+    "budget review that finance asked us to finish before the end of the month. "
+    "Action items were assigned to each team lead, with a follow-up meeting "
+    "scheduled for next Tuesday to check progress on the open questions about "
+    "the storage vendor contract and the on-call rotation"
+)
+
+
+@pytest.mark.asyncio
+async def test_similar_notes(client, db_session):
+    """
+    Test finding near-duplicates of a note through the MinHash/LSH index.
+
+    Expected:
+        - A copy with one changed word is found, an unrelated note is not.
+        - Updating the copy away from the original drops it from the results.
+        - Deleting a note removes its signature and buckets.
+        - 404 response status code for a missing note.
+    """
+    ids = []
+    for content in (
+        NEAR_DUPLICATE_TEXT,
+        NEAR_DUPLICATE_TEXT.replace("hiring", "recruiting"),
+        "Buy milk, eggs and bread on the way home",
+    ):
+        response = await client.post("/api/v1/notes/", json={"content": content})
+        ids.append(response.json()["id"])
+
+    response = await client.get(f"/api/v1/notes/{ids[0]}/similar/")
+    assert response.status_code == 200
+    similar = response.json()["similar"]
+    assert [match["id"] for match in similar] == [ids[1]]
+    assert 0.8 <= similar[0]["similarity"] < 1
+
+    response = await client.get(f"/api/v1/notes/{ids[0]}/similar/?threshold=0.99")
+    assert response.json()["similar"] == []
+
+    await client.put(f"/api/v1/notes/{ids[1]}/", json={"content": "Something else entirely"})
+    response = await client.get(f"/api/v1/notes/{ids[0]}/similar/")
+    assert response.json()["similar"] == []
+
+    await client.delete(f"/api/v1/notes/{ids[0]}/")
+    for model in (NoteSignatureModel, NoteLshBucketModel):
+        remaining = await db_session.scalar(
+            select(func.count()).select_from(model).where(model.note_id == ids[0])
+        )
+        assert remaining == 0
+
+    response = await client.get(f"/api/v1/notes/{ids[0]}/similar/")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_related_notes(client):
+    """
+    Test ranking notes by topic with the TF-IDF index, as notes are created, updated and deleted.
+
+    Expected:
+        - Notes about the same topic rank first, unrelated notes are left out.
+        - Free-text queries use the same index.
+        - Updates and deletes are picked up from the change log.
+    """
+    contents = [
+        "Python asyncio event loop and coroutines",
+        "Tuning the asyncio event loop in Python services",
+        "Sourdough bread needs flour, water and salt",
+        "Baking bread with a sourdough starter",
+    ]
+    for content in contents:
+        await client.post("/api/v1/notes/", json={"content": content})
+
+    response = await client.get("/api/v1/notes/1/related/?k=5")
+    assert response.status_code == 200
+    related = response.json()["related"]
+    assert related[0]["id"] == 2
+    assert 1 not in [note["id"] for note in related]
+
+    response = await client.get("/api/v1/notes/related/", params={"q": "sourdough bread"})
+    assert [note["id"] for note in response.json()["related"]][:2] in ([3, 4], [4, 3])
+
+    await client.put("/api/v1/notes/2/", json={"content": "A sourdough starter for bread"})
+    await client.delete("/api/v1/notes/4/")
+
+    response = await client.get("/api/v1/notes/3/related/")
+    assert [note["id"] for note in response.json()["related"]][0] == 2
+    assert related_index.note_count == 3
+
+    response = await client.get("/api/v1/notes/99/related/")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_related_notes_index_persistence(client, tmp_path, monkeypatch):
+    """
+    Test that the related notes index is written to disk, memory-mapped on load,
+    and catches up with the change log after a merge.
+
+    Expected:
+        - The stored matrix is loaded as memory-mapped arrays.
+        - Changes made after it was written are applied on top of it.
+    """
+    for content in ("red apples", "green apples", "blue whales"):
+        await client.post("/api/v1/notes/", json={"content": content})
+
+    monkeypatch.setattr(related_index, "path", tmp_path / "related")
+    monkeypatch.setattr(related_index, "max_delta", 1)
+    response = await client.get("/api/v1/notes/related/", params={"q": "apples"})
+    assert len(response.json()["related"]) == 2
+
+    related_index.reset()
+    await client.post("/api/v1/notes/", json={"content": "more apples"})
+
+    response = await client.get("/api/v1/notes/related/", params={"q": "apples"})
+    assert sorted(note["id"] for note in response.json()["related"]) == [1, 2, 4]
+    # Arrays mapped read-only from the stored files
+    assert not related_index.base.data.flags.writeable
+
+
+async def _scrape_metrics(client) -> dict:
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    samples = {}
+    for line in response.text.splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+
+    return samples
+
+
+@pytest.mark.asyncio
+async def test_metrics(client, monkeypatch):
+    """
+    Test the Prometheus metrics endpoint.
+
+    Expected:
+        - Requests are counted and timed per route template, with their database queries.
+        - GenAI calls and note cache lookups are exposed.
+    """
+    monkeypatch.setattr("services.genai.settings.GENAI_STUB", True)
+
+    response = await client.post("/api/v1/notes/", json={"content": "Metrics note"})
+    note_id = response.json()["id"]
+    before = await _scrape_metrics(client)
+
+    await client.get(f"/api/v1/notes/{note_id}/")
+    await client.get(f"/api/v1/notes/{note_id}/")
+    await client.get("/api/v1/analytics/summary/", params={"note_id": note_id})
+
+    after = await _scrape_metrics(client)
+
+    def increase(name: str) -> float:
+        return after[name] - before.get(name, 0)
+
+    route = 'method="GET",route="/api/v1/notes/{note_id}/"'
+    assert increase(f'http_requests_total{{{route},status="200"}}') == 2
+    assert increase(f"http_request_duration_seconds_count{{{route}}}") == 2
+    assert increase(f'http_request_duration_seconds_bucket{{{route},le="+Inf"}}') == 2
+    assert after[f"http_requests_in_progress{{{route}}}"] == 0
+    # The first read loads the note, the second one is served from the cache
+    assert increase(f"http_request_db_queries_sum{{{route}}}") >= 1
+    assert increase('note_cache_lookups_total{result="hit"}') == 1
+    assert increase('genai_requests_total{outcome="ok"}') == 1
+    assert increase('db_queries_total{engine="write"}') > 0
+
+
+@pytest.mark.asyncio
+async def test_metrics_group_commit(client, group_commit):
+    """
+    Test the database queries of requests whose writes go through the group-commit queue.
+
+    Expected:
+        - Every request is counted with the statements of its own write, not only the
+          request that started the queue's worker.
+    """
+    name = 'http_request_db_queries_sum{method="POST",route="/api/v1/notes/"}'
+
+    counts = []
+    for i in range(2):
+        before = (await _scrape_metrics(client)).get(name, 0)
+        response = await client.post("/api/v1/notes/", json={"content": f"Batched {i}"})
+        assert response.status_code == 200
+        counts.append((await _scrape_metrics(client))[name] - before)
+
+    assert counts[0] > 0
+    assert counts[1] == counts[0]
+
+
+@pytest.fixture
+def query_profiler():
+    """Profile the queries of the write engine for one test, then remove the listeners."""
+    enable_query_profiler(engine.sync_engine)
+    yield
+    disable_query_profiler(engine.sync_engine)
+
+
+def _query_summary(response) -> dict:
+    return dict(part.split("=") for part in response.headers["X-Query-Summary"].split("; "))
+
+
+@pytest.mark.asyncio
+async def test_query_profiler(query_profiler, populate_test_10_notes, monkeypatch, caplog):
+    """
+    Test the SQL profiler on a route that loads the notes of a list one by one.
+
+    Expected:
+        - The response carries a summary of the request's queries.
+        - The statement run once per note is logged as a possible N+1.
+        - The batch route, which loads the same notes at once, is not flagged.
+        - Slow statements are logged with their query plan.
+    """
+    from main import app
+
+    n_plus_one_app = FastAPI()
+
+    @n_plus_one_app.get("/notes/")
+    async def get_notes_one_by_one(ids: str, db: AsyncSession = Depends(get_db)):
+        notes = []
+        for note_id in ids.split(","):
+            note = await db.get(NoteModel, int(note_id))
+            notes.append(note.content)
+
+        return notes
+
+    ids = "1,2,3,4,5,6"
+    with caplog.at_level("WARNING", logger="services.query_profiler"):
+        async with AsyncClient(
+            transport=ASGITransport(app=QueryProfilerMiddleware(n_plus_one_app)),
+            base_url="http://test",
+        ) as client:
+            response = await client.get("/notes/", params={"ids": ids})
+
+        assert response.status_code == 200
+        summary = _query_summary(response)
+        assert int(summary["count"]) >= 6
+        assert int(summary["repeated"]) == 1
+        assert "GET /notes/ ran the same statement 6 times" in caplog.text
+
+        caplog.clear()
+        monkeypatch.setattr("services.query_profiler.settings.SQL_PROFILER_SLOW_QUERY_MS", 0)
+        async with AsyncClient(
+            transport=ASGITransport(app=QueryProfilerMiddleware(app)), base_url="http://test"
+        ) as client:
+            response = await client.get("/api/v1/notes/batch/", params={"ids": ids})
+
+    assert response.status_code == 200
+    summary = _query_summary(response)
+    assert int(summary["count"]) >= 1
+    assert int(summary["repeated"]) == 0
+    assert int(summary["slow"]) == int(summary["count"])
+    assert "ran the same statement" not in caplog.text
+    assert "Slow query" in caplog.text
+    assert "SEARCH notes USING INTEGER PRIMARY KEY" in caplog.text
+
+    assert statement_shape("SELECT *  FROM notes\n WHERE id IN (?, ?, ?)") == (
+        "SELECT * FROM notes WHERE id IN (?...)"
+    )
+
+
+@pytest.mark.asyncio
+async def test_query_profiler_group_commit(query_profiler, group_commit):
+    """
+    Test the SQL profiler on requests whose writes go through the group-commit queue.
+
+    Expected:
+        - Every request's profile holds the statements of its own write, not only the
+          profile of the request that started the queue's worker.
+    """
+    from main import app
+
+
+    counts = []
+    async with AsyncClient(
+        transport=ASGITransport(app=QueryProfilerMiddleware(app)), base_url="http://test"
+    ) as client:
+        for i in range(2):
+            response = await client.post("/api/v1/notes/", json={"content": f"Batched {i}"})
+            assert response.status_code == 200
+            counts.append(int(_query_summary(response)["count"]))
+
+    assert counts[0] > 0
+    assert counts[1] == counts[0]
+
+
+@pytest.mark.asyncio
+async def test_admin_backup_and_restore(client, tmp_path, monkeypatch):
+    """
+    Test backing up the database through the admin endpoints and restoring it.
+
+    Expected:
+        - 403 while `ADMIN_TOKEN` is empty, 401 with a wrong token.
+        - The backup reports its size and timings and appears in the snapshot list.
+        - Restoring brings back the notes as they were at backup time.
+        - IDs handed out before the restore are not reused, so a change feed cursor
+          taken before it still sees the changes made after it.
+        - Unknown, malformed and corrupt snapshots are rejected.
+    """
+    response = await client.post("/api/v1/admin/backup/")
+    assert response.status_code == 403
+
+    monkeypatch.setattr("routes.admin.settings.ADMIN_TOKEN", "admin-secret")
+    monkeypatch.setattr("routes.admin.settings.BACKUP_DIR", str(tmp_path))
+    headers = {"X-Admin-Token": "admin-secret"}
+
+    response = await client.post("/api/v1/admin/backup/", headers={"X-Admin-Token": "x"})
+    assert response.status_code == 401
+
+    kept = await client.post("/api/v1/notes/", json={"content": "Kept note."})
+    kept_id = kept.json()["id"]
+
+    response = await client.post(
+        "/api/v1/admin/backup/", json={"compress": True}, headers=headers
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["name"].endswith(".db.gz")
+    assert report["bytes"] > 0 and 0 < report["compressed_bytes"] < report["bytes"]
+    assert report["pages"] > 0 and report["steps"] >= 1
+    assert report["restarts"] == 0
+    assert report["max_stall_ms"] >= 0
+
+    response = await client.get("/api/v1/admin/backups/", headers=headers)
+    assert [snapshot["name"] for snapshot in response.json()["snapshots"]] == [
+        report["name"]
+    ]
+
+    await client.put(f"/api/v1/notes/{kept_id}/", json={"content": "Changed note."})
+    later = await client.post("/api/v1/notes/", json={"content": "Later note."})
+    assert (await client.get(f"/api/v1/notes/{kept_id}/")).json()["content"] == "Changed note."
+    cursor = (await client.get("/api/v1/notes/changes/")).json()["last_id"]
+
+    response = await client.post(
+        "/api/v1/admin/restore/", json={"name": report["name"]}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json()["bytes"] == report["bytes"]
+
+    restored = await client.get(f"/api/v1/notes/{kept_id}/")
+    assert restored.json()["content"] == "Kept note."
+    assert restored.json()["versions"] == []
+    assert (await client.get(f"/api/v1/notes/{later.json()['id']}/")).status_code == 404
+
+    search = await client.get("/api/v1/notes/search/?q=kept")
+    assert [result["id"] for result in search.json()["results"]] == [kept_id]
+
+    created = await client.post("/api/v1/notes/", json={"content": "After restore."})
+    assert created.json()["id"] > later.json()["id"]
+    changes = (await client.get("/api/v1/notes/changes/", params={"since": cursor})).json()
+    assert [change["note_id"] for change in changes["changes"]] == [created.json()["id"]]
+
+    for name, status in (("../notes.db", 400), ("missing.db", 404)):
+        response = await client.post(
+            "/api/v1/admin/restore/", json={"name": name}, headers=headers
+        )
+        assert response.status_code == status
+
+    (tmp_path / "corrupt.db").write_bytes(b"not a database")
+    response = await client.post(
+        "/api/v1/admin/restore/", json={"name": "corrupt.db"}, headers=headers
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_upload_note_and_read_ranges(client, db_session, monkeypatch):
+    """
+    Test creating and replacing a note from a raw streamed body, and reading its content
+    by byte ranges.
+
+    Expected:
+        - The uploaded content is stored as text, searchable, with its MinHash signature.
+        - Replacing the content keeps the previous content as a version.
+        - Byte ranges are answered with `206`, unsatisfiable ones with `416`.
+        - Bodies that are not UTF-8 or too large are rejected, and no staging rows remain.
+    """
+    monkeypatch.setattr("services.note_content.settings.NOTE_BLOB_CHUNK_SIZE", 1000)
+    content = "Streaming uploads keep large notes out of memory. " * 200
+    body = content.encode()
+
+    async def chunks():
+        for start in range(0, len(body), 777):
+            yield body[start : start + 777]
+
+    response = await client.post("/api/v1/notes/upload/", content=chunks())
+    assert response.status_code == 200
+    assert response.json()["size"] == len(body)
+    note_id = response.json()["id"]
+
+    note = await client.get(f"/api/v1/notes/{note_id}/")
+    assert note.json()["content"] == content
+    signature = await db_session.scalar(
+        select(NoteSignatureModel.signature).where(NoteSignatureModel.note_id == note_id)
+    )
+    assert signature == compute_signature(content).tobytes()
+    search = await client.get("/api/v1/notes/search/?q=streaming")
+    assert [result["id"] for result in search.json()["results"]] == [note_id]
+
+    response = await client.get(f"/api/v1/notes/{note_id}/content/")
+    assert response.status_code == 200
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.content == body
+
+    response = await client.get(
+        f"/api/v1/notes/{note_id}/content/", headers={"Range": "bytes=10-2509"}
+    )
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10-2509/{len(body)}"
+    assert response.content == body[10:2510]
+
+    response = await client.get(
+        f"/api/v1/notes/{note_id}/content/", headers={"Range": "bytes=-5"}
+    )
+    assert response.content == body[-5:]
+
+    response = await client.get(
+        f"/api/v1/notes/{note_id}/content/", headers={"Range": f"bytes={len(body)}-"}
+    )
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(body)}"
+
+    response = await client.put(
+        f"/api/v1/notes/{note_id}/content/", content="Replaced ✓".encode()
+    )
+    assert response.status_code == 200
+    assert response.json()["versions"] == 1
+    note = await client.get(f"/api/v1/notes/{note_id}/")
+    assert note.json()["content"] == "Replaced ✓"
+    assert note.json()["versions"][0]["content"] == content
+
+    assert (await client.get("/api/v1/notes/999/content/")).status_code == 404
+    assert (await client.put("/api/v1/notes/999/content/", content=b"x")).status_code == 404
+
+    response = await client.post("/api/v1/notes/upload/", content=b"caf\xe9")
+    assert response.status_code == 400
+
+    monkeypatch.setattr("routes.notes.settings.NOTE_UPLOAD_MAX_BYTES", 10)
+    response = await client.post("/api/v1/notes/upload/", content=b"x" * 11)
+    assert response.status_code == 413
+
+    assert await db_session.scalar(select(func.count(NoteUploadModel.id))) == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_content_readers(client, file_shards, monkeypatch):
+    """
+    Test content downloads whose clients stop reading, on a database file.
+
+    Expected:
+        - More stalled downloads than read connections leave reads and checkpoints free.
+        - A download stops when the note changes, instead of mixing two contents.
+    """
+    [shard] = await file_shards()
+    monkeypatch.setattr("services.note_content.settings.NOTE_BLOB_CHUNK_SIZE", 100)
+    content = "Slow readers must not hold a connection. " * 20
+    response = await client.post("/api/v1/notes/", json={"content": content})
+    note_id = response.json()["id"]
+
+    streams = []
+    for _ in range(shard.read_engine.pool.size() + 1):
+        reader = NoteContentReader(note_id)
+        size = await reader.open()
+        stream = reader.read(0, size)
+        assert await anext(stream) == content.encode()[:100]
+        streams.append(stream)
+
+    response = await asyncio.wait_for(client.get("/api/v1/notes/"), timeout=5)
+    assert response.status_code == 200
+    async with shard.engine.connect() as conn:
+        # Outside of the transaction SQLAlchemy would begin
+        raw_connection = await conn.get_raw_connection()
+        cursor = await raw_connection.driver_connection.execute(
+            "PRAGMA wal_checkpoint(TRUNCATE)"
+        )
+        busy, *_ = await cursor.fetchone()
+        assert busy == 0
+
+    assert b"".join([content.encode()[:100], *[chunk async for chunk in streams.pop()]]) == (
+        content.encode()
+    )
+
+    await client.put(f"/api/v1/notes/{note_id}/", json={"content": "Changed"})
+    for stream in streams:
+        with pytest.raises(NoteContentChanged):
+            await anext(stream)
+
+
+def test_signature_builder_and_byte_ranges(monkeypatch):
+    """
+    Test the chunked MinHash signature and the parsing of `Range` headers.
+
+    Expected:
+        - Any split of a note gives the signature of the whole note.
+        - Hashing the shingles in chunks gives the same signature.
+        - Single byte ranges are parsed, other headers mean the whole content.
+    """
+    content = "The quick brown fox jumps over the lazy dog, again and again. " * 20
+    for piece_size in (1, 7, 64):
+        builder = SignatureBuilder()
+        for start in range(0, len(content), piece_size):
+            builder.update(content[start : start + piece_size])
+        assert (builder.finish() == compute_signature(content)).all()
+
+    short = SignatureBuilder()
+    short.update("two wo")
+    short.update("rds")
+    assert (short.finish() == compute_signature("two words")).all()
+    assert SignatureBuilder().finish() is None
+
+    signature = compute_signature(content)
+    monkeypatch.setattr("services.similarity.MIN_HASH_CHUNK_SIZE", 3)
+    assert (compute_signature(content) == signature).all()
+
+    assert parse_byte_range("bytes=0-9", 100) == (0, 10)
+    assert parse_byte_range("bytes=90-", 100) == (90, 100)
+    assert parse_byte_range("bytes=-10", 100) == (90, 100)
+    assert parse_byte_range("bytes=50-500", 100) == (50, 100)
+    assert parse_byte_range("bytes=0-1,5-6", 100) is None
+    assert parse_byte_range("lines=0-1", 100) is None
+    assert parse_byte_range(None, 100) is None
+    with pytest.raises(ValueError):
+        parse_byte_range("bytes=100-", 100)
+
+
+@pytest.mark.asyncio
+async def test_rebalance_shards_and_route_new_notes(tmp_path):
+    """
+    Test moving notes of a single database into three shards, and creating notes in them.
+
+    Expected:
+        - Every note, with its versions, ends up in the shard `id % 3`, the rollup follows.
+        - A rerun moves nothing, and new notes get IDs that route to their shard.
+    """
+    assert [next_note_id(7, shard, 3) for shard in range(3)] == [9, 10, 8]
+
+    shard_list = [
+        create_shard(index, str(tmp_path / f"notes-{index}.db"), 3) for index in range(3)
+    ]
+    try:
+        await init_db(shard_list)
+
+        # Notes written before sharding, all in the first file
+        async with get_db_contextmanager(shard=shard_list[0]) as db:
+            await db.execute(
+                insert(NoteModel), [{"content": f"note {i}"} for i in range(1, 11)]
+            )
+            await db.execute(
+                insert(VersionModel),
+                [{"note_id": 5, "version": 1, "content": "old 5"}],
+            )
+            await db.commit()
+
+        report = await rebalance_shards(shard_list, batch_size=3)
+        assert (report["moved_notes"], report["moved_versions"]) == (7, 1)
+        assert (await rebalance_shards(shard_list))["moved_notes"] == 0
+
+        async def read_shard(db):
+            note_ids = (await db.scalars(select(NoteModel.id).order_by(NoteModel.id))).all()
+            versions = (await db.scalars(select(VersionModel.note_id))).all()
+            rollup = await db.scalar(select(func.sum(DailyNoteStatsModel.note_count)))
+            return note_ids, versions, rollup
+
+        placed = await gather_shards(None, read_shard, shard_list=shard_list)
+        assert placed == [
+            ([3, 6, 9], [], 3),
+            ([1, 4, 7, 10], [], 4),
+            ([2, 5, 8], [5], 3),
+        ]
+
+        async with get_db_contextmanager(shard=shard_list[1]) as db:
+            notes = [NoteModel(content="new"), NoteModel(content="newer")]
+            db.add_all(notes)
+            await db.commit()
+            assert sorted(note.id for note in notes) == [13, 16]
+    finally:
+        for shard in shard_list:
+            await shard.engine.dispose()
+            await shard.read_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_sharded_note_routes(client, file_shards, monkeypatch):
+    """
+    Test the note endpoints with notes spread over three database files.
+
+    Expected:
+        - New notes, uploaded ones included, go to the shards in turn, each in the shard
+          of its ID.
+        - The list pages through the notes of every shard in ID order, with their total.
+        - Reads, updates and deletions reach the shard that holds the note.
+        - Batch reads and bulk deletions reach every shard that holds one of the notes.
+        - Endpoints that need a single database answer 501.
+    """
+    shard_list = await file_shards(3)
+
+    note_ids = []
+    for i in range(7):
+        response = await client.post("/api/v1/notes/", json={"content": f"Sharded {i}"})
+        assert response.status_code == 200
+        note_ids.append(response.json()["id"])
+
+    async def read_ids(db):
+        return (await db.scalars(select(NoteModel.id).order_by(NoteModel.id))).all()
+
+    uploaded_ids = []
+    # Raw uploads insert without the ORM, so they take their IDs from the shard too
+    for i in range(3):
+        response = await client.post(
+            "/api/v1/notes/upload/", content=f"Uploaded {i}".encode()
+        )
+        assert response.status_code == 200
+        uploaded_ids.append(response.json()["id"])
+
+    placed = await gather_shards(None, read_ids, shard_list=shard_list)
+    assert all(note_id % 3 == index for index, ids in enumerate(placed) for note_id in ids)
+    assert sorted(note_id for ids in placed for note_id in ids) == sorted(
+        note_ids + uploaded_ids
+    )
+    assert all(len(ids) >= 3 for ids in placed)
+    for note_id in uploaded_ids:
+        assert (await client.delete(f"/api/v1/notes/{note_id}/")).status_code == 200
+
+    first = (await client.get("/api/v1/notes/", params={"page": 1, "per_page": 5})).json()
+    second = (await client.get("/api/v1/notes/", params={"page": 2, "per_page": 5})).json()
+    assert [note["id"] for note in first["notes"] + second["notes"]] == sorted(note_ids)
+    assert (first["total_items"], first["total_pages"]) == (7, 2)
+    assert first["next_page"] == "/notes/?page=2&per_page=5"
+    assert second["next_page"] is None
+
+    updated_id, deleted_id = note_ids[1], note_ids[2]
+    response = await client.get(f"/api/v1/notes/{updated_id}/")
+    assert response.json()["content"] == "Sharded 1"
+
+    response = await client.put(f"/api/v1/notes/{updated_id}/", json={"content": "Moved on"})
+    assert response.status_code == 200
+    assert response.json()["versions"][0]["content"] == "Sharded 1"
+    async with get_db_contextmanager(read_only=True, note_id=updated_id) as db:
+        assert await db.scalar(
+            select(func.count(VersionModel.id)).where(VersionModel.note_id == updated_id)
+        ) == 1
+
+    response = await client.delete(f"/api/v1/notes/{deleted_id}/")
+    assert response.status_code == 200
+    assert (await client.get(f"/api/v1/notes/{deleted_id}/")).status_code == 404
+    assert (await client.get("/api/v1/notes/")).json()["total_items"] == 6
+    assert (await client.put("/api/v1/notes/999/", json={"content": "x"})).status_code == 404
+
+    requested = [note_ids[4], deleted_id, note_ids[0], updated_id, note_ids[4]]
+    response = await client.post(
+        "/api/v1/notes/batch/", json={"ids": requested, "versions": "summary"}
+    )
+    assert response.status_code == 200
+    batch = response.json()
+    assert [note["id"] for note in batch["notes"]] == [note_ids[4], note_ids[0], updated_id]
+    assert batch["notes"][2]["version_summary"]["count"] == 1
+    assert batch["missing"] == [deleted_id]
+
+    response = await client.post(
+        "/api/v1/notes/bulk-delete/", json={"ids": [note_ids[3], note_ids[4], 999]}
+    )
+    assert response.json() == {"deleted": 2, "batches": 2}
+    response = await client.post(
+        "/api/v1/notes/bulk-delete/", json={"updated_before": "2999-01-01T00:00:00"}
+    )
+    assert response.json()["deleted"] == 4
+    assert (await client.get("/api/v1/notes/")).json()["total_items"] == 0
+
+    monkeypatch.setattr("routes.admin.settings.ADMIN_TOKEN", "admin-secret")
+    for method, path in (
+        ("GET", "/api/v1/notes/changes/"),
+        ("GET", "/api/v1/notes/search/?q=sharded"),
+        ("GET", f"/api/v1/notes/{updated_id}/similar/"),
+        ("GET", "/api/v1/notes/export/"),
+        ("POST", "/api/v1/admin/backup/"),
+    ):
+        response = await client.request(
+            method, path, json={}, headers={"X-Admin-Token": "admin-secret"}
+        )
+        assert response.status_code == 501, path
+
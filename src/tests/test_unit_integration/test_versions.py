@@ -1,9 +1,13 @@
 import random
+from datetime import datetime
 
 import pytest
 from sqlalchemy import select, func
 
 from database import VersionModel
+from schemas import RetentionPolicySchema
+from services.retention import select_versions_to_prune
+from services.version_diff import diff_texts, tokenize_diff, version_diff_cache
 
 random_id = random.randint(1, 10)
 
@@ -100,6 +104,185 @@ async def test_get_note_version_by_note_id_version_id(client, db_session, popula
     assert response_data["content"] == version.content
 
 
+@pytest.mark.asyncio
+async def test_get_version_conditional_request(client, populate_test_10_notes):
+    """
+    Test caching headers of an immutable version and of the version list.
+
+    Expected:
+        - A long-lived, immutable `Cache-Control` for a version.
+        - 304 response status code for a matching `If-None-Match`.
+        - A new version list ETag once a version is deleted.
+    """
+    for n in range(1, 3):
+        await client.put(
+            f"/api/v1/notes/{random_id}/", json={"content": f"Updated Content {n}"}
+        )
+
+    response = await client.get(f"/api/v1/versions/{random_id}/1")
+    assert "immutable" in response.headers["cache-control"]
+
+    response = await client.get(
+        f"/api/v1/versions/{random_id}/1",
+        headers={"If-None-Match": response.headers["etag"]},
+    )
+    assert response.status_code == 304
+
+    list_etag = (await client.get(f"/api/v1/versions/{random_id}")).headers["etag"]
+    response = await client.get(
+        f"/api/v1/versions/{random_id}", headers={"If-None-Match": list_etag}
+    )
+    assert response.status_code == 304
+
+    await client.delete(f"/api/v1/versions/{random_id}/2")
+
+    response = await client.get(
+        f"/api/v1/versions/{random_id}", headers={"If-None-Match": list_etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["total_items"] == 1
+
+
+@pytest.mark.asyncio
+async def test_version_urls_not_reused(client, populate_test_10_notes):
+    """
+    Test that a new note does not take over the cached version URLs of a deleted one.
+
+    Expected:
+        - A note created, imported or uploaded after the highest note is deleted gets a new ID.
+        - The versions of the deleted note stay 404 under their old URLs.
+    """
+    await client.put("/api/v1/notes/10/", json={"content": "Updated Content"})
+    await client.delete("/api/v1/notes/10/")
+
+    response = await client.post("/api/v1/notes/", json={"content": "New note"})
+    note_id = response.json()["id"]
+    assert note_id == 11
+
+    await client.put(f"/api/v1/notes/{note_id}/", json={"content": "New content"})
+    response = await client.get("/api/v1/versions/10/1")
+    assert response.status_code == 404
+
+    await client.delete(f"/api/v1/notes/{note_id}/")
+    response = await client.post(
+        "/api/v1/notes/import/",
+        content='{"content": "Imported", "versions": [{"content": "Imported v1"}]}',
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.json()["imported"] == 1
+
+    response = await client.get(f"/api/v1/versions/{note_id}/1")
+    assert response.status_code == 404
+    response = await client.get(f"/api/v1/versions/{note_id + 1}/1")
+    assert response.json()["content"] == "Imported v1"
+
+    await client.delete(f"/api/v1/notes/{note_id + 1}/")
+    response = await client.post("/api/v1/notes/upload/", content=b"Uploaded")
+    assert response.json()["id"] == note_id + 2
+
+
+@pytest.mark.asyncio
+async def test_diff_versions(client, populate_test_10_notes):
+    """
+    Test the server-side diff of two versions.
+
+    Expected:
+        - Only the changed hunk, with its context lines, in JSON and unified formats.
+        - Cached, immutable responses and 304 for a matching `If-None-Match`.
+        - 400 for a unified word diff and 404 for a missing version.
+    """
+    old = "".join(f"line {n}\n" for n in range(1, 41))
+    new = old.replace("line 20\n", "line twenty\n")
+    for content in (old, new, "final"):
+        await client.put(f"/api/v1/notes/{random_id}/", json={"content": content})
+
+    url = f"/api/v1/versions/{random_id}/diff/"
+    response = await client.get(url, params={"from": 2, "to": 3})
+    assert response.status_code == 200
+    assert "immutable" in response.headers["cache-control"]
+
+    diff = response.json()
+    assert (diff["insertions"], diff["deletions"]) == (1, 1)
+    assert diff["hunks"] == [
+        {
+            "from_start": 16,
+            "from_count": 7,
+            "to_start": 16,
+            "to_count": 7,
+            "lines": [" line 17\n", " line 18\n", " line 19\n", "-line 20\n",
+                      "+line twenty\n", " line 21\n", " line 22\n", " line 23\n"],
+        }
+    ]
+
+    hits = version_diff_cache.hits
+    response = await client.get(url, params={"from": 2, "to": 3})
+    assert response.json() == diff
+    assert version_diff_cache.hits == hits + 1
+
+    response = await client.get(
+        url, params={"from": 2, "to": 3}, headers={"If-None-Match": response.headers["etag"]}
+    )
+    assert response.status_code == 304
+
+    response = await client.get(
+        url, params={"from": 2, "to": 3, "format": "unified", "context": 1}
+    )
+    assert response.headers["content-type"].startswith("text/x-diff")
+    assert response.text == (
+        f"--- notes/{random_id}@2\n+++ notes/{random_id}@3\n"
+        "@@ -19,3 +19,3 @@\n line 19\n-line 20\n+line twenty\n line 21\n"
+    )
+
+    response = await client.get(url, params={"from": 2, "to": 3, "granularity": "word"})
+    assert response.json()["hunks"][0]["lines"] == [
+        " \nline ", "-20", "+twenty", " \nline "
+    ]
+
+    response = await client.get(
+        url, params={"from": 2, "to": 3, "granularity": "word", "format": "unified"}
+    )
+    assert response.status_code == 400
+
+    response = await client.get(url, params={"from": 2, "to": 99})
+    assert response.status_code == 404
+
+
+def test_diff_texts_reconstructs_new_text():
+    """
+    Test that the hunks of random edits turn the old text into the new one.
+
+    Expected:
+        - The old side of each hunk matches the old text, and applying every hunk gives the new text.
+    """
+    rng = random.Random(49)
+    words = ["alpha", "beta", "gamma", "delta", "\n", " ", ", "]
+
+    for _ in range(50):
+        old = "".join(rng.choice(words) for _ in range(rng.randint(0, 200)))
+        tokens = list(old)
+        for _ in range(rng.randint(0, 5)):
+            position = rng.randint(0, len(tokens))
+            tokens[position:position + rng.randint(0, 10)] = rng.choice(words)
+        new = "".join(tokens)
+
+        for granularity in ("line", "word"):
+            old_units = tokenize_diff(old, granularity)
+            diff = diff_texts(old, new, granularity, context=rng.randint(0, 3))
+
+            rebuilt, position = [], 0
+            for hunk in diff["hunks"]:
+                old_side = "".join(line[1:] for line in hunk["lines"] if line[0] in " -")
+                start, end = hunk["from_start"], hunk["from_start"] + hunk["from_count"]
+                assert old_side == "".join(old_units[start:end])
+
+                rebuilt.append("".join(old_units[position:start]))
+                rebuilt.append("".join(line[1:] for line in hunk["lines"] if line[0] in " +"))
+                position = end
+            rebuilt.append("".join(old_units[position:]))
+
+            assert "".join(rebuilt) == new
+
+
 @pytest.mark.asyncio
 async def test_delete_version(client, db_session, populate_test_10_notes):
     """
@@ -135,3 +318,93 @@ async def test_delete_version(client, db_session, populate_test_10_notes):
     )
 
     assert number_of_versions_after_delete == total_versions - 1
+
+
+@pytest.mark.asyncio
+async def test_get_retention_policy_defaults_to_global(client, populate_test_10_notes):
+    """
+    Test retrieving the retention policy of a note without its own policy.
+
+    Expected:
+        - 200 response status code.
+        - The global policy, with every rule disabled by default.
+        - The URL without a trailing slash reaches the same route.
+    """
+
+    response = await client.get(f"/api/v1/versions/{random_id}/retention/")
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "note_id": random_id,
+        "scope": "global",
+        "keep_last": None,
+        "hourly_after_days": None,
+        "daily_after_days": None,
+        "max_total_bytes": None,
+    }
+
+    response = await client.get(
+        f"/api/v1/versions/{random_id}/retention", follow_redirects=True
+    )
+    assert response.status_code == 200
+    assert response.json()["scope"] == "global"
+
+
+@pytest.mark.asyncio
+async def test_compact_versions_keep_last(client, db_session, populate_test_10_notes):
+    """
+    Test that a compaction pass enforces a per-note `keep_last` policy.
+
+    Expected:
+        - 200 response status codes.
+        - Only the newest versions are kept, and the report counts the deleted rows and bytes.
+    """
+
+    for n in range(1, 11):
+        await client.put(
+            f"/api/v1/notes/{random_id}/", json={"content": f"Updated Content {n}"}
+        )
+
+    response = await client.put(
+        f"/api/v1/versions/{random_id}/retention/", json={"keep_last": 3}
+    )
+    assert response.status_code == 200
+    assert response.json()["scope"] == "note"
+
+    response = await client.post("/api/v1/versions/compact/")
+    assert response.status_code == 200
+
+    report = response.json()
+    assert report["deleted_versions"] == 7
+    assert report["deleted_bytes"] > 0
+
+    versions = (
+        await db_session.scalars(
+            select(VersionModel.version).where(VersionModel.note_id == random_id)
+        )
+    ).all()
+    assert sorted(versions) == [8, 9, 10]
+
+
+def test_select_versions_to_prune_daily_and_max_bytes():
+    """
+    Test the retention rules on a synthetic version history.
+
+    Expected:
+        - Old versions are thinned to one per day, and the byte budget drops the oldest ones.
+    """
+
+    now = datetime(2025, 1, 10, 12)
+    versions = [
+        (5, datetime(2025, 1, 10, 11), 10),
+        (4, datetime(2025, 1, 5, 18), 10),
+        (3, datetime(2025, 1, 5, 9), 10),
+        (2, datetime(2025, 1, 4, 9), 10),
+        (1, datetime(2025, 1, 3, 9), 10),
+    ]
+
+    policy = RetentionPolicySchema(daily_after_days=1)
+    assert select_versions_to_prune(versions, policy, now) == [(3, 10)]
+
+    policy = RetentionPolicySchema(daily_after_days=1, max_total_bytes=30)
+    assert select_versions_to_prune(versions, policy, now) == [(3, 10), (1, 10)]